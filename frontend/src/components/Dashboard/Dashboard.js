@@ -76,7 +76,17 @@ function Dashboard() {
   const fetchPlaylists = async () => {
     try {
       const response = await spotifyAPI.getUserPlaylists();
-      setPlaylists(response.data || []);
+      const items = response.data || [];
+      // A list cut short by a Spotify error ends with {error, incomplete: true}
+      const last = items[items.length - 1];
+      if (last && last.incomplete) {
+        setPlaylists(items.slice(0, -1));
+        if (items.length === 1) {
+          setError('Failed to load playlists');
+        }
+      } else {
+        setPlaylists(items);
+      }
       setLoading(false);
     } catch (err) {
       setError('Failed to load playlists');
@@ -8,6 +8,8 @@ import './WrapHistory.css';
 
 function WrapHistory() {
   const [wraps, setWraps] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [deleteModal, setDeleteModal] = useState({ open: false, wrapId: null });
@@ -20,6 +22,7 @@ function WrapHistory() {
     try {
       const response = await spotifyAPI.getWrapHistory();
       setWraps(response.data.wraps);
+      setNextCursor(response.data.next_cursor);
     } catch (err) {
       setError('Failed to load wrap history');
       console.error('Error fetching wrap history:', err);
@@ -28,6 +31,19 @@ function WrapHistory() {
     }
   };
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await spotifyAPI.getWrapHistory(nextCursor);
+      setWraps([...wraps, ...response.data.wraps]);
+      setNextCursor(response.data.next_cursor);
+    } catch (err) {
+      console.error('Error fetching more wraps:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDeleteClick = (wrapId) => {
     setDeleteModal({ open: true, wrapId });
   };
@@ -84,6 +100,16 @@ function WrapHistory() {
         </div>
       )}
 
+      {nextCursor && (
+        <button
+          className="load-more-button"
+          onClick={handleLoadMore}
+          disabled={loadingMore}
+        >
+          {loadingMore ? 'Loading...' : 'Load More'}
+        </button>
+      )}
+
       {/* Confirmation Modal */}
       <Dialog
         open={deleteModal.open}
@@ -61,9 +61,15 @@ export const spotifyAPI = {
   getUserPlaylists: () => api.get('/spotify/playlists/'),
   getLatestWrap: () => api.get('/spotify/wraps/latest/'),
   getWrappedData: () => api.get('/spotify/wrapped/'),
-  getWrapHistory: () => api.get('/spotify/wraps/'),
+  getWrapHistory: (cursor) =>
+    api.get('/spotify/wraps/', { params: cursor ? { cursor } : {} }),
   getWrapDetail: (wrapId) => api.get(`/spotify/wraps/${wrapId}/`),
   deleteWrap: (wrapId) => api.delete(`/spotify/wraps/${wrapId}/`),
+  getDuoCompatibility: (wrapId) => api.get(`/spotify/duo/${wrapId}/`),
+  rankDuoCompatibility: (wrapIds) =>
+    api.post('/spotify/duo/rank/', { wrap_ids: wrapIds }),
+  getGameRound: (rounds, timeRange) =>
+    api.get('/spotify/games/round/', { params: { rounds, time_range: timeRange } }),
   createWrapped: (timeRange) => 
     api.post('/spotify/wrapped/create/', 
       { time_range: timeRange },
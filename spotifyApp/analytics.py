@@ -0,0 +1,157 @@
+"""
+Wrap analytics, computed once when a wrap is written.
+
+Everything the wrap slides derive from the raw sections is computed here and
+stored on the wrap (see SpotifyWrap.get_analytics):
+
+    {
+        'version': 1,
+        'genres': [{'genre': 'pop', 'count': 7, 'share': 0.18}, ...],
+        'popularity': {'tracks': 71.4, 'artists': 80.2},
+        'diversity': {'unique_artists': 31, 'tracks': 40, 'artists_per_track': 0.775,
+                      'genre_entropy': 0.91},
+        'overlap': {'tracks': {'count': 4, 'ratio': 0.1111}, 'artists': {...}},
+        'rank_changes': {'tracks': [{'id': ..., 'name': ..., 'rank': 1,
+                                     'all_time_rank': 5, 'change': 4}, ...],
+                         'artists': [...]},
+    }
+
+``overlap`` and ``rank_changes`` compare each recent list with its all-time
+counterpart and are empty for single time-range wraps. A ``change`` of None
+marks an item that is not in the all-time list at all.
+"""
+
+import math
+from collections import Counter
+
+
+ANALYTICS_VERSION = 1
+
+# Genres kept in the histogram
+TOP_GENRES = 20
+
+# (recent, all-time) section pairs compared for overlap and rank changes
+SECTION_PAIRS = {
+    'tracks': ('topTracksRecent', 'topTracksAllTime'),
+    'artists': ('topArtistsRecent', 'topArtistsAllTime'),
+}
+
+
+def _items(wrap_data, kind):
+    """Returns every item of one kind ('track' or 'artist'), deduplicated by ID."""
+    items = {}
+    for section in wrap_data.values():
+        if not isinstance(section, dict) or not isinstance(section.get('items'), list):
+            continue
+        for item in section['items']:
+            if isinstance(item, dict) and item.get('id') and item.get('type') == kind:
+                items.setdefault(item['id'], item)
+    return list(items.values())
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def _section_items(wrap_data, name):
+    section = wrap_data.get(name)
+    if not isinstance(section, dict):
+        return []
+    return [item for item in section.get('items') or [] if isinstance(item, dict) and item.get('id')]
+
+
+def genre_histogram(artists):
+    """
+    Counts how many of the wrap's artists carry each genre.
+
+    Returns:
+        A (histogram, counts) tuple: the TOP_GENRES most common genres with
+        their share, and the full Counter.
+    """
+    counts = Counter(genre for artist in artists for genre in artist.get('genres') or [])
+    total = sum(counts.values())
+    return [
+        {'genre': genre, 'count': count, 'share': round(count / total, 4)}
+        for genre, count in counts.most_common(TOP_GENRES)
+    ], counts
+
+
+def genre_entropy(counts):
+    """Shannon entropy of the genre counts, scaled to [0, 1]."""
+    total = sum(counts.values())
+    if len(counts) < 2:
+        return 0.0
+    entropy = -sum(count / total * math.log(count / total) for count in counts.values())
+    return round(entropy / math.log(len(counts)), 4)
+
+
+def overlap(recent, all_time):
+    """Items in both lists, as a count and as a share of the items in either."""
+    recent_ids = {item['id'] for item in recent}
+    all_time_ids = {item['id'] for item in all_time}
+    union = recent_ids | all_time_ids
+    shared = recent_ids & all_time_ids
+    return {'count': len(shared), 'ratio': round(len(shared) / len(union), 4) if union else 0.0}
+
+
+def rank_changes(recent, all_time):
+    """
+    Ranks of the recent list against the all-time list. A positive
+    ``change`` means the item ranks higher recently than all-time.
+    """
+    all_time_ranks = {item['id']: rank for rank, item in enumerate(all_time, start=1)}
+    changes = []
+    for rank, item in enumerate(recent, start=1):
+        all_time_rank = all_time_ranks.get(item['id'])
+        changes.append({
+            'id': item['id'],
+            'name': item.get('name'),
+            'rank': rank,
+            'all_time_rank': all_time_rank,
+            'change': all_time_rank - rank if all_time_rank is not None else None,
+        })
+    return changes
+
+
+def compute_analytics(wrap_data):
+    """
+    Computes a wrap's analytics.
+
+    Args:
+        wrap_data: The wrap in response shape (sections of paging objects).
+
+    Returns:
+        The analytics dict described in the module docstring.
+    """
+    tracks = _items(wrap_data, 'track')
+    artists = _items(wrap_data, 'artist')
+    genres, genre_counts = genre_histogram(artists)
+    track_artists = {
+        artist['id'] for track in tracks for artist in track.get('artists') or [] if artist.get('id')
+    }
+
+    analytics = {
+        'version': ANALYTICS_VERSION,
+        'genres': genres,
+        'popularity': {
+            'tracks': _mean(track.get('popularity') for track in tracks),
+            'artists': _mean(artist.get('popularity') for artist in artists),
+        },
+        'diversity': {
+            'unique_artists': len(track_artists),
+            'tracks': len(tracks),
+            'artists_per_track': round(len(track_artists) / len(tracks), 4) if tracks else None,
+            'genre_entropy': genre_entropy(genre_counts),
+        },
+        'overlap': {},
+        'rank_changes': {},
+    }
+    for kind, (recent_name, all_time_name) in SECTION_PAIRS.items():
+        if recent_name not in wrap_data or all_time_name not in wrap_data:
+            continue
+        recent = _section_items(wrap_data, recent_name)
+        all_time = _section_items(wrap_data, all_time_name)
+        analytics['overlap'][kind] = overlap(recent, all_time)
+        analytics['rank_changes'][kind] = rank_changes(recent, all_time)
+    return analytics
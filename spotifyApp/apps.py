@@ -5,3 +5,6 @@ from django.apps import AppConfig
 class SpotifyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'spotifyApp'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
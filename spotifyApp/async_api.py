@@ -0,0 +1,361 @@
+"""
+Async Spotify client for the SpotifyWrapper project.
+
+AsyncSpotifyAPI provides the Spotify-bound SpotifyAPI methods as
+coroutines on a shared ``httpx.AsyncClient``. Under ASGI, one worker can
+then keep hundreds of upstream calls in flight instead of blocking a thread
+per call.
+
+It follows the same policies as the sync client:
+- the same response cache, ETag revalidation and cache keys;
+- the shared rate limiter, and Retry-After blocking;
+- jittered retries for GETs.
+
+The per-process concurrency cap is the async client's connection limit.
+"""
+
+import asyncio
+import hashlib
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from . import circuit, fanout, metrics, ratelimit, transport
+from .cache import response_cache
+from .catalog import catalog_cache
+from .exceptions import SpotifyAPIError
+from .fanout import FanOutResult, FanOutTimeout
+from .previews import known_previews, preview_cache
+from .tokens import stamp_expiry
+from .views import TRACKS_BATCH_SIZE
+
+
+# One client per event loop, since httpx clients are bound to the loop they run on
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Returns the pooled AsyncClient for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        max_connections = getattr(settings, 'SPOTIFY_ASYNC_MAX_CONNECTIONS', 200)
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(
+                getattr(settings, 'SPOTIFY_HTTP_READ_TIMEOUT', 10),
+                connect=getattr(settings, 'SPOTIFY_HTTP_CONNECT_TIMEOUT', 3.05),
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+class AsyncSpotifyAPI:
+    """
+    Async counterpart of SpotifyAPI for the Spotify-bound endpoints.
+
+    Args:
+        spotify: A SpotifyAPI instance supplying configuration and the
+            client-credential headers.
+    """
+
+    def __init__(self, spotify):
+        self.spotify = spotify
+        self.base_url = spotify.base_url
+        self.token_url = spotify.token_url
+        self.client = get_async_client()
+
+    async def _request(self, method, url, **kwargs):
+        """
+        Sends a request with the same rate limiting, circuit breaking, retry
+        and fan-out deadline policy as SpotifyAPI._request.
+
+        The adaptive concurrency limiter is left out: it bounds pool threads,
+        and this path holds none, so it neither takes a slot nor adjusts the
+        limit. Concurrency here is bounded by the token bucket and the
+        client's connection limits.
+        """
+        retries = getattr(settings, 'SPOTIFY_MAX_RETRIES', 3) if method == 'GET' else 0
+        breaker = circuit.breaker_for(url)
+        started = time.perf_counter()
+        response = None
+
+        try:
+            for attempt in range(retries + 1):
+                retry_after = None
+                response = None
+                breaker.check()
+                await ratelimit.token_bucket.aacquire(fanout.time_left())
+                # Waiting for a token may have used up the deadline
+                connect, read = transport.get_timeout(fanout.time_left())
+                try:
+                    ticket = breaker.before_call()
+                    failed = None
+                    try:
+                        response = await self.client.request(
+                            method, url, timeout=httpx.Timeout(read, connect=connect), **kwargs
+                        )
+                        failed = response.status_code >= 500
+                    except httpx.TransportError:
+                        failed = True
+                        raise
+                    finally:
+                        # Also runs on cancellation, so a probe slot is never kept
+                        breaker.record(ticket, failed)
+                except httpx.TransportError:
+                    delay = ratelimit.backoff_delay(attempt)
+                    if attempt == retries or fanout.out_of_time(delay):
+                        raise
+                else:
+                    if response.status_code == 429:
+                        retry_after = ratelimit.parse_retry_after(response) or 1
+                        await ratelimit.token_bucket.ablock_for(retry_after)
+                    elif response.status_code < 500:
+                        return response
+                    delay = ratelimit.backoff_delay(attempt, retry_after)
+                    if attempt == retries or fanout.out_of_time(delay):
+                        return response
+                await asyncio.sleep(delay)
+        finally:
+            metrics.record_upstream(
+                method, url, response.status_code if response is not None else 'error',
+                time.perf_counter() - started
+            )
+
+    def _raise_for_status(self, response, label='Spotify Error'):
+        if response.status_code == 429:
+            raise SpotifyAPIError(
+                'Spotify rate limit reached, try again shortly',
+                status_code=429,
+                retry_after=ratelimit.parse_retry_after(response),
+            )
+        raise SpotifyAPIError(f"{label}: {response.text}", status_code=response.status_code)
+
+    async def _cache_scope(self, access_token):
+        """Async version of SpotifyAPI._cache_scope."""
+        token_key = hashlib.sha256(access_token.encode()).hexdigest()
+        user_id = await response_cache.aget_identity(token_key)
+        if user_id:
+            return user_id
+
+        url = f'{self.base_url}/me'
+        response = await self._request('GET', url, headers=self.spotify.get_headers(access_token))
+        if response.status_code != 200:
+            return f'token:{token_key}'
+
+        profile = response.json()
+        user_id = profile['id']
+        await response_cache.aset_identity(token_key, user_id)
+        await response_cache.aset(
+            'profile', response_cache.make_key(user_id, 'profile', url),
+            profile, etag=response.headers.get('ETag')
+        )
+        return user_id
+
+    async def _cached_get(self, access_token, endpoint, url, params=None, scope=None):
+        """Async version of SpotifyAPI._cached_get; returns (status_code, data)."""
+        if scope is None:
+            scope = await self._cache_scope(access_token)
+        key = response_cache.make_key(scope, endpoint, url, params)
+        entry = await response_cache.aget(key)
+        if entry is not None and response_cache.is_fresh(entry):
+            response_cache.record(endpoint, 'hits')
+            return 200, entry['data']
+
+        headers = self.spotify.get_headers(access_token)
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        response = await self._request('GET', url, headers=headers, params=params)
+
+        if response.status_code == 304 and entry is not None:
+            response_cache.record(endpoint, 'revalidations')
+            await response_cache.aset(endpoint, key, entry['data'], etag=entry['etag'])
+            return 200, entry['data']
+
+        if response.status_code == 200:
+            response_cache.record(endpoint, 'refetches' if entry is not None else 'misses')
+            data = response.json()
+            await response_cache.aset(endpoint, key, data, etag=response.headers.get('ETag'))
+            return 200, data
+
+        self._raise_for_status(response)
+
+    async def get_access_token(self, code):
+        """Exchanges the authorization code for an access token."""
+        data = {
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': self.spotify.redirect_uri
+        }
+        response = await self._request(
+            'POST', self.token_url, headers=self.spotify._basic_auth_headers(), data=data
+        )
+        if response.status_code == 200:
+            return stamp_expiry(response.json())
+        self._raise_for_status(response, 'Token Error')
+
+    async def get_user_top_items(self, access_token, item_type, time_range='medium_term', limit=20):
+        """Retrieves the user's top tracks or artists."""
+        _, data = await self._cached_get(
+            access_token, 'top_items',
+            f'{self.base_url}/me/top/{item_type}',
+            params={'time_range': time_range, 'limit': limit}
+        )
+        await catalog_cache.aremember(data.get('items', []))
+        return data
+
+    async def _get_batch(self, access_token, kind, spotify_ids):
+        response = await self._request(
+            'GET', f'{self.base_url}/{kind}s',
+            headers=self.spotify.get_headers(access_token),
+            params={'ids': ','.join(spotify_ids)}
+        )
+        if response.status_code == 200:
+            return dict(zip(spotify_ids, response.json().get(f'{kind}s', [])))
+        self._raise_for_status(response)
+
+    async def _get_many(self, access_token, kind, spotify_ids):
+        """Async version of SpotifyAPI._get_many; batches run concurrently."""
+        spotify_ids = list(dict.fromkeys(spotify_ids))
+        if not spotify_ids:
+            return {}
+        result = await self.fetch_concurrently({
+            index: ('_get_batch', access_token, kind, spotify_ids[index:index + TRACKS_BATCH_SIZE])
+            for index in range(0, len(spotify_ids), TRACKS_BATCH_SIZE)
+        })
+        if result.failed:
+            raise next(iter(result.errors.values()))
+        objects = {spotify_id: obj for batch in result.results.values() for spotify_id, obj in batch.items()}
+        await catalog_cache.aremember(obj for obj in objects.values() if obj)
+        return objects
+
+    async def get_tracks(self, track_ids, access_token):
+        """Async version of SpotifyAPI.get_tracks; batches run concurrently."""
+        return await self._get_many(access_token, 'track', track_ids)
+
+    async def get_track_previews(self, track_ids, access_token):
+        """Async version of SpotifyAPI.get_track_previews."""
+        found, missing = await preview_cache.alookup(track_ids)
+        if missing:
+            known = known_previews((await catalog_cache.alookup('track', missing))[0].values())
+            if known:
+                await preview_cache.astore(known)
+                found.update(known)
+                missing = [track_id for track_id in missing if track_id not in known]
+        if missing:
+            try:
+                tracks = await self.get_tracks(missing, access_token)
+            except SpotifyAPIError:
+                tracks = None
+            if tracks is not None:
+                hydrated = {
+                    track_id: (track or {}).get('preview_url') for track_id, track in tracks.items()
+                }
+                await preview_cache.astore(hydrated)
+                found.update(hydrated)
+        return {track_id: found.get(track_id) for track_id in track_ids}
+
+    async def get_track_preview(self, track_id, access_token):
+        """Fetches the preview URL for a specific track."""
+        return (await self.get_track_previews([track_id], access_token))[track_id]
+
+    async def fetch_concurrently(self, calls, timeout=None):
+        """
+        Runs several AsyncSpotifyAPI calls concurrently against one deadline.
+
+        Takes the same ``calls`` mapping as SpotifyAPI.fetch_concurrently.
+
+        Returns:
+            A FanOutResult holding per-name results and errors.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'SPOTIFY_FANOUT_TIMEOUT', 10)
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        # Each task carries the deadline, like the calls of a sync fan-out
+        tasks = {
+            loop.create_task(
+                getattr(self, method)(*args), context=fanout.call_context(started + timeout)
+            ): name
+            for name, (method, *args) in calls.items()
+        }
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+
+        results = {}
+        errors = {}
+        for task in done:
+            if task.exception() is not None:
+                errors[tasks[task]] = task.exception()
+            else:
+                results[tasks[task]] = task.result()
+        for task in pending:
+            task.cancel()
+            errors[tasks[task]] = FanOutTimeout(
+                f"Spotify call did not finish within {timeout} seconds"
+            )
+        return FanOutResult(results, errors, time.monotonic() - started)
+
+    async def _get_page(self, access_token, url, params=None):
+        response = await self._request(
+            'GET', url, headers=self.spotify.get_headers(access_token), params=params
+        )
+        if response.status_code == 200:
+            return response.json()
+        self._raise_for_status(response)
+
+    async def paginate(self, access_token, url, params=None, page_size=50):
+        """
+        Async version of SpotifyAPI.paginate.
+
+        The first page is fetched before this returns. Later pages are
+        fetched concurrently when ``total`` is known.
+
+        Returns:
+            An async generator of collection items.
+        """
+        params = {**(params or {}), 'limit': page_size}
+        first = await self._get_page(access_token, url, {**params, 'offset': 0})
+        return self._iter_pages(access_token, url, params, first)
+
+    async def _iter_pages(self, access_token, url, params, first):
+        for item in first.get('items', []):
+            yield item
+        if not first.get('next'):
+            return
+
+        total = first.get('total')
+        if total is None:
+            page = first
+            while page.get('next'):
+                page = await self._get_page(access_token, page['next'])
+                for item in page.get('items', []):
+                    yield item
+            return
+
+        window = getattr(settings, 'SPOTIFY_PAGINATE_PREFETCH', 4)
+        pending = []
+        try:
+            for offset in range(params['limit'], total, params['limit']):
+                pending.append(asyncio.ensure_future(
+                    self._get_page(access_token, url, {**params, 'offset': offset})
+                ))
+                if len(pending) > window:
+                    for item in (await pending.pop(0)).get('items', []):
+                        yield item
+            while pending:
+                for item in (await pending.pop(0)).get('items', []):
+                    yield item
+        finally:
+            # A page failed or the caller stopped early; drop the prefetches
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a failed page as retrieved so asyncio does not log it
+                    task.exception()
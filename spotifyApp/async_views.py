@@ -0,0 +1,480 @@
+"""
+Native async versions of the Spotify-bound views.
+
+Enabled with ``settings.SPOTIFY_ASYNC_VIEWS`` when the project runs under
+ASGI. Each view awaits its Spotify calls on the shared async HTTP client, so
+a request that waits on Spotify does not hold a worker thread. The routes,
+request and response shapes, and status codes match the DRF views in
+views.py, so the frontend cannot tell which set is in use.
+
+These are plain Django async views. DRF's @api_view does not run
+coroutines, so authentication and errors are handled the same way DRF does
+them, but by hand.
+"""
+
+from datetime import datetime
+import asyncio
+import json
+import logging
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+
+from . import circuit, games, jobs
+from .async_api import AsyncSpotifyAPI
+from .exceptions import SpotifyAPIError
+from .models import SpotifyCredential, WrapJob
+from .previews import preview_cache
+from .tokens import TokenManager, TokenRefreshError
+from .views import (
+    SpotifyAPI, WRAPPED_SECTIONS, claim_inline_job, enqueue_job, fanout_error, job_payload,
+    job_status, parse_game_round_params, parse_job_wait, precomputed_wrap_payload,
+    stale_wrap_payload, stream_error_element,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def spotify_error_response(error, extra=None):
+    """JsonResponse version of views.spotify_error_response."""
+    body = {'error': str(error), **(extra or {})}
+    if isinstance(error, SpotifyAPIError) and (error.rate_limited or error.unavailable):
+        response = JsonResponse(body, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if error.retry_after:
+            response['Retry-After'] = str(math.ceil(error.retry_after))
+        return response
+    return JsonResponse(body, status=status.HTTP_502_BAD_GATEWAY)
+
+
+def job_response(body, status_code, status_url):
+    """JsonResponse version of views.job_response."""
+    response = JsonResponse(body, status=status_code)
+    response['Location'] = status_url
+    return response
+
+
+def fanout_error_response(result):
+    """JsonResponse version of views.fanout_error_response."""
+    return spotify_error_response(fanout_error(result), extra={'errors': result.error_messages()})
+
+
+async def stale_or_error_response(user, error, messages=None):
+    """Async version of views.stale_or_error_response."""
+    if error.transient:
+        payload = await sync_to_async(stale_wrap_payload)(user, error.retry_after)
+        if payload is not None:
+            return JsonResponse(payload)
+    return spotify_error_response(error, extra={'errors': messages} if messages else None)
+
+
+def not_authenticated_response():
+    """The 403 DRF returns to anonymous users on IsAuthenticated views."""
+    return JsonResponse(
+        {'detail': 'Authentication credentials were not provided.'},
+        status=status.HTTP_403_FORBIDDEN
+    )
+
+
+def csrf_failure(request):
+    """
+    Applies DRF's SessionAuthentication CSRF rule: CSRF is enforced only for
+    session-authenticated users.
+
+    Returns:
+        The rejection response, or None if the request may proceed.
+    """
+    check = CsrfViewMiddleware(lambda req: None)
+    check.process_request(request)
+    reason = check.process_view(request, None, (), {})
+    if reason is not None:
+        return JsonResponse(
+            {'detail': 'CSRF Failed: CSRF token missing or incorrect.'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    return None
+
+
+async def stream_json_array(items):
+    """Async version of views.stream_json_array."""
+    yield '['
+    index = 0
+    try:
+        async for item in items:
+            yield (',' if index else '') + json.dumps(item)
+            index += 1
+    except Exception as e:
+        yield (',' if index else '') + json.dumps(stream_error_element(e))
+    yield ']'
+
+
+async def job_changed(job):
+    """Reloads a job if its status changed in the database; returns True if it did."""
+    current = await WrapJob.objects.filter(pk=job.pk).values_list('status', flat=True).afirst()
+    if current == job.status:
+        return False
+    await sync_to_async(job.refresh_from_db)()
+    return True
+
+
+async def stream_job_events(job, deadline):
+    """
+    Yields server-sent events for a job: one ``status`` event per status
+    change, until the job finishes or the deadline passes.
+    """
+    interval = getattr(settings, 'SPOTIFY_JOB_STATUS_POLL_INTERVAL', 0.5)
+    yield f"event: status\ndata: {json.dumps(await sync_to_async(job_payload)(job))}\n\n"
+    while job.status not in WrapJob.FINISHED:
+        if time.monotonic() >= deadline:
+            yield "event: timeout\ndata: {}\n\n"
+            return
+        await asyncio.sleep(interval)
+        if await job_changed(job):
+            yield f"event: status\ndata: {json.dumps(await sync_to_async(job_payload)(job))}\n\n"
+        else:
+            yield ": keep-alive\n\n"
+
+
+async def get_session_access_token(request, spotify):
+    """
+    Async version of views.get_session_access_token.
+
+    Refreshes go through the sync TokenManager in a worker thread, so they
+    keep its single-flight locking. Only requests whose token is about to
+    expire pay for the thread hop.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        token_info = await SpotifyCredential.aload(user.pk)
+        if token_info is None and await request.session.ahas_key('spotify_token'):
+            token_info = await request.session.apop('spotify_token')
+            await SpotifyCredential.astore(user, token_info)
+    else:
+        token_info = await request.session.aget('spotify_token')
+    if not token_info:
+        return None
+
+    manager = TokenManager(spotify)
+    if not manager.needs_refresh(token_info):
+        return token_info['access_token']
+
+    try:
+        fresh = await sync_to_async(manager.ensure_fresh, thread_sensitive=False)(token_info)
+    except TokenRefreshError:
+        if user.is_authenticated:
+            await SpotifyCredential.aclear(user.pk)
+        else:
+            await request.session.apop('spotify_token')
+        return None
+
+    if user.is_authenticated:
+        await SpotifyCredential.astore(user, fresh)
+    else:
+        await request.session.aset('spotify_token', fresh)
+    return fresh['access_token']
+
+
+@csrf_exempt
+@require_POST
+async def spotify_callback(request):
+    """
+    Handles the Spotify OAuth callback, exchanges code for tokens, and stores them.
+
+    Args:
+        request: The HTTP request containing the authorization code.
+
+    Returns:
+        A JSON response indicating successful authentication.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        rejected = csrf_failure(request)
+        if rejected is not None:
+            return rejected
+
+    try:
+        try:
+            code = json.loads(request.body or b'{}').get('code')
+        except ValueError:
+            code = request.POST.get('code')
+        if not code:
+            return JsonResponse(
+                {'error': 'No authorization code provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        spotify = AsyncSpotifyAPI(SpotifyAPI())
+        token_info = await spotify.get_access_token(code)
+        if user.is_authenticated:
+            await SpotifyCredential.astore(user, token_info)
+        else:
+            await request.session.aset('spotify_token', token_info)
+        return JsonResponse({'message': 'Successfully authenticated with Spotify'})
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_playlists(request):
+    """
+    Retrieves all of the user's playlists from Spotify.
+
+    Pages are fetched concurrently on the event loop and streamed to the
+    client as a JSON array while later pages are still loading. A page that
+    fails after the first ends the array with an error element, like the
+    sync view.
+
+    Args:
+        request: The HTTP request containing the user's session.
+
+    Returns:
+        A streamed JSON array of playlists, or an error message.
+    """
+    if not (await request.auser()).is_authenticated:
+        return not_authenticated_response()
+
+    try:
+        sync_api = SpotifyAPI()
+        access_token = await get_session_access_token(request, sync_api)
+        if not access_token:
+            return JsonResponse(
+                {'error': 'Not authenticated with Spotify'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        spotify = AsyncSpotifyAPI(sync_api)
+        playlists = await spotify.paginate(access_token, f'{spotify.base_url}/me/playlists')
+        return StreamingHttpResponse(
+            stream_json_array(playlists),
+            content_type='application/json'
+        )
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_wrapped_data(request):
+    """
+    Fetches Spotify Wrapped data, including top tracks and artists for the user.
+
+    Serves precomputed wraps and honours ``Prefer: respond-async`` like the
+    sync view.
+
+    Args:
+        request: The HTTP request containing the user's session.
+
+    Returns:
+        A JSON response with the wrapped data or an error message.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return not_authenticated_response()
+
+    try:
+        sync_api = SpotifyAPI()
+        access_token = await get_session_access_token(request, sync_api)
+
+        if not access_token:
+            return JsonResponse(
+                {'error': 'No Spotify token found. Please reconnect your account.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        if request.GET.get('refresh') not in ('1', 'true'):
+            precomputed = await sync_to_async(precomputed_wrap_payload)(user)
+            if precomputed is not None:
+                return JsonResponse(precomputed)
+
+        if 'respond-async' in request.headers.get('Prefer', '') or request.GET.get('async') in ('1', 'true'):
+            return job_response(*await sync_to_async(enqueue_job)(user, WrapJob.WRAPPED))
+
+        retry_after = circuit.retry_after(
+            f'{sync_api.base_url}/me/top/{item_type}' for item_type in ('tracks', 'artists')
+        )
+        if retry_after is not None:
+            return await stale_or_error_response(user, SpotifyAPIError(
+                'Spotify is unavailable, try again shortly',
+                status_code=503, retry_after=retry_after, unavailable=True,
+            ))
+
+        job, existing = await sync_to_async(claim_inline_job)(user, WrapJob.WRAPPED)
+        if job is None:
+            return job_response(*existing)
+
+        spotify = AsyncSpotifyAPI(sync_api)
+        result = await spotify.fetch_concurrently({
+            name: ('get_user_top_items', access_token, item_type, time_range, 20)
+            for name, (item_type, time_range) in WRAPPED_SECTIONS.items()
+        })
+
+        if not result.ok:
+            await sync_to_async(jobs.fail)(job, str(fanout_error(result)))
+
+        if result.failed:
+            return await stale_or_error_response(user, fanout_error(result), result.error_messages())
+
+        wrapped_data = {name: result.results.get(name) for name in WRAPPED_SECTIONS}
+
+        if not result.ok:
+            # Serve what we have, but don't persist an incomplete wrap
+            return JsonResponse({
+                'id': None,
+                'wrap_data': wrapped_data,
+                'errors': result.error_messages()
+            })
+
+        wrap = await sync_to_async(jobs.complete)(
+            job, wrapped_data, title=f"Wrap - {datetime.now().strftime('%Y-%m-%d')}"
+        )
+        if wrap is None:
+            return job_response(*await sync_to_async(job_status)(job))
+
+        return JsonResponse({
+            'id': wrap.id,
+            'wrap_data': wrapped_data,
+            'analytics': wrap.analytics
+        })
+
+    except SpotifyAPIError as e:
+        if e.transient:
+            return await stale_or_error_response(user, e)
+        return spotify_error_response(e)
+    except Exception as e:
+        logger.exception("Error in get_wrapped_data")
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@require_GET
+async def get_wrap_job(request, job_id):
+    """
+    Reports the status of a queued wrap job, like the sync view, with the
+    same capped ``?wait=`` long polling.
+
+    A client sending ``Accept: text/event-stream`` gets server-sent events
+    instead, one per status change, for up to
+    ``settings.SPOTIFY_JOB_STREAM_MAX_WAIT`` seconds. Only this view offers
+    them: an open stream holds no thread here while it waits.
+
+    Args:
+        request: The HTTP request with the authenticated user's details.
+        job_id: The ID of the WrapJob.
+
+    Returns:
+        A JSON response with the job, an event stream, or an error message.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return not_authenticated_response()
+
+    try:
+        job = await WrapJob.objects.select_related('wrap').aget(id=job_id, user=user)
+    except WrapJob.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        max_wait = getattr(settings, 'SPOTIFY_JOB_STREAM_MAX_WAIT', 60)
+        response = StreamingHttpResponse(
+            stream_job_events(job, time.monotonic() + max_wait),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    wait, error = parse_job_wait(request.GET)
+    if error:
+        return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    deadline = time.monotonic() + wait
+    interval = getattr(settings, 'SPOTIFY_JOB_STATUS_POLL_INTERVAL', 0.5)
+    while job.status not in WrapJob.FINISHED and time.monotonic() < deadline:
+        await asyncio.sleep(min(interval, max(0, deadline - time.monotonic())))
+        await job_changed(job)
+    return JsonResponse(await sync_to_async(job_payload)(job))
+
+
+@require_GET
+async def get_track_preview(request, track_id):
+    """
+    Retrieves the preview URL for a track, for the guessing game.
+
+    Args:
+        request: The HTTP request containing the user's session.
+        track_id: The Spotify ID of the track.
+
+    Returns:
+        A JSON response with the track ID and its preview URL, or an error message.
+    """
+    if not (await request.auser()).is_authenticated:
+        return not_authenticated_response()
+
+    try:
+        sync_api = SpotifyAPI()
+        access_token = await get_session_access_token(request, sync_api)
+        if not access_token:
+            return JsonResponse(
+                {'error': 'Not authenticated with Spotify'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        preview_url = await AsyncSpotifyAPI(sync_api).get_track_preview(track_id, access_token)
+        return JsonResponse({'id': track_id, 'preview_url': preview_url})
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@require_GET
+async def get_game_round(request):
+    """
+    Assembles a song guessing game round from the user's top tracks.
+
+    Args:
+        request: The HTTP request, with optional ``time_range`` and
+            ``rounds`` query parameters.
+
+    Returns:
+        A JSON response with the round's questions, or an error message.
+    """
+    if not (await request.auser()).is_authenticated:
+        return not_authenticated_response()
+
+    time_range, rounds, error = parse_game_round_params(request.GET)
+    if error:
+        return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        sync_api = SpotifyAPI()
+        access_token = await get_session_access_token(request, sync_api)
+        if not access_token:
+            return JsonResponse(
+                {'error': 'Not authenticated with Spotify'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        spotify = AsyncSpotifyAPI(sync_api)
+        top_tracks = await spotify.get_user_top_items(access_token, 'tracks', time_range, 50)
+        tracks = top_tracks.get('items', [])
+        await preview_cache.aremember(tracks)
+        previews = await spotify.get_track_previews([track['id'] for track in tracks], access_token)
+        return JsonResponse({
+            'time_range': time_range,
+            'questions': games.build_round(tracks, previews, rounds),
+        })
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
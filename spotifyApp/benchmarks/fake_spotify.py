@@ -0,0 +1,207 @@
+"""
+A local stand-in for the Spotify Web API and accounts service.
+
+Serves realistic payloads from a synthetic catalog (see payloads.py) with
+configurable latency, so load tests exercise this service without touching
+the real Spotify API. It can also fail a share of the /v1 requests with a
+5xx or a 429, to see how the app behaves while Spotify struggles. Point the
+app at it through the ``SPOTIFY_API_BASE_URL`` and ``SPOTIFY_ACCOUNTS_URL``
+settings.
+
+Endpoints:
+    POST /api/token
+    GET  /v1/me
+    GET  /v1/me/top/{tracks,artists}
+    GET  /v1/me/playlists
+    GET  /v1/tracks/{id}
+    GET  /v1/tracks?ids=...
+    GET  /v1/artists?ids=...
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .payloads import Catalog, paging
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the catalog, the latency and the fault settings.
+
+    Args:
+        address: (host, port) to bind; port 0 picks a free port.
+        latency: Seconds added to every response.
+        jitter: Mean of an exponentially distributed extra delay, in seconds,
+            which gives the latency a long tail.
+        error_rate: Share of /v1 requests answered with a 500, 502 or 503.
+        rate_limit_rate: Share of /v1 requests answered with a 429.
+        retry_after: Retry-After seconds sent with injected 429s.
+        seed: Seed for the synthetic catalog.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, seed=0):
+        super().__init__(address, FakeSpotifyHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.catalog = Catalog(seed=seed)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.request_count = 0
+        # Requests per path, and injected faults by kind ('error', 'rate_limited')
+        self.path_counts = Counter()
+        self.injected = Counter()
+
+    def reset_counts(self):
+        """Zeroes the request and fault counters, e.g. between benchmark runs."""
+        with self.rng_lock:
+            self.request_count = 0
+            self.path_counts.clear()
+            self.injected.clear()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, keep-alive
+    # clients stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _begin(self):
+        """
+        Counts and delays the request, then injects a fault if one is drawn.
+
+        Returns:
+            True if a fault response was sent and the request is done.
+        """
+        server = self.server
+        path = urlparse(self.path).path
+        with server.rng_lock:
+            server.request_count += 1
+            server.path_counts[path] += 1
+            delay = server.latency + (server.rng.expovariate(1 / server.jitter) if server.jitter else 0)
+            draw = server.rng.random()
+            status = server.rng.choice((500, 502, 503))
+        if delay:
+            time.sleep(delay)
+        if not path.startswith('/v1/'):
+            return False
+        if draw < server.rate_limit_rate:
+            with server.rng_lock:
+                server.injected['rate_limited'] += 1
+            self._send_json(
+                {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                status=429, headers={'Retry-After': str(server.retry_after)},
+            )
+            return True
+        if draw < server.rate_limit_rate + server.error_rate:
+            with server.rng_lock:
+                server.injected['error'] += 1
+            self._send_json({'error': {'status': status, 'message': 'Injected failure'}}, status=status)
+            return True
+        return False
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self._begin():
+            return
+        if urlparse(self.path).path != '/api/token':
+            return self._send_json({'error': 'not found'}, status=404)
+        return self._send_json({
+            'access_token': f'fake-access-{time.time_ns()}',
+            'token_type': 'Bearer',
+            'expires_in': 3600,
+            'refresh_token': 'fake-refresh',
+            'scope': 'user-top-read',
+        })
+
+    def do_GET(self):
+        if self._begin():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        catalog = self.server.catalog
+
+        if path == '/v1/me':
+            token = self.headers.get('Authorization', '')[-12:]
+            return self._send_json({'id': f'user-{token}', 'display_name': 'Fake User', 'type': 'user'})
+
+        if path.startswith('/v1/me/top/'):
+            item_type = path.rsplit('/', 1)[-1]
+            limit = int(query.get('limit', ['20'])[0])
+            with self.server.rng_lock:
+                rng = random.Random(self.server.rng.random())
+            return self._send_json(catalog.top_items(rng, item_type, limit))
+
+        if path == '/v1/me/playlists':
+            limit = int(query.get('limit', ['20'])[0])
+            offset = int(query.get('offset', ['0'])[0])
+            total = 120
+            items = [
+                {'id': f'playlist{i}', 'name': f'Playlist {i}', 'type': 'playlist',
+                 'tracks': {'total': 25}, 'images': []}
+                for i in range(offset, min(offset + limit, total))
+            ]
+            page = paging(items, f'{self.server.base_url}/v1/me/playlists', limit, offset, total)
+            return self._send_json(page)
+
+        if path == '/v1/tracks' or path == '/v1/artists':
+            ids = query.get('ids', [''])[0].split(',')
+            pool = catalog.tracks_by_id if path == '/v1/tracks' else catalog.artists_by_id
+            key = path.rsplit('/', 1)[-1]
+            return self._send_json({key: [pool.get(i) for i in ids]})
+
+        if path.startswith('/v1/tracks/'):
+            track = catalog.tracks_by_id.get(path.rsplit('/', 1)[-1])
+            if track is None:
+                return self._send_json({'error': {'status': 404, 'message': 'Not found'}}, status=404)
+            return self._send_json(track)
+
+        return self._send_json({'error': {'status': 404, 'message': 'Not found'}}, status=404)
+
+
+@contextmanager
+def run_fake_spotify(**kwargs):
+    """
+    Runs a FakeSpotifyServer in a background thread for the duration of the block.
+
+    Yields:
+        The running server; use ``server.base_url`` to reach it.
+    """
+    server = FakeSpotifyServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
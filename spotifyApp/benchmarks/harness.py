@@ -0,0 +1,124 @@
+"""
+Helpers for driving the project end to end in benchmarks.
+
+``run_app_server`` serves the project's WSGI application over real HTTP,
+one thread per request like a threaded production server. ``QueryCounter``
+counts the database queries of every connection opened while it is
+installed. ``create_users`` makes logged-in users with a stored Spotify
+token, for request cookies.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db.backends.signals import connection_created
+
+from spotifyApp.models import SpotifyCredential
+from spotifyApp.tokens import stamp_expiry
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def run_app_server():
+    """
+    Serves the project on a free local port for the duration of the block.
+
+    Each request runs in its own thread and closes its database connections
+    when done, as under runserver.
+
+    Yields:
+        The base URL of the server.
+    """
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+    server.daemon_threads = True
+    server.set_app(WSGIHandler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield f'http://{host}:{port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class QueryCounter:
+    """
+    Counts queries, and the time spent in them, across all threads.
+
+    Hooks into every database connection opened while installed, so it sees
+    the queries of request threads as well as the current one.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.count += 1
+                self.seconds += elapsed
+
+    def _on_connection(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.seconds = 0.0
+
+    @contextmanager
+    def installed(self):
+        """Counts the queries of connections opened inside the block."""
+        connection_created.connect(self._on_connection)
+        try:
+            yield self
+        finally:
+            connection_created.disconnect(self._on_connection)
+
+
+def create_users(count, prefix='bench'):
+    """
+    Creates users with a logged-in session and a stored Spotify token.
+
+    Args:
+        count: Number of users.
+        prefix: Username prefix.
+
+    Returns:
+        A list of (user, cookies) pairs, where cookies holds the session cookie.
+    """
+    SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+    users = []
+    for index in range(count):
+        user = User.objects.create_user(username=f'{prefix}-{index}', password=prefix)
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        SpotifyCredential.store(user, stamp_expiry({
+            'access_token': f'{prefix}-token-{index:04d}',
+            'refresh_token': 'fake-refresh',
+            'expires_in': 3600,
+        }))
+        users.append((user, {settings.SESSION_COOKIE_NAME: session.session_key}))
+    return users
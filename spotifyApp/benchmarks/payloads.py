@@ -0,0 +1,191 @@
+"""
+Synthetic Spotify payloads for benchmarks.
+
+Builds track, artist and paging objects with the same fields and
+approximate sizes as real Spotify Web API responses: image sets,
+available_markets arrays, external URLs and so on. Output is deterministic
+for a given seed, so runs are comparable.
+"""
+
+import random
+import string
+
+
+MARKETS = [
+    'AD', 'AE', 'AG', 'AL', 'AM', 'AO', 'AR', 'AT', 'AU', 'AZ', 'BA', 'BB', 'BD', 'BE', 'BF', 'BG',
+    'BH', 'BI', 'BJ', 'BN', 'BO', 'BR', 'BS', 'BT', 'BW', 'BY', 'BZ', 'CA', 'CD', 'CG', 'CH', 'CI',
+    'CL', 'CM', 'CO', 'CR', 'CV', 'CW', 'CY', 'CZ', 'DE', 'DJ', 'DK', 'DM', 'DO', 'DZ', 'EC', 'EE',
+    'EG', 'ES', 'ET', 'FI', 'FJ', 'FM', 'FR', 'GA', 'GB', 'GD', 'GE', 'GH', 'GM', 'GN', 'GQ', 'GR',
+    'GT', 'GW', 'GY', 'HK', 'HN', 'HR', 'HT', 'HU', 'ID', 'IE', 'IL', 'IN', 'IQ', 'IS', 'IT', 'JM',
+    'JO', 'JP', 'KE', 'KG', 'KH', 'KI', 'KM', 'KN', 'KR', 'KW', 'KZ', 'LA', 'LB', 'LC', 'LI', 'LK',
+    'LR', 'LS', 'LT', 'LU', 'LV', 'LY', 'MA', 'MC', 'MD', 'ME', 'MG', 'MH', 'MK', 'ML', 'MN', 'MO',
+    'MR', 'MT', 'MU', 'MV', 'MW', 'MX', 'MY', 'MZ', 'NA', 'NE', 'NG', 'NI', 'NL', 'NO', 'NP', 'NR',
+    'NZ', 'OM', 'PA', 'PE', 'PG', 'PH', 'PK', 'PL', 'PS', 'PT', 'PW', 'PY', 'QA', 'RO', 'RS', 'RW',
+    'SA', 'SB', 'SC', 'SE', 'SG', 'SI', 'SK', 'SL', 'SM', 'SN', 'SR', 'ST', 'SV', 'SZ', 'TD', 'TG',
+    'TH', 'TJ', 'TL', 'TN', 'TO', 'TR', 'TT', 'TV', 'TW', 'TZ', 'UA', 'UG', 'US', 'UY', 'UZ', 'VC',
+    'VE', 'VN', 'VU', 'WS', 'XK', 'ZA', 'ZM', 'ZW',
+]
+
+GENRES = [
+    'pop', 'dance pop', 'indie rock', 'alt z', 'hip hop', 'rap', 'trap', 'r&b', 'edm', 'house',
+    'k-pop', 'latin', 'reggaeton', 'country', 'modern rock', 'indie pop', 'soul', 'jazz',
+    'classical', 'lo-fi beats', 'metal', 'punk', 'folk', 'afrobeats',
+]
+
+
+def spotify_id(rng):
+    """Returns a random 22-character base62 Spotify ID."""
+    return ''.join(rng.choice(string.ascii_letters + string.digits) for _ in range(22))
+
+
+def images(rng, kind, object_id):
+    return [
+        {'url': f'https://i.scdn.co/image/{kind}{size}{object_id}', 'height': size, 'width': size}
+        for size in (640, 300, 64)
+    ]
+
+
+def simple_artist(artist):
+    """Returns the simplified artist object Spotify nests inside tracks."""
+    return {key: artist[key] for key in ('external_urls', 'href', 'id', 'name', 'type', 'uri')}
+
+
+def make_artist(rng, artist_id=None):
+    artist_id = artist_id or spotify_id(rng)
+    name = ' '.join(rng.choice(['The', 'Lil', 'DJ', 'Big', 'Neon', 'Velvet', 'Blue', 'Echo']) for _ in range(2))
+    return {
+        'external_urls': {'spotify': f'https://open.spotify.com/artist/{artist_id}'},
+        'followers': {'href': None, 'total': rng.randint(1000, 50_000_000)},
+        'genres': rng.sample(GENRES, rng.randint(1, 4)),
+        'href': f'https://api.spotify.com/v1/artists/{artist_id}',
+        'id': artist_id,
+        'images': images(rng, 'ab6761610000e5eb', artist_id),
+        'name': name,
+        'popularity': rng.randint(20, 100),
+        'type': 'artist',
+        'uri': f'spotify:artist:{artist_id}',
+    }
+
+
+def make_track(rng, artists, track_id=None):
+    track_id = track_id or spotify_id(rng)
+    album_id = spotify_id(rng)
+    markets = rng.sample(MARKETS, rng.randint(150, len(MARKETS)))
+    track_artists = [simple_artist(a) for a in rng.sample(artists, rng.randint(1, 2))]
+    return {
+        'album': {
+            'album_type': 'album',
+            'artists': track_artists[:1],
+            'available_markets': markets,
+            'external_urls': {'spotify': f'https://open.spotify.com/album/{album_id}'},
+            'href': f'https://api.spotify.com/v1/albums/{album_id}',
+            'id': album_id,
+            'images': images(rng, 'ab67616d0000b273', album_id),
+            'name': f'Album {album_id[:6]}',
+            'release_date': f'20{rng.randint(10, 24):02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'release_date_precision': 'day',
+            'total_tracks': rng.randint(6, 20),
+            'type': 'album',
+            'uri': f'spotify:album:{album_id}',
+        },
+        'artists': track_artists,
+        'available_markets': markets,
+        'disc_number': 1,
+        'duration_ms': rng.randint(120_000, 300_000),
+        'explicit': rng.random() < 0.3,
+        'external_ids': {'isrc': f'US{rng.randint(10**9, 10**10 - 1)}'},
+        'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'},
+        'href': f'https://api.spotify.com/v1/tracks/{track_id}',
+        'id': track_id,
+        'is_local': False,
+        'name': f'Track {track_id[:8]}',
+        'popularity': rng.randint(10, 100),
+        'preview_url': f'https://p.scdn.co/mp3-preview/{track_id}' if rng.random() < 0.7 else None,
+        'track_number': rng.randint(1, 12),
+        'type': 'track',
+        'uri': f'spotify:track:{track_id}',
+    }
+
+
+def paging(items, url, limit=20, offset=0, total=None):
+    """Wraps items in a Spotify paging object."""
+    total = len(items) if total is None else total
+    return {
+        'href': f'{url}?offset={offset}&limit={limit}',
+        'items': items,
+        'limit': limit,
+        'next': f'{url}?offset={offset + limit}&limit={limit}' if offset + limit < total else None,
+        'offset': offset,
+        'previous': None,
+        'total': total,
+    }
+
+
+class Catalog:
+    """
+    A fixed pool of artists and tracks that synthetic users draw from.
+
+    Popular items are drawn more often, so wraps of different users overlap
+    the way real ones do.
+    """
+
+    def __init__(self, seed=0, n_artists=400, n_tracks=2000):
+        self.rng = random.Random(seed)
+        self.artists = [make_artist(self.rng) for _ in range(n_artists)]
+        self.tracks = [make_track(self.rng, self.artists) for _ in range(n_tracks)]
+        self.tracks_by_id = {t['id']: t for t in self.tracks}
+        self.artists_by_id = {a['id']: a for a in self.artists}
+
+    def _pick(self, rng, pool, count):
+        weights = [1 / (rank + 1) for rank in range(len(pool))]
+        picked = {}
+        while len(picked) < count:
+            item = rng.choices(pool, weights=weights)[0]
+            picked[item['id']] = item
+        return list(picked.values())
+
+    def top_items(self, rng, item_type, limit=20):
+        pool = self.tracks if item_type == 'tracks' else self.artists
+        return paging(
+            self._pick(rng, pool, limit),
+            f'https://api.spotify.com/v1/me/top/{item_type}', limit=limit, total=50
+        )
+
+    def wrap(self, rng, limit=20):
+        """Returns raw wrap data shaped like get_wrapped_data builds it."""
+        return {
+            'topTracksRecent': self.top_items(rng, 'tracks', limit),
+            'topTracksAllTime': self.top_items(rng, 'tracks', limit),
+            'topArtistsRecent': self.top_items(rng, 'artists', limit),
+            'topArtistsAllTime': self.top_items(rng, 'artists', limit),
+        }
+
+    def evolve(self, rng, wrap, churn=None):
+        """
+        Returns next week's wrap for the same user.
+
+        Each section keeps most of its items and replaces a fraction of them.
+        Recent lists churn faster than all-time lists. A few neighbouring
+        items also swap places.
+        """
+        churn = churn or {
+            'topTracksRecent': 0.4, 'topArtistsRecent': 0.25,
+            'topTracksAllTime': 0.05, 'topArtistsAllTime': 0.05,
+        }
+        evolved = {}
+        for name, section in wrap.items():
+            pool = self.tracks if name.startswith('topTracks') else self.artists
+            items = list(section['items'])
+            present = {item['id'] for item in items}
+            for index in range(len(items)):
+                if rng.random() < churn.get(name, 0):
+                    replacement = rng.choice(pool)
+                    if replacement['id'] not in present:
+                        present.discard(items[index]['id'])
+                        present.add(replacement['id'])
+                        items[index] = replacement
+            for index in range(len(items) - 1):
+                if rng.random() < churn.get(name, 0) / 2:
+                    items[index], items[index + 1] = items[index + 1], items[index]
+            evolved[name] = {**section, 'items': items}
+        return evolved
@@ -0,0 +1,66 @@
+"""
+Throwaway database for benchmarks that exercise the ORM.
+"""
+
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_database(verbosity=0, test_name=None):
+    """
+    Creates a test database for the default connection and drops it on exit.
+
+    Uses the same machinery as ``manage.py test``, so the configured database
+    is never written to. Tables are created straight from the current models
+    rather than from migrations, which this project generates locally.
+
+    Args:
+        verbosity: Verbosity passed to the test database creation.
+        test_name: Optional test database name. For SQLite, pass a file path
+            when several threads write concurrently; the default in-memory
+            database locks whole tables across connections.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if test_name:
+        test_settings['NAME'] = test_name
+    no_migrations = {config.label: None for config in apps.get_app_configs()}
+    try:
+        with override_settings(MIGRATION_MODULES=no_migrations):
+            connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+    finally:
+        test_settings['NAME'] = old_test_name
+
+
+@contextmanager
+def database_profile(database):
+    """
+    Points the default connection at another DATABASES entry, for every thread.
+
+    Wrap it around temporary_database to benchmark a database profile other
+    than the configured one. Connections opened meanwhile are closed on exit.
+
+    Args:
+        database: A DATABASES entry, such as one from spotifyWrapper.databases.
+    """
+    previous = connections.settings[DEFAULT_DB_ALIAS]
+    connection.close()
+    connections.settings[DEFAULT_DB_ALIAS] = connections.configure_settings(
+        {DEFAULT_DB_ALIAS: dict(database)}
+    )[DEFAULT_DB_ALIAS]
+    del connections[DEFAULT_DB_ALIAS]
+    try:
+        yield
+    finally:
+        connection.close()
+        connections.settings[DEFAULT_DB_ALIAS] = previous
+        del connections[DEFAULT_DB_ALIAS]
@@ -0,0 +1,279 @@
+"""
+Response cache for Spotify GET endpoints.
+
+Entries are keyed by (Spotify user, endpoint, URL, params) and live in two
+tiers (see TwoTierCache): a small in-process LRU in front of Django's cache
+framework. Each endpoint has its own freshness TTL
+(``settings.SPOTIFY_CACHE_TTLS``).
+Expired entries are kept around for ``SPOTIFY_CACHE_STALE_TTL`` seconds so
+they can be revalidated with If-None-Match; a 304 then only refreshes the
+entry's expiry instead of transferring the full payload again.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULT_TTLS = {
+    'profile': 60 * 60,
+    'top_items': 6 * 60 * 60,
+    'playlists': 5 * 60,
+    'tracks': 24 * 60 * 60,
+}
+
+# Scope used for catalog data that is the same for every user
+SHARED_SCOPE = '*'
+
+
+class LRUCache:
+    """A thread-safe, size-bounded mapping that evicts the least recently used key."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    A size-bounded in-process LRU in front of Django's cache framework.
+
+    Every local entry carries an expiry, set from the timeout it was stored
+    with, so the local tier drops a value when the backend would instead of
+    serving it for the life of the process. Values read from the backend are
+    kept locally for ``timeout(value)`` seconds.
+
+    The response, catalog and preview caches are all built on this.
+
+    Args:
+        max_entries: Maximum number of entries in the local tier.
+        timeout: Callable returning the timeout in seconds for a value.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.local = LRUCache(max_entries)
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, 'SPOTIFY_CACHE_ALIAS', 'default')]
+
+    def get_local(self, key):
+        """Returns the unexpired local value for ``key``, or None."""
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self.local.delete(key)
+            return None
+        return value
+
+    def set_local(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.timeout(value)
+        self.local.set(key, (value, time.time() + timeout))
+
+    def _split_local(self, keys):
+        """Returns the local hits among ``keys`` and the keys to look up in the backend."""
+        found = {}
+        misses = []
+        for key in keys:
+            value = self.get_local(key)
+            if value is None:
+                misses.append(key)
+            else:
+                found[key] = value
+        return found, misses
+
+    def _fill(self, found, backend_values):
+        for key, value in backend_values.items():
+            self.set_local(key, value)
+            found[key] = value
+        return found
+
+    def get(self, key):
+        """Returns the value for ``key``, looking in the local tier first."""
+        value = self.get_local(key)
+        if value is None:
+            value = self.backend.get(key)
+            if value is not None:
+                self.set_local(key, value)
+        return value
+
+    def get_many(self, keys):
+        """Returns a mapping of the keys found to their values, looking in the local tier first."""
+        found, misses = self._split_local(keys)
+        return self._fill(found, self.backend.get_many(misses) if misses else {})
+
+    def set(self, key, value, timeout):
+        self.set_local(key, value, timeout)
+        self.backend.set(key, value, timeout=timeout)
+
+    def set_many(self, entries, timeout):
+        for key, value in entries.items():
+            self.set_local(key, value, timeout)
+        if entries:
+            self.backend.set_many(entries, timeout=timeout)
+
+    async def aget(self, key):
+        """Async version of get."""
+        value = self.get_local(key)
+        if value is None:
+            value = await self.backend.aget(key)
+            if value is not None:
+                self.set_local(key, value)
+        return value
+
+    async def aget_many(self, keys):
+        """Async version of get_many."""
+        found, misses = self._split_local(keys)
+        return self._fill(found, await self.backend.aget_many(misses) if misses else {})
+
+    async def aset(self, key, value, timeout):
+        """Async version of set."""
+        self.set_local(key, value, timeout)
+        await self.backend.aset(key, value, timeout=timeout)
+
+    async def aset_many(self, entries, timeout):
+        """Async version of set_many."""
+        for key, value in entries.items():
+            self.set_local(key, value, timeout)
+        if entries:
+            await self.backend.aset_many(entries, timeout=timeout)
+
+    def __len__(self):
+        return len(self.local)
+
+
+class ResponseCache:
+    """
+    Two-tier cache of Spotify GET responses with per-endpoint statistics.
+
+    Statistics are counted per endpoint:
+        hits: Served from a fresh entry without contacting Spotify.
+        misses: No usable entry; the full payload was fetched.
+        revalidations: A stale entry was confirmed with a 304.
+        refetches: A stale entry was replaced by a new 200 payload.
+    """
+
+    def __init__(self):
+        self.tiers = TwoTierCache(
+            getattr(settings, 'SPOTIFY_CACHE_LOCAL_MAX_ENTRIES', 1024),
+            # Keep an entry, stale or not, for as long as the backend does
+            timeout=lambda entry: entry['expires_at'] - time.time() + self.stale_ttl(),
+        )
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'revalidations': 0, 'refetches': 0})
+        self._stats_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return self.tiers.backend
+
+    def ttl(self, endpoint):
+        """Returns the freshness TTL in seconds for an endpoint."""
+        ttls = {**DEFAULT_TTLS, **getattr(settings, 'SPOTIFY_CACHE_TTLS', {})}
+        return ttls.get(endpoint, 0)
+
+    @staticmethod
+    def stale_ttl():
+        """Returns how long past its TTL an entry is kept for revalidation."""
+        return getattr(settings, 'SPOTIFY_CACHE_STALE_TTL', 7 * 24 * 60 * 60)
+
+    def make_key(self, scope, endpoint, url, params=None):
+        """Builds the cache key for a request made on behalf of ``scope``."""
+        raw = json.dumps([scope, endpoint, url, sorted((params or {}).items())], default=str)
+        return f"spotify:resp:{hashlib.sha256(raw.encode()).hexdigest()}"
+
+    def _entry(self, endpoint, data, etag):
+        return {
+            'data': data,
+            'etag': etag,
+            'expires_at': time.time() + self.ttl(endpoint),
+        }
+
+    def get(self, key):
+        """Returns the entry for ``key``, looking in the local tier first."""
+        return self.tiers.get(key)
+
+    def set(self, endpoint, key, data, etag=None):
+        """Stores a payload as a fresh entry and returns the entry."""
+        entry = self._entry(endpoint, data, etag)
+        self.tiers.set(key, entry, timeout=self.ttl(endpoint) + self.stale_ttl())
+        return entry
+
+    async def aget(self, key):
+        """Async version of get."""
+        return await self.tiers.aget(key)
+
+    async def aset(self, endpoint, key, data, etag=None):
+        """Async version of set."""
+        entry = self._entry(endpoint, data, etag)
+        await self.tiers.aset(key, entry, timeout=self.ttl(endpoint) + self.stale_ttl())
+        return entry
+
+    def is_fresh(self, entry):
+        return entry['expires_at'] > time.time()
+
+    def get_identity(self, token_key):
+        """Returns the Spotify user ID previously resolved for a token, if any."""
+        return self.backend.get(f"spotify:whoami:{token_key}")
+
+    def set_identity(self, token_key, user_id, timeout=60 * 60):
+        self.backend.set(f"spotify:whoami:{token_key}", user_id, timeout=timeout)
+
+    async def aget_identity(self, token_key):
+        return await self.backend.aget(f"spotify:whoami:{token_key}")
+
+    async def aset_identity(self, token_key, user_id, timeout=60 * 60):
+        await self.backend.aset(f"spotify:whoami:{token_key}", user_id, timeout=timeout)
+
+    def record(self, endpoint, outcome):
+        with self._stats_lock:
+            self._stats[endpoint][outcome] += 1
+
+    def stats(self):
+        """Returns the per-endpoint counters plus the local tier size."""
+        with self._stats_lock:
+            endpoints = {name: dict(counts) for name, counts in self._stats.items()}
+        for counts in endpoints.values():
+            lookups = sum(counts.values())
+            counts['hit_ratio'] = (
+                (counts['hits'] + counts['revalidations']) / lookups if lookups else None
+            )
+        return {'endpoints': endpoints, 'local_entries': len(self.tiers)}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,160 @@
+"""
+Shared track and artist metadata cache for the SpotifyWrapper project.
+
+Popular tracks and artists show up in nearly every user's top items, and
+their metadata is the same for everyone. The catalog cache keeps projected
+copies (see spotifyApp.compact) in an in-process LRU in front of Django's
+cache framework (see spotifyApp.cache.TwoTierCache), for ``settings.SPOTIFY_CATALOG_CACHE_TTL`` seconds, under
+two kinds of key:
+
+- by Spotify ID, the latest copy seen, for views showing live data. It
+  fills itself from the full objects in top-items responses, so it
+  changes whenever Spotify's data does. IDs it does not know are resolved
+  from the catalog tables (see spotifyApp.models.latest_catalog), then
+  from Spotify's multi-ID ``/tracks`` and ``/artists`` endpoints (see
+  SpotifyAPI.get_catalog).
+- by Spotify ID and catalog version, one immutable snapshot, for
+  rendering stored wraps (see spotifyApp.models.resolve_catalog). Such an
+  entry never changes, so a stored wrap renders the same whatever the
+  live entries hold.
+"""
+
+import threading
+
+from django.conf import settings
+
+from .cache import TwoTierCache
+from .compact import project_artist, project_track
+
+
+KINDS = ('track', 'artist')
+
+PROJECTIONS = {'track': project_track, 'artist': project_artist}
+
+
+def project_items(items):
+    """Groups full track and artist objects by kind, projected and keyed by Spotify ID."""
+    objects = {kind: {} for kind in KINDS}
+    for item in items:
+        kind = item.get('type') if isinstance(item, dict) else None
+        if kind in PROJECTIONS and item.get('id'):
+            objects[kind][item['id']] = PROJECTIONS[kind](item)
+    return objects
+
+
+class CatalogCache:
+    """
+    Two-tier cache mapping Spotify IDs to projected tracks and artists.
+
+    Lookups return a (found, missing) pair, where ``found`` maps IDs to
+    their projected object and ``missing`` lists the IDs not cached.
+    lookup and store work on the latest copies, lookup_snapshots and
+    store_snapshots on versioned snapshots.
+    """
+
+    def __init__(self):
+        self.tiers = TwoTierCache(
+            getattr(settings, 'SPOTIFY_CATALOG_LOCAL_MAX_ENTRIES', 10000),
+            timeout=lambda data: self._ttl(),
+        )
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def _ttl():
+        return getattr(settings, 'SPOTIFY_CATALOG_CACHE_TTL', 30 * 24 * 60 * 60)
+
+    def make_key(self, kind, spotify_id, version=None):
+        """Keys the latest copy of an ID, or with ``version`` one of its snapshots."""
+        if version:
+            return f'spotify:catalog:{kind}:{spotify_id}:{version}'
+        return f'spotify:catalog:{kind}:{spotify_id}'
+
+    def _record(self, **counts):
+        with self._stats_lock:
+            for name, count in counts.items():
+                self._stats[name] += count
+
+    def _split(self, keys, values):
+        """
+        Takes a mapping of Spotify ID to cache key and the values found for
+        those keys; returns a (found, missing) pair.
+        """
+        found = {spotify_id: values[key] for spotify_id, key in keys.items() if key in values}
+        missing = [spotify_id for spotify_id in keys if spotify_id not in found]
+        self._record(hits=len(found), misses=len(missing))
+        return found, missing
+
+    def _entries(self, keys, objects):
+        """Returns the entries that are not already in the local tier as is."""
+        entries = {
+            keys[spotify_id]: data for spotify_id, data in objects.items()
+            if self.tiers.get_local(keys[spotify_id]) != data
+        }
+        self._record(stored=len(entries))
+        return entries
+
+    def _get(self, keys):
+        return self._split(keys, self.tiers.get_many(keys.values()))
+
+    def _set(self, keys, objects):
+        self.tiers.set_many(self._entries(keys, objects), timeout=self._ttl())
+
+    def lookup(self, kind, spotify_ids):
+        """Looks up the latest tracks or artists by Spotify ID; returns a (found, missing) pair."""
+        return self._get({spotify_id: self.make_key(kind, spotify_id) for spotify_id in spotify_ids})
+
+    def store(self, kind, objects):
+        """Caches a mapping of Spotify ID to the latest projected track or artist."""
+        self._set({spotify_id: self.make_key(kind, spotify_id) for spotify_id in objects}, objects)
+
+    def lookup_snapshots(self, kind, refs):
+        """
+        Looks up catalog snapshots from a mapping of Spotify ID to version;
+        returns a (found, missing) pair.
+        """
+        return self._get({
+            spotify_id: self.make_key(kind, spotify_id, version) for spotify_id, version in refs.items()
+        })
+
+    def store_snapshots(self, kind, objects, versions):
+        """Caches a mapping of Spotify ID to projected data as the snapshots of the given versions."""
+        self._set({
+            spotify_id: self.make_key(kind, spotify_id, versions[spotify_id]) for spotify_id in objects
+        }, objects)
+
+    async def alookup(self, kind, spotify_ids):
+        """Async version of lookup."""
+        keys = {spotify_id: self.make_key(kind, spotify_id) for spotify_id in spotify_ids}
+        return self._split(keys, await self.tiers.aget_many(keys.values()))
+
+    async def astore(self, kind, objects):
+        """Async version of store."""
+        keys = {spotify_id: self.make_key(kind, spotify_id) for spotify_id in objects}
+        await self.tiers.aset_many(self._entries(keys, objects), timeout=self._ttl())
+
+    def remember(self, items):
+        """
+        Caches full track and artist objects, such as the items of a
+        top-items response. Objects already cached unchanged in this process
+        are not written again, so a response served from the response cache
+        costs no cache writes.
+        """
+        for kind, objects in project_items(items).items():
+            self.store(kind, objects)
+
+    async def aremember(self, items):
+        """Async version of remember."""
+        for kind, objects in project_items(items).items():
+            await self.astore(kind, objects)
+
+    def stats(self):
+        with self._stats_lock:
+            counts = dict(self._stats)
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = counts['hits'] / lookups if lookups else None
+        counts['local_entries'] = len(self.tiers)
+        return counts
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,38 @@
+"""
+System checks for the SpotifyWrapper project.
+
+Run with ``python manage.py check --deploy``.
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+# Cache backends whose entries are private to one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warns when the default cache is not shared between processes.
+
+    The Spotify rate limiter, the Retry-After block and the cross-process
+    token refresh lock all live in the default cache (see
+    spotifyApp.ratelimit and spotifyApp.tokens).
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'The default cache is private to each process, so the Spotify rate limit, '
+        'Retry-After blocks and token refresh locks are not shared between worker processes.',
+        hint=(
+            'Set REDIS_URL to share them. Until then, Spotify can see up to '
+            'SPOTIFY_RATE_LIMIT_PER_SECOND requests per second from each process.'
+        ),
+        id='spotifyApp.W001',
+    )]
@@ -0,0 +1,201 @@
+"""
+Per-endpoint circuit breakers for calls to the Spotify Web API.
+
+When Spotify is down, every call waits for its timeout and retries before
+failing, and request threads pile up behind it. A breaker tracks the
+outcome of each call to one endpoint (a normalized path such as
+``/v1/me/top/tracks``) over a sliding window:
+
+    closed: Calls go through. Once the window holds at least
+        ``SPOTIFY_CIRCUIT_MIN_CALLS`` calls and ``SPOTIFY_CIRCUIT_FAILURE_RATE``
+        of them failed (5xx, timeout or connection error), the circuit opens.
+    open: Calls fail at once with an ``unavailable`` SpotifyAPIError, for
+        ``SPOTIFY_CIRCUIT_OPEN_SECONDS``.
+    half-open: Up to ``SPOTIFY_CIRCUIT_PROBES`` probe calls go through at
+        once. A success closes the circuit, a failure opens it again.
+
+Each state change starts a new generation. before_call hands the admitted
+call its generation as a ticket, and record ignores outcomes whose ticket is
+stale. A slow call admitted while closed therefore cannot close, or free a
+probe slot of, a circuit that has since opened and gone half-open.
+
+A 429 means Spotify is up and is left to the rate limiter (see
+spotifyApp.ratelimit). Breakers are kept per process, like the concurrency
+limiter.
+"""
+
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .exceptions import SpotifyAPIError
+from .metrics import normalize_path
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """The circuit for one Spotify endpoint."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._outcomes = deque()
+        self._failures = 0
+        self._probes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _open_seconds():
+        return getattr(settings, 'SPOTIFY_CIRCUIT_OPEN_SECONDS', 30)
+
+    def _unavailable(self, retry_after):
+        return SpotifyAPIError(
+            'Spotify is unavailable, try again shortly',
+            status_code=503,
+            retry_after=max(1, round(retry_after)),
+            unavailable=True,
+        )
+
+    def _transition(self, state):
+        self.state = state
+        self._generation += 1
+        self._probes = 0
+
+    def _open(self, now):
+        self._transition(OPEN)
+        self.opened_at = now
+        self.times_opened += 1
+        self._outcomes.clear()
+        self._failures = 0
+
+    def retry_after(self):
+        """Seconds until an open circuit lets a probe through, or None if it is not open."""
+        with self._lock:
+            if self.state != OPEN:
+                return None
+            remaining = self.opened_at + self._open_seconds() - time.monotonic()
+            return remaining if remaining > 0 else None
+
+    def check(self):
+        """
+        Fails fast while the circuit is open, without admitting a call, so
+        callers need not wait on the rate limiter for a call before_call
+        would refuse.
+
+        Raises:
+            SpotifyAPIError: With ``unavailable`` set, while the circuit is open.
+        """
+        wait = self.retry_after()
+        if wait is not None:
+            raise self._unavailable(wait)
+
+    def before_call(self):
+        """
+        Admits a call, or fails it fast.
+
+        Call this right before the request goes out: every admitted call
+        must be passed to record, or a half-open circuit keeps its probe
+        slot.
+
+        Returns:
+            The call's ticket, for record.
+
+        Raises:
+            SpotifyAPIError: With ``unavailable`` set, while the circuit is
+                open or enough calls are already probing it.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self._open_seconds() - time.monotonic()
+                if remaining > 0:
+                    raise self._unavailable(remaining)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= getattr(settings, 'SPOTIFY_CIRCUIT_PROBES', 2):
+                    raise self._unavailable(1)
+                self._probes += 1
+            return self._generation
+
+    def record(self, ticket, failed):
+        """
+        Records the outcome of an admitted call.
+
+        Args:
+            ticket: What before_call returned for the call.
+            failed: Whether the call failed, or None if it ended without an
+                outcome (e.g. an unexpected error), which only frees its
+                probe slot.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if ticket != self._generation:
+                # Admitted before the last state change; says nothing about now
+                return
+            if self.state == HALF_OPEN:
+                self._probes -= 1
+                if failed:
+                    self._open(now)
+                elif failed is not None:
+                    self._transition(CLOSED)
+                return
+            if failed is None:
+                return
+
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            horizon = now - getattr(settings, 'SPOTIFY_CIRCUIT_WINDOW', 30)
+            while self._outcomes and self._outcomes[0][0] < horizon:
+                self._failures -= self._outcomes.popleft()[1]
+
+            calls = len(self._outcomes)
+            if (calls >= getattr(settings, 'SPOTIFY_CIRCUIT_MIN_CALLS', 10)
+                    and self._failures / calls >= getattr(settings, 'SPOTIFY_CIRCUIT_FAILURE_RATE', 0.5)):
+                self._open(now)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'calls': len(self._outcomes),
+                'failures': self._failures,
+                'times_opened': self.times_opened,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url):
+    """Returns the breaker for the endpoint of a Spotify URL, creating it on first use."""
+    endpoint = normalize_path(url)
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+    return breaker
+
+
+def retry_after(urls):
+    """
+    Returns the longest time until any of the URLs' open circuits lets a
+    probe through, or None if none of them is open.
+    """
+    waits = [wait for wait in (breaker_for(url).retry_after() for url in urls) if wait is not None]
+    return max(waits) if waits else None
+
+
+def stats():
+    """Returns a snapshot of every breaker, by endpoint."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.endpoint: breaker.stats() for breaker in breakers}
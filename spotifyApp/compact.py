@@ -0,0 +1,184 @@
+"""
+Compact wrap storage format for the SpotifyWrapper project.
+
+Raw wraps hold full Spotify paging objects for each section. In compact
+form, each track and artist is reduced to the fields the app uses and
+stored once in the shared catalog tables. The wrap itself keeps only the
+ordered ID list and the paging metadata of each section, plus the catalog
+version of every track and artist it references:
+
+    {
+        'format': 'compact-v2',
+        'sections': {
+            'topTracksRecent': {'type': 'track', 'ids': [...], 'meta': {'total': 50, ...}},
+            ...
+        },
+        'versions': {'track': {'<id>': '<version>', ...}, 'artist': {...}},
+        'extra': {'timeRange': 'short_term'},
+    }
+
+A version is a hash of the projected object (see catalog_version), so a
+catalog row never changes once written. Expanding a compact wrap with the
+rows it references gives back the response shape it was saved with:
+paging objects whose ``items`` are the projected tracks or artists. Wraps
+in the older 'compact-v1' format have no ``versions``.
+"""
+
+import hashlib
+import json
+
+COMPACT_FORMAT = 'compact-v2'
+
+# Paging fields kept alongside each section's IDs
+PAGING_FIELDS = ('total', 'limit', 'offset', 'href', 'next', 'previous')
+
+
+def _first_image(images):
+    return [{'url': image.get('url'), 'height': image.get('height'), 'width': image.get('width')}
+            for image in (images or [])[:1]]
+
+
+def _spotify_url(obj):
+    return {'spotify': (obj.get('external_urls') or {}).get('spotify')}
+
+
+def project_artist(artist):
+    """Reduces a full Spotify artist object to the fields the app uses."""
+    return {
+        'id': artist['id'],
+        'type': 'artist',
+        'name': artist.get('name'),
+        'uri': artist.get('uri'),
+        'genres': artist.get('genres', []),
+        'popularity': artist.get('popularity'),
+        'followers': {'total': (artist.get('followers') or {}).get('total')},
+        'images': _first_image(artist.get('images')),
+        'external_urls': _spotify_url(artist),
+    }
+
+
+def project_track(track):
+    """Reduces a full Spotify track object to the fields the app uses."""
+    album = track.get('album') or {}
+    return {
+        'id': track['id'],
+        'type': 'track',
+        'name': track.get('name'),
+        'uri': track.get('uri'),
+        'duration_ms': track.get('duration_ms'),
+        'explicit': track.get('explicit'),
+        'popularity': track.get('popularity'),
+        'preview_url': track.get('preview_url'),
+        'artists': [{'id': a.get('id'), 'name': a.get('name')} for a in track.get('artists', [])],
+        'album': {
+            'id': album.get('id'),
+            'name': album.get('name'),
+            'release_date': album.get('release_date'),
+            'images': _first_image(album.get('images')),
+        },
+        'external_urls': _spotify_url(track),
+    }
+
+
+def catalog_version(data):
+    """Returns the version of a projected track or artist: a hash of its content."""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _section_type(section):
+    """Returns 'track' or 'artist' for a paging object of those, else None."""
+    if not isinstance(section, dict) or not isinstance(section.get('items'), list):
+        return None
+    items = section['items']
+    if not items:
+        return 'empty'
+    types = {item.get('type') for item in items if isinstance(item, dict)}
+    if len(types) == 1 and types <= {'track', 'artist'}:
+        return types.pop()
+    return None
+
+
+def compact_wrap(wrap_data):
+    """
+    Converts raw wrap data to compact form.
+
+    Args:
+        wrap_data: A wrap as built by get_wrapped_data or create_wrapped_data.
+
+    Returns:
+        A (compact, tracks, artists) tuple, where tracks and artists map
+        Spotify IDs to projected objects to save in the catalog, under the
+        versions listed in the compact wrap.
+    """
+    sections = {}
+    extra = {}
+    tracks = {}
+    artists = {}
+
+    for name, value in wrap_data.items():
+        kind = _section_type(value)
+        if kind is None:
+            extra[name] = value
+            continue
+
+        for item in value['items']:
+            if kind == 'track':
+                tracks[item['id']] = project_track(item)
+            elif kind == 'artist':
+                artists[item['id']] = project_artist(item)
+        sections[name] = {
+            'type': kind,
+            'ids': [item['id'] for item in value['items']],
+            'meta': {field: value.get(field) for field in PAGING_FIELDS if field in value},
+        }
+
+    versions = {
+        kind: {spotify_id: catalog_version(data) for spotify_id, data in objects.items()}
+        for kind, objects in (('track', tracks), ('artist', artists))
+    }
+    compact = {'format': COMPACT_FORMAT, 'sections': sections, 'versions': versions, 'extra': extra}
+    return compact, tracks, artists
+
+
+def section_ids(compact, kind):
+    """Returns every catalog ID of one kind ('track' or 'artist') referenced by a compact wrap."""
+    return {
+        spotify_id
+        for section in compact['sections'].values() if section['type'] == kind
+        for spotify_id in section['ids']
+    }
+
+
+def section_refs(compact, kind):
+    """
+    Returns the catalog rows of one kind a compact wrap references, as a
+    mapping of Spotify ID to version. The version is None for wraps saved
+    before versions existed.
+    """
+    versions = compact.get('versions', {}).get(kind, {})
+    return {spotify_id: versions.get(spotify_id) for spotify_id in section_ids(compact, kind)}
+
+
+def expand_wrap(compact, tracks, artists):
+    """
+    Rebuilds the response shape of a compact wrap.
+
+    Args:
+        compact: The compact wrap.
+        tracks: Mapping of track ID to projected track.
+        artists: Mapping of artist ID to projected artist.
+
+    Returns:
+        The wrap as a dict of paging objects, plus any extra fields.
+    """
+    catalogs = {'track': tracks, 'artist': artists, 'empty': {}}
+    wrap_data = {}
+    for name, section in compact['sections'].items():
+        catalog = catalogs[section['type']]
+        wrap_data[name] = {
+            **section['meta'],
+            'items': [catalog.get(spotify_id, {'id': spotify_id}) for spotify_id in section['ids']],
+        }
+    wrap_data.update(compact.get('extra', {}))
+    return wrap_data
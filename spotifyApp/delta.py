@@ -0,0 +1,124 @@
+"""
+Delta encoding of compact wraps against the user's previous wrap.
+
+Consecutive wraps mostly repeat the same artists and tracks, so a wrap can
+be stored as the edit from its base wrap. A delta lists the sections that
+did not change. For each changed section it gives the new ID list as ops,
+where an int copies that position from the base section's IDs and a
+string is a new ID:
+
+    {
+        'format': 'delta-v2',
+        'unchanged': ['topArtistsAllTime', ...],
+        'sections': {
+            'topTracksRecent': {'type': 'track', 'meta': {...}, 'ops': [0, 1, 'new-id', 3]},
+        },
+        'versions': {'track': {'new-id': '<version>', ...}, 'artist': {...}},
+        'extra': {...},
+    }
+
+``versions`` holds the catalog versions (see spotifyApp.compact) that
+differ from the base's; every other ID keeps the base's version. Deltas in
+the older 'delta-v1' format have no ``versions``.
+"""
+
+from .compact import COMPACT_FORMAT
+
+DELTA_FORMAT = 'delta-v2'
+
+
+def _encode_ids(base_ids, ids):
+    positions = {spotify_id: index for index, spotify_id in enumerate(base_ids)}
+    return [positions.get(spotify_id, spotify_id) for spotify_id in ids]
+
+
+def _decode_ids(base_ids, ops):
+    return [base_ids[op] if isinstance(op, int) else op for op in ops]
+
+
+def _section_kinds(sections):
+    """Returns the IDs of each catalog kind referenced by a compact wrap's sections."""
+    kinds = {}
+    for section in sections.values():
+        kinds.setdefault(section['type'], set()).update(section['ids'])
+    return kinds
+
+
+def diff_compact(base, compact):
+    """
+    Encodes a compact wrap as a delta against a base compact wrap.
+
+    Args:
+        base: The reconstructed compact form of the base wrap.
+        compact: The compact wrap to encode.
+
+    Returns:
+        The delta dict.
+    """
+    unchanged = []
+    sections = {}
+    for name, section in compact['sections'].items():
+        base_section = base['sections'].get(name)
+        if base_section == section:
+            unchanged.append(name)
+            continue
+        base_ids = base_section['ids'] if base_section else []
+        sections[name] = {
+            'type': section['type'],
+            'meta': section['meta'],
+            'ops': _encode_ids(base_ids, section['ids']),
+        }
+    delta = {
+        'format': DELTA_FORMAT,
+        'unchanged': unchanged,
+        'sections': sections,
+        'extra': compact.get('extra', {}),
+    }
+    if 'versions' in compact:
+        base_versions = base.get('versions', {})
+        delta['versions'] = {
+            kind: {
+                spotify_id: version for spotify_id, version in kind_versions.items()
+                if base_versions.get(kind, {}).get(spotify_id) != version
+            }
+            for kind, kind_versions in compact['versions'].items()
+        }
+    return delta
+
+
+def apply_delta(base, delta):
+    """
+    Reconstructs a compact wrap from its base and its delta.
+
+    Args:
+        base: The reconstructed compact form of the base wrap.
+        delta: The delta produced by diff_compact.
+
+    Returns:
+        The compact wrap.
+    """
+    sections = {name: base['sections'][name] for name in delta['unchanged']}
+    for name, section in delta['sections'].items():
+        base_section = base['sections'].get(name)
+        sections[name] = {
+            'type': section['type'],
+            'ids': _decode_ids(base_section['ids'] if base_section else [], section['ops']),
+            'meta': section['meta'],
+        }
+    compact = {
+        'format': COMPACT_FORMAT if 'versions' in delta else base['format'],
+        'sections': sections,
+        'extra': delta.get('extra', {}),
+    }
+
+    if 'versions' in base or 'versions' in delta:
+        referenced = _section_kinds(sections)
+        kinds = set(base.get('versions', {})) | set(delta.get('versions', {}))
+        compact['versions'] = {}
+        for kind in kinds:
+            merged = {**base.get('versions', {}).get(kind, {}), **delta.get('versions', {}).get(kind, {})}
+            compact['versions'][kind] = {
+                spotify_id: version for spotify_id, version in merged.items()
+                if spotify_id in referenced.get(kind, ())
+            }
+    return compact
@@ -0,0 +1,111 @@
+"""
+Duo Wrapped compatibility between two wraps.
+
+Each wrap gets a small profile when it is written (see
+SpotifyWrap.get_profile):
+
+    {
+        'version': 1,
+        'artists': [...],          # sorted artist IDs: top artists plus track artists
+        'tracks': [...],           # sorted track IDs
+        'genres': {'pop': 0.61, ...},   # rank-weighted genre vector, unit length
+    }
+
+Comparing two profiles is then a set intersection over the ID lists and a
+dot product over the genre keys both sides have. That is cheap enough to
+rank one user against many friends in a single request, without loading
+either wrap's data.
+"""
+
+import math
+
+
+PROFILE_VERSION = 1
+
+# How much each signal contributes to the 0-100 compatibility score
+SCORE_WEIGHTS = {'artists': 0.4, 'tracks': 0.2, 'genres': 0.4}
+
+# Shared genres reported per comparison
+TOP_SHARED_GENRES = 10
+
+
+def build_profile(wrap_data):
+    """
+    Builds the comparison profile of a wrap.
+
+    Args:
+        wrap_data: The wrap in response shape (sections of paging objects).
+
+    Returns:
+        The profile dict described in the module docstring.
+    """
+    artists = set()
+    tracks = set()
+    genres = {}
+    for section in wrap_data.values():
+        if not isinstance(section, dict) or not isinstance(section.get('items'), list):
+            continue
+        items = section['items']
+        for rank, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('id'):
+                continue
+            if item.get('type') == 'artist':
+                artists.add(item['id'])
+                # Higher-ranked artists count more towards the genre vector
+                weight = 1 - rank / len(items)
+                for genre in item.get('genres') or []:
+                    genres[genre] = genres.get(genre, 0.0) + weight
+            elif item.get('type') == 'track':
+                tracks.add(item['id'])
+                artists.update(a['id'] for a in item.get('artists') or [] if a.get('id'))
+
+    norm = math.sqrt(sum(weight * weight for weight in genres.values()))
+    return {
+        'version': PROFILE_VERSION,
+        'artists': sorted(artists),
+        'tracks': sorted(tracks),
+        'genres': {genre: round(weight / norm, 6) for genre, weight in genres.items()} if norm else {},
+    }
+
+
+def _overlap(a, b):
+    """Overlap coefficient |A & B| / min(|A|, |B|), with the shared items."""
+    shared = a & b
+    smaller = min(len(a), len(b))
+    return shared, (len(shared) / smaller if smaller else 0.0)
+
+
+def compare(profile_a, profile_b):
+    """
+    Compares two wrap profiles. The result is symmetric.
+
+    Returns:
+        A dict with the shared artist and track IDs, the shared genres
+        (strongest first), the per-signal similarities in [0, 1] and the
+        overall ``score`` from 0 to 100.
+    """
+    shared_artists, artist_similarity = _overlap(set(profile_a['artists']), set(profile_b['artists']))
+    shared_tracks, track_similarity = _overlap(set(profile_a['tracks']), set(profile_b['tracks']))
+
+    genres_a = profile_a['genres']
+    genres_b = profile_b['genres']
+    products = {genre: genres_a[genre] * genres_b[genre] for genre in genres_a.keys() & genres_b.keys()}
+    # Both vectors are unit length, so the dot product is their cosine similarity
+    genre_similarity = min(1.0, sum(products.values()))
+
+    score = 100 * (
+        SCORE_WEIGHTS['artists'] * artist_similarity
+        + SCORE_WEIGHTS['tracks'] * track_similarity
+        + SCORE_WEIGHTS['genres'] * genre_similarity
+    )
+    return {
+        'score': round(score),
+        'shared_artists': sorted(shared_artists),
+        'shared_tracks': sorted(shared_tracks),
+        'shared_genres': sorted(products, key=products.get, reverse=True)[:TOP_SHARED_GENRES],
+        'similarity': {
+            'artists': round(artist_similarity, 4),
+            'tracks': round(track_similarity, 4),
+            'genres': round(genre_similarity, 4),
+        },
+    }
@@ -0,0 +1,31 @@
+"""
+Exceptions raised by the Spotify client in the SpotifyWrapper project.
+"""
+
+
+class SpotifyAPIError(Exception):
+    """
+    Raised when Spotify answers with an unsuccessful status.
+
+    Attributes:
+        status_code: The HTTP status returned by Spotify.
+        retry_after: Seconds Spotify asked us to wait, for 429 responses, or
+            until an open circuit is retried.
+        unavailable: True when the call was not made because the endpoint's
+            circuit is open (see spotifyApp.circuit), or because another
+            process is still refreshing the token (see spotifyApp.tokens).
+    """
+    def __init__(self, message, status_code=None, retry_after=None, unavailable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.unavailable = unavailable
+
+    @property
+    def rate_limited(self):
+        return self.status_code == 429
+
+    @property
+    def transient(self):
+        """True for failures that may go away on retry: throttling, timeouts, 5xx and open circuits."""
+        return self.rate_limited or self.unavailable or self.status_code is None or self.status_code >= 500
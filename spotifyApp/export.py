@@ -0,0 +1,121 @@
+"""
+Streaming export of a user's wrap history for the SpotifyWrapper project.
+
+Wraps are read in keyset-paginated chunks of ``settings.SPOTIFY_EXPORT_CHUNK_SIZE``
+on (date_generated, id), oldest first, and encoded one row at a time. Only one
+chunk is held in memory, however many wraps the user has, and no
+transaction or cursor stays open while the client reads.
+
+Rows are encoded as NDJSON (one JSON object per line) or CSV (``wrap_data``
+and ``analytics`` as JSON text). Either can be gzipped as it streams.
+"""
+
+import csv
+import json
+import zlib
+
+from django.conf import settings
+from django.db.models import Q
+
+from .analytics import ANALYTICS_VERSION
+from .models import SpotifyWrap
+from .renderers import dumps
+
+
+CSV_COLUMNS = ('id', 'date_generated', 'title', 'wrap_data', 'analytics')
+
+
+def iter_wraps(user, since=None, until=None):
+    """
+    Yields the user's wraps, oldest first, loading them one chunk at a time.
+
+    Raw wraps carry their stored JSON text as ``wrap_json`` (see
+    SpotifyWrapManager.with_wrap_json), so it can be written out without
+    being decoded.
+
+    Args:
+        user: The owner of the wraps.
+        since: Optional earliest ``date_generated``, inclusive.
+        until: Optional latest ``date_generated``, exclusive.
+    """
+    chunk_size = getattr(settings, 'SPOTIFY_EXPORT_CHUNK_SIZE', 25)
+    wraps = SpotifyWrap.objects.with_wrap_json().filter(user=user).order_by('date_generated', 'id')
+    if since is not None:
+        wraps = wraps.filter(date_generated__gte=since)
+    if until is not None:
+        wraps = wraps.filter(date_generated__lt=until)
+
+    position = None
+    while True:
+        page = wraps
+        if position is not None:
+            date_generated, wrap_id = position
+            page = page.filter(
+                Q(date_generated__gt=date_generated) | Q(date_generated=date_generated, id__gt=wrap_id)
+            )
+        chunk = list(page[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        position = (chunk[-1].date_generated, chunk[-1].id)
+
+
+def export_fields(wrap):
+    """
+    Returns a wrap's (wrap_data as JSON bytes, analytics) for export.
+
+    Raw wraps pass their stored JSON through. Compact and delta wraps are
+    expanded with the catalog versions they were saved with.
+    """
+    wrap_json = getattr(wrap, 'wrap_json', None)
+    if wrap.storage_format == SpotifyWrap.RAW and wrap_json is not None:
+        data = wrap_json.encode()
+        wrap_data = None
+    else:
+        if wrap_json is not None and 'wrap_data' in wrap.get_deferred_fields():
+            wrap.wrap_data = json.loads(wrap_json)
+        wrap_data = wrap.get_wrap_data()
+        data = dumps(wrap_data)
+    if wrap_data is None and (wrap.analytics or {}).get('version') != ANALYTICS_VERSION:
+        # Missing or outdated analytics are computed from the data, so decode it for them
+        wrap_data = json.loads(data)
+    return data, wrap.get_analytics(wrap_data)
+
+
+def ndjson_rows(wraps):
+    """Encodes wraps as NDJSON lines."""
+    for wrap in wraps:
+        data, analytics = export_fields(wrap)
+        head = dumps({'id': wrap.id, 'date_generated': wrap.date_generated, 'title': wrap.title})
+        yield head[:-1] + b',"wrap_data":' + data + b',"analytics":' + dumps(analytics) + b'}\n'
+
+
+class _Line:
+    """A file-like object whose write returns what was written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_rows(wraps):
+    """Encodes wraps as CSV lines, after a header row."""
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS).encode()
+    for wrap in wraps:
+        data, analytics = export_fields(wrap)
+        yield writer.writerow((
+            wrap.id, wrap.date_generated.isoformat(), wrap.title, data.decode(), dumps(analytics).decode(),
+        )).encode()
+
+
+def gzip_stream(chunks):
+    """Gzips a stream of byte strings as it is produced."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+ENCODERS = {'ndjson': ndjson_rows, 'csv': csv_rows}
@@ -0,0 +1,166 @@
+"""
+Concurrent fan-out helpers for the SpotifyWrapper project.
+
+Views that need several independent Spotify calls (for example the four
+top-item requests behind a wrap) submit them to a bounded, process-wide
+worker pool and wait for all of them against one overall deadline.
+Each call succeeds or fails on its own, so a caller can serve partial
+results instead of failing the whole request.
+
+The deadline travels with each call (see remaining), so SpotifyAPI._request
+shortens its timeouts to fit and stops retrying once it has passed. A call
+that missed the deadline then ends after its current attempt instead of
+tying up a pool thread with retries nobody waits for.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Monotonic deadline of the fan-out the current call runs in
+_deadline = contextvars.ContextVar('spotify_fanout_deadline', default=None)
+
+
+class FanOutTimeout(Exception):
+    """Raised for a call that did not finish before the fan-out deadline."""
+
+
+class FanOutResult:
+    """
+    Outcome of a fan-out.
+
+    Attributes:
+        results: Mapping of call name to its return value, for calls that succeeded.
+        errors: Mapping of call name to the exception raised, for calls that failed
+            or missed the deadline.
+        elapsed: Wall-clock seconds spent waiting for the calls.
+    """
+    def __init__(self, results, errors, elapsed):
+        self.results = results
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        """True when every call succeeded."""
+        return not self.errors
+
+    @property
+    def failed(self):
+        """True when no call succeeded."""
+        return not self.results
+
+    def error_messages(self):
+        """Returns the errors as a JSON-friendly mapping of name to message."""
+        return {name: str(error) or error.__class__.__name__ for name, error in self.errors.items()}
+
+
+def remaining():
+    """
+    Returns the seconds left before the deadline of the fan-out the current
+    call runs in, or None outside a fan-out.
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def time_left():
+    """
+    Returns remaining(), for a call about to go out.
+
+    Raises:
+        FanOutTimeout: If the current fan-out's deadline has already passed,
+            for example while the call waited for a rate-limit token.
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise FanOutTimeout('Spotify call did not start before the fan-out deadline')
+    return left
+
+
+def out_of_time(seconds):
+    """True if waiting ``seconds`` would run past the current fan-out's deadline."""
+    left = remaining()
+    return left is not None and seconds >= left
+
+
+def call_context(deadline):
+    """
+    Returns a copy of the caller's context for running one call, with the
+    fan-out deadline set. A call nested in another fan-out keeps the
+    earlier of the two deadlines.
+    """
+    context = contextvars.copy_context()
+    outer = context.get(_deadline)
+    context.run(_deadline.set, deadline if outer is None else min(outer, deadline))
+    return context
+
+
+def get_executor():
+    """
+    Returns the shared worker pool, creating it on first use.
+
+    The pool size comes from ``settings.SPOTIFY_FANOUT_WORKERS`` so the number of
+    in-flight upstream calls per process stays bounded no matter how many
+    requests fan out at once.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'SPOTIFY_FANOUT_WORKERS', 8),
+                    thread_name_prefix='spotify-fanout',
+                )
+    return _executor
+
+
+def fan_out(calls, timeout=None):
+    """
+    Runs independent calls concurrently and collects their outcomes.
+
+    Args:
+        calls: Mapping of name to a ``(callable, args, kwargs)`` tuple.
+        timeout: Overall deadline in seconds for all calls. Defaults to
+            ``settings.SPOTIFY_FANOUT_TIMEOUT``.
+
+    Returns:
+        A FanOutResult. Calls still running at the deadline are cancelled if
+        possible and reported as FanOutTimeout errors. Those already running
+        stop at their next Spotify request.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'SPOTIFY_FANOUT_TIMEOUT', 10)
+
+    executor = get_executor()
+    started = time.monotonic()
+    # Each call runs in a copy of the caller's context, so per-request state
+    # such as spotifyApp.metrics follows it into the worker thread
+    futures = {
+        executor.submit(call_context(started + timeout).run, func, *args, **kwargs): name
+        for name, (func, args, kwargs) in calls.items()
+    }
+    done, not_done = wait(futures, timeout=timeout)
+
+    results = {}
+    errors = {}
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            errors[name] = e
+    for future in not_done:
+        future.cancel()
+        errors[futures[future]] = FanOutTimeout(
+            f"Spotify call did not finish within {timeout} seconds"
+        )
+
+    return FanOutResult(results, errors, time.monotonic() - started)
@@ -0,0 +1,76 @@
+"""
+Encrypted model fields for the SpotifyWrapper project.
+
+Values are encrypted with Fernet (AES-128-CBC plus HMAC-SHA256) before they
+reach the database. The keys come from ``settings.SPOTIFY_TOKEN_ENCRYPTION_KEYS``,
+newest first. Extra keys are still used for decryption, so keys can be
+rotated: add a new key in front, then run ``rotate_spotify_credentials`` to
+re-encrypt every row with it. Without configured keys, one key is derived
+from SECRET_KEY.
+"""
+
+import base64
+import hashlib
+import json
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from django.conf import settings
+from django.db import models
+
+
+_fernets = {}
+
+
+def get_fernet():
+    """Returns the MultiFernet for the configured keys, newest key first."""
+    keys = tuple(getattr(settings, 'SPOTIFY_TOKEN_ENCRYPTION_KEYS', None) or ())
+    if not keys:
+        digest = hashlib.sha256(f'spotify-token:{settings.SECRET_KEY}'.encode()).digest()
+        keys = (base64.urlsafe_b64encode(digest).decode(),)
+    fernet = _fernets.get(keys)
+    if fernet is None:
+        fernet = _fernets[keys] = MultiFernet([Fernet(key) for key in keys])
+    return fernet
+
+
+def encrypt_json(value):
+    """Serializes ``value`` to JSON and encrypts it; returns the token as text."""
+    return get_fernet().encrypt(json.dumps(value).encode()).decode()
+
+
+def decrypt_json(token):
+    """
+    Decrypts a token made by encrypt_json.
+
+    Raises:
+        cryptography.fernet.InvalidToken: If no configured key can decrypt it.
+    """
+    return json.loads(get_fernet().decrypt(token.encode()))
+
+
+class EncryptedJSONField(models.TextField):
+    """
+    A JSON value stored encrypted in a text column.
+
+    Values written before the column was encrypted are plain JSON text.
+    They are still read, and are encrypted the next time the row is saved.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        try:
+            return decrypt_json(value)
+        except InvalidToken:
+            # Plain JSON from before encryption; anything else is a key problem
+            if value.lstrip()[:1] not in ('{', '['):
+                raise
+            return json.loads(value)
+
+    def to_python(self, value):
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+        return encrypt_json(value)
@@ -0,0 +1,96 @@
+"""
+Game rounds for the song guessing game.
+
+A round is assembled on the server from the user's top tracks, so the
+frontend gets every question, preview URL and distractor in one response:
+
+    {
+        'track': {...},             # projected track, with its preview_url
+        'answer_year': 2019,
+        'year_options': [2017, 2019, 2020, 2022],
+        'distractors': [{'id': ..., 'name': ..., 'artists': [...]}, ...],
+    }
+
+``year_options`` serve the release-year question; ``distractors`` are other
+tracks from the same pool, for guessing the song from its preview.
+"""
+
+import random
+from datetime import date
+
+from .compact import project_track
+
+
+# Answer choices per question, including the right one
+OPTIONS_PER_QUESTION = 4
+
+# Release years a wrong year option may be off by
+YEAR_OFFSETS = (-3, -2, -1, 1, 2, 3)
+
+# Oldest release year offered as a wrong option
+MIN_YEAR = 1950
+
+
+def release_year(track):
+    """Returns the release year of a track's album, or None if unknown."""
+    release_date = (track.get('album') or {}).get('release_date') or ''
+    try:
+        return int(release_date[:4])
+    except ValueError:
+        return None
+
+
+def year_options(year, rng):
+    """Returns the shuffled year choices for a track released in ``year``."""
+    candidates = [year + offset for offset in YEAR_OFFSETS
+                  if MIN_YEAR < year + offset <= date.today().year]
+    options = rng.sample(candidates, min(OPTIONS_PER_QUESTION - 1, len(candidates))) + [year]
+    rng.shuffle(options)
+    return options
+
+
+def _summary(track):
+    return {
+        'id': track['id'],
+        'name': track.get('name'),
+        'artists': [artist.get('name') for artist in track.get('artists') or []],
+    }
+
+
+def build_round(tracks, previews, rounds, rng=None):
+    """
+    Assembles the questions of one game round.
+
+    Tracks with a preview and a known release year are asked first, in
+    random order; tracks without a preview only fill up the round.
+
+    Args:
+        tracks: Candidate track objects, such as the user's top tracks.
+        previews: Mapping of track ID to preview URL (None for no preview).
+        rounds: Number of questions wanted.
+        rng: Optional random.Random, for reproducible rounds.
+
+    Returns:
+        A list of at most ``rounds`` questions, shaped as in the module docstring.
+    """
+    rng = rng or random.Random()
+    pool = list({track['id']: track for track in tracks if track.get('id')}.values())
+    playable = [track for track in pool if release_year(track) is not None]
+    rng.shuffle(playable)
+    playable.sort(key=lambda track: previews.get(track['id']) is None)
+
+    questions = []
+    for track in playable[:rounds]:
+        others = [other for other in pool if other['id'] != track['id']]
+        projected = project_track(track)
+        projected['preview_url'] = previews.get(track['id'])
+        questions.append({
+            'track': projected,
+            'answer_year': release_year(track),
+            'year_options': year_options(release_year(track), rng),
+            'distractors': [
+                _summary(other)
+                for other in rng.sample(others, min(OPTIONS_PER_QUESTION - 1, len(others)))
+            ],
+        })
+    return questions
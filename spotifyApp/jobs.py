@@ -0,0 +1,148 @@
+"""
+DB-backed queue for wrap generation.
+
+Views enqueue a WrapJob and answer 202 right away. The ``run_wrap_worker``
+command claims jobs, makes the Spotify calls and writes the wrap (see
+spotifyApp.worker). Any number of workers can poll the same table, because
+each claim is a conditional UPDATE that only one of them wins.
+
+A running job whose worker died is claimed again once its lease
+(``settings.SPOTIFY_JOB_LEASE``) runs out. A job is marked succeeded in the
+same transaction that inserts its wrap, and only by the worker that still
+holds it, so one job never produces two wraps.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import SpotifyWrap, WrapJob
+
+
+def enqueue(user, kind, time_range='', run_after=None):
+    """
+    Returns the user's job for this wrap today, creating it if needed.
+
+    A job that failed, or whose wrap has since been deleted, is queued
+    again. The worker uses the user's stored SpotifyCredential.
+
+    Args:
+        user: The user the wrap is for.
+        kind: WrapJob.WRAPPED or WrapJob.TIME_RANGE.
+        time_range: The Spotify time range, for TIME_RANGE jobs.
+        run_after: When a new or re-queued job becomes runnable; defaults
+            to now.
+
+    Returns:
+        The WrapJob.
+    """
+    now = timezone.now()
+    run_after = run_after or now
+    job, created = WrapJob.objects.get_or_create(
+        user=user, kind=kind, time_range=time_range, day=timezone.localdate(),
+        defaults={'run_after': run_after},
+    )
+    if created:
+        return job
+
+    if job.status == WrapJob.FAILED or (job.status == WrapJob.SUCCEEDED and job.wrap_id is None):
+        WrapJob.objects.filter(pk=job.pk, status=job.status, wrap=None).update(
+            status=WrapJob.PENDING, error='', attempts=0,
+            run_after=run_after, started_at=None, finished_at=None, updated_at=now,
+        )
+        job.refresh_from_db()
+    return job
+
+
+def claim_next():
+    """
+    Claims the next runnable job for this worker.
+
+    Runnable means pending and due, or running with an expired lease.
+
+    Returns:
+        The claimed WrapJob, or None when there is nothing to do.
+    """
+    now = timezone.now()
+    lease_expired = now - timedelta(seconds=getattr(settings, 'SPOTIFY_JOB_LEASE', 120))
+    candidates = (
+        WrapJob.objects
+        .filter(
+            Q(status=WrapJob.PENDING, run_after__lte=now) |
+            Q(status=WrapJob.RUNNING, started_at__lt=lease_expired)
+        )
+        .order_by('run_after', 'id')
+        .values_list('id', 'status', 'started_at')[:10]
+    )
+    for job_id, job_status, started_at in candidates:
+        claimed = WrapJob.objects.filter(
+            pk=job_id, status=job_status, started_at=started_at
+        ).update(
+            status=WrapJob.RUNNING, started_at=now, attempts=F('attempts') + 1, updated_at=now
+        )
+        if claimed:
+            return WrapJob.objects.select_related('user').get(pk=job_id)
+    return None
+
+
+def claim(job):
+    """
+    Claims one pending job, for a view that generates its wrap inline
+    instead of leaving it to a worker.
+
+    Returns:
+        The claimed WrapJob, or None if it is not pending: a worker or
+        another request holds it, or it already finished.
+    """
+    now = timezone.now()
+    claimed = WrapJob.objects.filter(pk=job.pk, status=WrapJob.PENDING).update(
+        status=WrapJob.RUNNING, started_at=now, attempts=F('attempts') + 1, updated_at=now
+    )
+    if not claimed:
+        return None
+    return WrapJob.objects.select_related('user').get(pk=job.pk)
+
+
+def _owned(job):
+    """Queryset matching the job only while this worker still holds its claim."""
+    return WrapJob.objects.filter(pk=job.pk, status=WrapJob.RUNNING, started_at=job.started_at)
+
+
+def complete(job, wrap_data, title):
+    """
+    Saves the job's wrap and marks the job succeeded, atomically.
+
+    Returns:
+        The new SpotifyWrap, or None if the claim was lost to another worker.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if not _owned(job).update(status=WrapJob.SUCCEEDED, error='', finished_at=now, updated_at=now):
+            return None
+        wrap = SpotifyWrap.objects.create_wrap(user=job.user, wrap_data=wrap_data, title=title)
+        WrapJob.objects.filter(pk=job.pk).update(wrap=wrap)
+    return wrap
+
+
+def fail(job, error, retry_in=None):
+    """
+    Records a failed attempt.
+
+    With ``retry_in`` the job goes back to pending, unless it has used
+    ``settings.SPOTIFY_JOB_MAX_ATTEMPTS``. Otherwise it fails for good.
+
+    Returns:
+        True if the job will be retried.
+    """
+    now = timezone.now()
+    if retry_in is not None and job.attempts < getattr(settings, 'SPOTIFY_JOB_MAX_ATTEMPTS', 3):
+        _owned(job).update(
+            status=WrapJob.PENDING, error=error, started_at=None,
+            run_after=now + timedelta(seconds=retry_in), updated_at=now,
+        )
+        return True
+    _owned(job).update(status=WrapJob.FAILED, error=error, finished_at=now, updated_at=now)
+    return False
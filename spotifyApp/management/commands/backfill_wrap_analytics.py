@@ -0,0 +1,59 @@
+"""
+Computes analytics for SpotifyWrap rows saved before analytics existed.
+
+Wraps whose analytics are missing or from an older version are processed
+in ID order; the rest are left alone unless ``--force`` is given.
+
+Usage:
+    python manage.py backfill_wrap_analytics [--batch-size 200] [--force]
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from spotifyApp.analytics import ANALYTICS_VERSION, compute_analytics
+from spotifyApp.models import SpotifyWrap
+
+
+class Command(BaseCommand):
+    help = 'Computes stored analytics for wraps that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Wraps updated per transaction.')
+        parser.add_argument('--force', action='store_true',
+                            help='Recompute analytics for every wrap.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        skipped = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                SpotifyWrap.objects
+                .filter(id__gt=last_id)
+                .only('id', 'wrap_data', 'storage_format', 'base_id', 'delta_depth', 'analytics')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            stale = [
+                wrap for wrap in batch
+                if options['force'] or (wrap.analytics or {}).get('version') != ANALYTICS_VERSION
+            ]
+            skipped += len(batch) - len(stale)
+            for wrap in stale:
+                wrap.analytics = compute_analytics(wrap.get_wrap_data())
+            with transaction.atomic():
+                SpotifyWrap.objects.bulk_update(stale, ['analytics'])
+            updated += len(stale)
+
+            self.stdout.write(f"Processed {updated + skipped} wraps...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Computed analytics for {updated} wraps, {skipped} already up to date"
+        ))
@@ -0,0 +1,150 @@
+"""
+Benchmarks concurrent wrap writes on each database profile.
+
+Several writer threads each save wraps through SpotifyWrap.objects.create_wrap,
+which saves catalog snapshots and inserts the wrap in one
+transaction. Each profile gets its own throwaway database:
+
+- ``sqlite-default``: SQLite as Django configures it out of the box (rollback
+  journal, deferred transactions, 5 s busy timeout, no persistent connections)
+- ``sqlite-wal``: the tuned SQLite profile from spotifyWrapper.databases
+- ``postgresql``: the PostgreSQL profile, from the POSTGRES_* environment
+  variables. Skipped when psycopg is not installed or the server is unreachable.
+
+The command reports write throughput, latency percentiles and failed writes
+("database is locked"), then times a JSON containment query
+(SpotifyWrap.objects.featuring) over the wraps written.
+
+Usage:
+    python manage.py bench_db_writes [--writers 8] [--wraps 25] [--profile all]
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, OperationalError, connection
+
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.benchmarks.testdb import database_profile, temporary_database
+from spotifyApp.models import SpotifyWrap
+from spotifyApp.views import WRAPPED_SECTIONS
+from spotifyWrapper.databases import postgresql_database, sqlite_database
+
+PROFILES = ('sqlite-default', 'sqlite-wal', 'postgresql')
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Compares concurrent wrap write throughput across the database profiles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads.')
+        parser.add_argument('--wraps', type=int, default=25, help='Wraps saved by each writer.')
+        parser.add_argument('--profile', choices=PROFILES + ('all',), default='all')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        profiles = PROFILES if options['profile'] == 'all' else (options['profile'],)
+        catalog = Catalog(seed=options['seed'])
+        rng = random.Random(options['seed'])
+        payloads = [
+            [catalog.wrap(rng) for _ in range(options['wraps'])] for _ in range(options['writers'])
+        ]
+        probe_id = payloads[0][0]['topTracksRecent']['items'][0]['id']
+        sqlite_path = os.path.join(tempfile.gettempdir(), 'spotifywrapper_bench_db_writes.sqlite3')
+
+        self.stdout.write(f"{options['writers']} writers x {options['wraps']} wraps")
+        for profile in profiles:
+            if profile == 'postgresql':
+                database, test_name = postgresql_database(conn_max_age=0), None
+                try:
+                    import psycopg  # noqa: F401
+                except ImportError:
+                    try:
+                        import psycopg2  # noqa: F401
+                    except ImportError:
+                        self.stdout.write(f"{profile:>15}: skipped, psycopg is not installed")
+                        continue
+            else:
+                tuned = profile == 'sqlite-wal'
+                database = sqlite_database(
+                    sqlite_path, conn_max_age=0, busy_timeout=20 if tuned else 5, tuned=tuned
+                )
+                test_name = sqlite_path
+            try:
+                with database_profile(database), temporary_database(test_name=test_name):
+                    result = self._run(payloads)
+                    result['query'] = self._time_query(probe_id)
+            except DatabaseError as exc:
+                self.stdout.write(f"{profile:>15}: skipped, {str(exc).splitlines()[0]}")
+                continue
+            self._report(profile, result)
+
+    def _run(self, payloads):
+        """Saves every payload list from its own thread; returns latencies, errors and wall time."""
+        users = [
+            User.objects.create_user(username=f'bench-writer-{index}', password='bench')
+            for index in range(len(payloads))
+        ]
+        latencies, errors = [], []
+        lock = threading.Lock()
+        start = threading.Barrier(len(payloads) + 1)
+
+        def write(user, wraps):
+            start.wait()
+            try:
+                for wrap_data in wraps:
+                    began = time.perf_counter()
+                    try:
+                        SpotifyWrap.objects.create_wrap(user, wrap_data, 'Benchmark')
+                    except OperationalError as exc:
+                        with lock:
+                            errors.append(str(exc))
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - began)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write, args=pair) for pair in zip(users, payloads)]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return {'latencies': latencies, 'errors': errors, 'elapsed': time.perf_counter() - began}
+
+    def _time_query(self, spotify_id, repeat=20):
+        """Returns (matches, mean seconds) for a featuring() query over the written wraps."""
+        query = SpotifyWrap.objects.featuring(spotify_id, WRAPPED_SECTIONS)
+        matches = query.count()
+        began = time.perf_counter()
+        for _ in range(repeat):
+            query.count()
+        return matches, (time.perf_counter() - began) / repeat
+
+    def _report(self, profile, result):
+        latencies = result['latencies']
+        line = f"{profile:>15}: {len(latencies) / result['elapsed']:7.1f} wraps/s"
+        if latencies:
+            line += '  p50/p95/p99 {:.0f}/{:.0f}/{:.0f} ms'.format(
+                *(_percentile(latencies, fraction) * 1000 for fraction in (0.5, 0.95, 0.99))
+            )
+            line += f"  mean {statistics.mean(latencies) * 1000:.0f} ms"
+        line += f"  failed {len(result['errors'])}"
+        matches, seconds = result['query']
+        line += f"  featuring() {matches} wraps in {seconds * 1000:.1f} ms"
+        self.stdout.write(line)
+        if result['errors']:
+            self.stdout.write(f"{'':>17}first error: {result['errors'][0]}")
@@ -0,0 +1,178 @@
+"""
+End-to-end benchmark of the main API endpoints against a local stand-in Spotify server.
+
+Serves the project over HTTP on a threaded WSGI server, in a throwaway
+database with synthetic users who each have a stored Spotify token and a
+history of wraps. Upstream calls go to the fake Spotify server (see
+spotifyApp/benchmarks/fake_spotify.py). Its latency, error rate and 429
+rate are configurable. Each endpoint is driven at a fixed concurrency:
+
+- ``auth``: the Spotify OAuth callback, which exchanges a code for tokens
+- ``wrapped``: a freshly generated wrap
+- ``wraps``: the first page of wrap history
+- ``wrap-detail``: a stored wrap
+- ``playlists``: every page of the user's playlists
+
+For each one the command reports throughput, p50/p95/p99 latency, DB
+queries and time per request, upstream calls per request and response
+status counts. The Spotify response caches are disabled unless ``--cache``
+is given, so every request pays its upstream calls.
+
+Usage:
+    python manage.py bench_endpoints [--requests 200] [--concurrency 16] [--latency 0.05]
+        [--error-rate 0.0] [--rate-limit-rate 0.0] [--endpoint all]
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from spotifyApp.benchmarks.fake_spotify import run_fake_spotify
+from spotifyApp.benchmarks.harness import QueryCounter, create_users, run_app_server
+from spotifyApp.benchmarks.testdb import temporary_database
+from spotifyApp.models import SpotifyWrap
+
+ENDPOINTS = ('auth', 'wrapped', 'wraps', 'wrap-detail', 'playlists')
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the main API endpoints end to end against a local stand-in Spotify server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight.')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--wraps-per-user', type=int, default=10)
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Seconds the fake Spotify server adds to every response.')
+        parser.add_argument('--jitter', type=float, default=0.0,
+                            help='Mean extra upstream delay, exponentially distributed.')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Share of upstream calls failing with a 5xx.')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                            help='Share of upstream calls answered with a 429.')
+        parser.add_argument('--retry-after', type=int, default=1,
+                            help='Retry-After seconds of the injected 429s.')
+        parser.add_argument('--cache', action='store_true', help='Keep the Spotify response caches on.')
+        parser.add_argument('--endpoint', choices=ENDPOINTS + ('all',), default='all')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        endpoints = ENDPOINTS if options['endpoint'] == 'all' else (options['endpoint'],)
+        fake_spotify = {
+            'latency': options['latency'],
+            'jitter': options['jitter'],
+            'error_rate': options['error_rate'],
+            'rate_limit_rate': options['rate_limit_rate'],
+            'retry_after': options['retry_after'],
+            'seed': options['seed'],
+        }
+        # File-backed, so concurrent request threads don't hit SQLite's shared-cache table locks
+        db_name = os.path.join(tempfile.gettempdir(), 'spotifywrapper_bench_endpoints.sqlite3')
+        with temporary_database(test_name=db_name), run_fake_spotify(**fake_spotify) as spotify:
+            overrides = {
+                'SPOTIFY_API_BASE_URL': f'{spotify.base_url}/v1',
+                'SPOTIFY_ACCOUNTS_URL': spotify.base_url,
+                'SPOTIFY_CLIENT_ID': 'bench',
+                'SPOTIFY_CLIENT_SECRET': 'bench',
+                'SPOTIFY_RATE_LIMIT_PER_SECOND': 1_000_000,
+                'ALLOWED_HOSTS': ['*'],
+            }
+            if not options['cache']:
+                overrides['SPOTIFY_CACHE_TTLS'] = {
+                    name: 0 for name in ('profile', 'top_items', 'playlists', 'tracks')
+                }
+            with override_settings(**overrides):
+                cache.clear()
+                users = self._create_users(spotify.catalog, options)
+                counter = QueryCounter()
+                self.stdout.write(
+                    f"{options['requests']} requests per endpoint, concurrency {options['concurrency']}, "
+                    f"upstream latency {options['latency'] * 1000:.0f} ms, "
+                    f"error rate {options['error_rate']:.0%}, 429 rate {options['rate_limit_rate']:.0%}"
+                )
+                with counter.installed(), run_app_server() as base_url:
+                    for endpoint in endpoints:
+                        spotify.reset_counts()
+                        counter.reset()
+                        result = self._drive(
+                            base_url, endpoint, users, options['requests'], options['concurrency']
+                        )
+                        self._report(endpoint, result, counter, spotify)
+
+    def _create_users(self, catalog, options):
+        """Creates the users and their wrap histories; returns (cookies, wrap IDs) pairs."""
+        rng = random.Random(options['seed'])
+        users = []
+        for user, cookies in create_users(options['users']):
+            wrap_ids = [
+                SpotifyWrap.objects.create_wrap(user, catalog.wrap(rng), f'Wrap {index}').pk
+                for index in range(options['wraps_per_user'])
+            ]
+            users.append((cookies, wrap_ids))
+        return users
+
+    def _request(self, endpoint, index, users):
+        """Returns (method, path, cookies, JSON body) for the index-th request to an endpoint."""
+        cookies, wrap_ids = users[index % len(users)]
+        if endpoint == 'auth':
+            return 'POST', '/api/spotify/callback/', None, {'code': f'code-{index}'}
+        if endpoint == 'wrapped':
+            return 'GET', '/api/spotify/wrapped/?refresh=1', cookies, None
+        if endpoint == 'wraps':
+            return 'GET', '/api/spotify/wraps/', cookies, None
+        if endpoint == 'wrap-detail':
+            return 'GET', f'/api/spotify/wraps/{wrap_ids[index % len(wrap_ids)]}/', cookies, None
+        return 'GET', '/api/spotify/playlists/', cookies, None
+
+    def _drive(self, base_url, endpoint, users, total, concurrency):
+        """Sends ``total`` requests from ``concurrency`` threads; returns latencies, statuses and sizes."""
+        local = threading.local()
+        latencies, statuses, sizes = [], Counter(), []
+        lock = threading.Lock()
+
+        def one(index):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            method, path, cookies, body = self._request(endpoint, index, users)
+            started = time.perf_counter()
+            response = session.request(method, base_url + path, cookies=cookies, json=body)
+            elapsed = time.perf_counter() - started
+            session.cookies.clear()
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] += 1
+                sizes.append(len(response.content))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+        return {'latencies': latencies, 'statuses': statuses, 'sizes': sizes, 'elapsed': elapsed}
+
+    def _report(self, endpoint, result, counter, spotify):
+        latencies = sorted(result['latencies'])
+        cuts = statistics.quantiles(latencies, n=100)
+        count = len(latencies)
+        line = (
+            f"{endpoint:>11}: {count / result['elapsed']:>7.1f} req/s  "
+            f"p50/p95/p99 {cuts[49] * 1000:.0f}/{cuts[94] * 1000:.0f}/{cuts[98] * 1000:.0f} ms  "
+            f"db {counter.count / count:.1f} queries/req ({counter.seconds / count * 1000:.1f} ms)  "
+            f"upstream calls/req {spotify.request_count / count:.1f}  "
+            f"avg body {statistics.mean(result['sizes']) / 1024:.1f} KiB  "
+            f"statuses {dict(sorted(result['statuses'].items()))}"
+        )
+        if spotify.injected:
+            line += f"  injected {dict(spotify.injected)}"
+        self.stdout.write(line)
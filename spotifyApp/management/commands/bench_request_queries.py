@@ -0,0 +1,118 @@
+"""
+Counts the database queries behind the Spotify-bound endpoints, per session engine.
+
+Runs each endpoint against a local stand-in Spotify server, in a throwaway
+database, once per session engine: the database engine Django uses by
+default, and the ``cached_db`` engine the project uses. A logged-in user
+with a stored Spotify credential sends warmed-up requests. The report
+gives queries per request, split by table.
+
+With the database engine every request reads ``django_session``. With
+``cached_db``, sessions and credentials come from the cache, and only the
+user lookup for authentication is left.
+
+Usage:
+    python manage.py bench_request_queries [--requests 20] [--endpoint all]
+"""
+
+import re
+from collections import Counter
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from spotifyApp.benchmarks.fake_spotify import run_fake_spotify
+from spotifyApp.benchmarks.testdb import temporary_database
+from spotifyApp.models import SpotifyCredential
+from spotifyApp.tokens import stamp_expiry
+
+
+ENDPOINTS = {
+    'playlists': '/api/spotify/playlists/',
+    'wrapped': '/api/spotify/wrapped/',
+    'preview': '/api/spotify/tracks/{track_id}/preview/',
+}
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+}
+
+TABLE_RE = re.compile(r'(?:FROM|INTO|UPDATE)\s+"?(\w+)"?')
+
+
+class Command(BaseCommand):
+    help = 'Reports DB queries per request for the Spotify-bound endpoints, per session engine.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Measured requests per endpoint and engine.')
+        parser.add_argument('--endpoint', choices=tuple(ENDPOINTS) + ('all',), default='all')
+
+    def handle(self, *args, **options):
+        endpoints = ENDPOINTS if options['endpoint'] == 'all' else {
+            options['endpoint']: ENDPOINTS[options['endpoint']]
+        }
+        with temporary_database(), run_fake_spotify() as server:
+            overrides = {
+                'SPOTIFY_API_BASE_URL': f'{server.base_url}/v1',
+                'SPOTIFY_ACCOUNTS_URL': server.base_url,
+                'SPOTIFY_CLIENT_ID': 'bench',
+                'SPOTIFY_CLIENT_SECRET': 'bench',
+                'ALLOWED_HOSTS': ['*'],
+                'SPOTIFY_RATE_LIMIT_PER_SECOND': 1_000_000,
+            }
+            with override_settings(**overrides):
+                user = User.objects.create_user(username='bench', password='bench')
+                SpotifyCredential.store(user, stamp_expiry({
+                    'access_token': 'bench-token', 'refresh_token': 'bench-refresh', 'expires_in': 3600,
+                }))
+                track_id = server.catalog.tracks[0]['id']
+
+                for name, path in endpoints.items():
+                    for engine, module in SESSION_ENGINES.items():
+                        with override_settings(SESSION_ENGINE=module):
+                            cache.clear()
+                            client = self._login(user)
+                            url = path.format(track_id=track_id)
+                            self._get(client, url)  # warm the caches
+                            with CaptureQueriesContext(connection) as queries:
+                                for _ in range(options['requests']):
+                                    self._get(client, url)
+                        self._report(name, engine, queries.captured_queries, options['requests'])
+
+    def _login(self, user):
+        """Returns a test client with a logged-in session for ``user`` in the current engine."""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        client = Client()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return client
+
+    def _get(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} answered {response.status_code}: {response.content[:200]!r}')
+
+    def _report(self, name, engine, queries, requests):
+        tables = Counter()
+        for query in queries:
+            match = TABLE_RE.search(query['sql'])
+            tables[match.group(1) if match else query['sql'].split()[0]] += 1
+        detail = ', '.join(f'{table} {count / requests:.1f}' for table, count in tables.most_common())
+        self.stdout.write(
+            f"{name:>9} {engine:>9}: {len(queries) / requests:.1f} queries/request"
+            + (f"  ({detail})" if detail else '')
+        )
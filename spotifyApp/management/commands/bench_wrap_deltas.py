@@ -0,0 +1,108 @@
+"""
+Benchmarks delta-encoded wrap storage on a synthetic one-year history.
+
+Each synthetic user gets one wrap per week for a year, with recent top
+lists churning faster than all-time ones. The same history is written once
+in compact mode and once in delta mode, in a throwaway database. The
+command reports the wrap_data bytes stored and the read latency with a cold
+and a warm reconstruction cache, split into reconstructing the compact form
+and the full read including catalog expansion.
+
+Usage:
+    python manage.py bench_wrap_deltas [--users 20] [--weeks 52] [--keyframe-interval 8]
+"""
+
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.test.utils import override_settings
+
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.benchmarks.testdb import temporary_database
+from spotifyApp.models import SpotifyWrap
+
+
+class Command(BaseCommand):
+    help = 'Compares compact and delta wrap storage on a synthetic one-year history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--weeks', type=int, default=52)
+        parser.add_argument('--keyframe-interval', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        catalog = Catalog(seed=options['seed'])
+        histories = []
+        rng = random.Random(options['seed'])
+        for _ in range(options['users']):
+            wrap = catalog.wrap(rng)
+            history = [wrap]
+            for _ in range(options['weeks'] - 1):
+                wrap = catalog.evolve(rng, wrap)
+                history.append(wrap)
+            histories.append(history)
+
+        with temporary_database():
+            results = {
+                mode: self._run(mode, histories, options['keyframe_interval'])
+                for mode in (SpotifyWrap.COMPACT, SpotifyWrap.DELTA)
+            }
+
+        n_wraps = options['users'] * options['weeks']
+        self.stdout.write(f"History: {options['users']} users x {options['weeks']} weekly wraps")
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:>8}: {result['bytes'] / n_wraps:>8,.0f} bytes/wrap  "
+                f"reconstruct p50/p95 cold {result['cold'][0] * 1000:.2f}/{result['cold'][1] * 1000:.2f} ms, "
+                f"warm {result['warm'][0] * 1000:.2f}/{result['warm'][1] * 1000:.2f} ms; "
+                f"full read p50 {result['read'][0] * 1000:.2f} ms"
+            )
+        saved = 1 - results[SpotifyWrap.DELTA]['bytes'] / results[SpotifyWrap.COMPACT]['bytes']
+        self.stdout.write(self.style.SUCCESS(f"Delta mode saves {saved:.0%} of wrap_data bytes"))
+
+    def _run(self, mode, histories, interval):
+        SpotifyWrap.objects.all().delete()
+        User.objects.filter(username__startswith='bench-').delete()
+        cache.clear()
+
+        with override_settings(SPOTIFY_WRAP_STORAGE=mode, SPOTIFY_WRAP_KEYFRAME_INTERVAL=interval):
+            for index, history in enumerate(histories):
+                user = User.objects.create(username=f'bench-{index}')
+                for week, wrap_data in enumerate(history):
+                    SpotifyWrap.objects.create_wrap(user, wrap_data, f'Week {week + 1}')
+
+        stored = SpotifyWrap.objects.aggregate(
+            total=Sum(Length('wrap_data'))
+        )['total']
+
+        wraps = list(SpotifyWrap.objects.order_by('id'))
+        expected = [wrap_data for history in histories for wrap_data in history]
+        for wrap, wrap_data in zip(wraps, expected):
+            rebuilt = wrap.get_compact_data()['sections']
+            for name, section in wrap_data.items():
+                assert rebuilt[name]['ids'] == [item['id'] for item in section['items']], (wrap.pk, name)
+
+        cold = self._time(wraps, lambda wrap: wrap.get_compact_data(), clear_cache=True)
+        warm = self._time(wraps, lambda wrap: wrap.get_compact_data())
+        read = self._time(wraps, lambda wrap: wrap.get_wrap_data())
+
+        return {'bytes': stored, 'cold': cold, 'warm': warm, 'read': read}
+
+    def _time(self, wraps, read, clear_cache=False):
+        """Returns the (p50, p95) latency in seconds of ``read`` over freshly loaded wraps."""
+        timings = []
+        for wrap in wraps:
+            if clear_cache:
+                cache.clear()
+            wrap = SpotifyWrap.objects.get(pk=wrap.pk)
+            started = time.perf_counter()
+            read(wrap)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings), statistics.quantiles(timings, n=20)[-1]
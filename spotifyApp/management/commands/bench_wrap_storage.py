@@ -0,0 +1,69 @@
+"""
+Benchmarks the bytes stored per wrap in raw versus compact format.
+
+Generates synthetic users drawing from a shared pool of artists and tracks,
+then reports the average wrap_data size in each format and the catalog
+bytes amortized over all wraps. Runs in memory and touches no database.
+
+Usage:
+    python manage.py bench_wrap_storage [--users 500] [--wraps-per-user 4]
+"""
+
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.compact import compact_wrap, expand_wrap
+
+
+def _size(value):
+    return len(json.dumps(value, separators=(',', ':')).encode())
+
+
+class Command(BaseCommand):
+    help = 'Reports bytes per wrap for the raw and compact storage formats.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--wraps-per-user', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        catalog = Catalog(seed=options['seed'])
+        rng = random.Random(options['seed'])
+        n_wraps = options['users'] * options['wraps_per_user']
+
+        raw_bytes = 0
+        compact_bytes = 0
+        tracks = {}
+        artists = {}
+        expand_seconds = 0.0
+
+        for _ in range(n_wraps):
+            raw = catalog.wrap(rng)
+            compact, wrap_tracks, wrap_artists = compact_wrap(raw)
+            tracks.update(wrap_tracks)
+            artists.update(wrap_artists)
+            raw_bytes += _size(raw)
+            compact_bytes += _size(compact)
+
+            started = time.perf_counter()
+            expand_wrap(compact, tracks, artists)
+            expand_seconds += time.perf_counter() - started
+
+        catalog_bytes = sum(_size(t) for t in tracks.values()) + sum(_size(a) for a in artists.values())
+
+        self.stdout.write(f"Wraps: {n_wraps} ({options['users']} users)")
+        self.stdout.write(f"Raw:     {raw_bytes / n_wraps:>10,.0f} bytes/wrap")
+        self.stdout.write(f"Compact: {compact_bytes / n_wraps:>10,.0f} bytes/wrap "
+                          f"(+ {catalog_bytes / n_wraps:,.0f} amortized catalog bytes, "
+                          f"{len(tracks)} tracks / {len(artists)} artists)")
+        total_compact = compact_bytes + catalog_bytes
+        self.stdout.write(self.style.SUCCESS(
+            f"Reduction: {raw_bytes / total_compact:.1f}x "
+            f"({raw_bytes:,} -> {total_compact:,} bytes total); "
+            f"expand: {expand_seconds / n_wraps * 1e6:.0f} us/wrap"
+        ))
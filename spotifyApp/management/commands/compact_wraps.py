@@ -0,0 +1,61 @@
+"""
+Converts existing raw SpotifyWrap rows to the compact storage format.
+
+Usage:
+    python manage.py compact_wraps [--batch-size 200] [--dry-run]
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from spotifyApp.compact import compact_wrap
+from spotifyApp.models import SpotifyWrap
+
+
+class Command(BaseCommand):
+    help = 'Converts raw SpotifyWrap rows to the compact, catalog-backed storage format.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Wraps converted per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the size reduction without writing anything.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        converted = 0
+        bytes_before = 0
+        bytes_after = 0
+        last_id = 0
+
+        while True:
+            batch = list(
+                SpotifyWrap.objects
+                .filter(storage_format=SpotifyWrap.RAW, id__gt=last_id)
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            with transaction.atomic():
+                for wrap in batch:
+                    bytes_before += len(json.dumps(wrap.wrap_data))
+                    if dry_run:
+                        compact = compact_wrap(wrap.wrap_data)[0]
+                    else:
+                        wrap.set_wrap_data(wrap.wrap_data, SpotifyWrap.COMPACT)
+                        wrap.save(update_fields=['wrap_data', 'storage_format'])
+                        compact = wrap.wrap_data
+                    bytes_after += len(json.dumps(compact))
+                    converted += 1
+
+            self.stdout.write(f"Processed {converted} wraps...")
+
+        verb = 'Would convert' if dry_run else 'Converted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {converted} wraps: {bytes_before} -> {bytes_after} bytes of wrap_data"
+        ))
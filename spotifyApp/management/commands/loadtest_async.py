@@ -0,0 +1,143 @@
+"""
+Load-tests the Spotify-bound endpoints under ASGI, sync views vs async views.
+
+Runs a local stand-in Spotify server with a fixed per-call latency. Then it
+drives the wrapped, playlists, track-preview and callback endpoints through
+the project's ASGI application at a fixed concurrency, once with the DRF
+views and once with the native async views (``SPOTIFY_ASYNC_VIEWS``). The
+response cache is disabled, so every request goes upstream. Runs in a
+throwaway database with synthetic users.
+
+Under ASGI, Django gives every sync view its own worker thread, which
+blocks while Spotify responds. Async views wait on the event loop instead.
+The stand-in server runs in the same process, so on small machines both
+modes can end up CPU-bound. Raise --latency to keep the test dominated by
+upstream waits.
+
+Usage:
+    python manage.py loadtest_async [--requests 200] [--concurrency 50] [--latency 0.1]
+        [--endpoint wrapped] [--mode both]
+"""
+
+import asyncio
+import importlib
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from spotifyApp.async_api import get_async_client
+from spotifyApp.benchmarks.fake_spotify import run_fake_spotify
+from spotifyApp.benchmarks.harness import create_users
+from spotifyApp.benchmarks.testdb import temporary_database
+
+
+ENDPOINTS = ('wrapped', 'playlists', 'preview', 'callback')
+
+
+class Command(BaseCommand):
+    help = 'Compares sync and async Spotify views under ASGI against a local stand-in Spotify server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--latency', type=float, default=0.1,
+                            help='Seconds the stand-in server adds to every Spotify call.')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--endpoint', choices=ENDPOINTS + ('all',), default='wrapped')
+        parser.add_argument('--mode', choices=('sync', 'async', 'both'), default='both')
+
+    def handle(self, *args, **options):
+        endpoints = ENDPOINTS if options['endpoint'] == 'all' else (options['endpoint'],)
+        modes = ('sync', 'async') if options['mode'] == 'both' else (options['mode'],)
+
+        # File-backed, so concurrent request threads don't hit SQLite's shared-cache table locks
+        db_name = os.path.join(tempfile.gettempdir(), 'spotifywrapper_loadtest.sqlite3')
+        with temporary_database(test_name=db_name), run_fake_spotify(latency=options['latency']) as server:
+            overrides = {
+                'SPOTIFY_API_BASE_URL': f'{server.base_url}/v1',
+                'SPOTIFY_ACCOUNTS_URL': server.base_url,
+                'SPOTIFY_CLIENT_ID': 'loadtest',
+                'SPOTIFY_CLIENT_SECRET': 'loadtest',
+                'SPOTIFY_RATE_LIMIT_PER_SECOND': 1_000_000,
+                'SPOTIFY_CACHE_TTLS': {name: 0 for name in ('profile', 'top_items', 'playlists', 'tracks')},
+                'ALLOWED_HOSTS': ['*'],
+            }
+            with override_settings(**overrides):
+                cookies = self._create_sessions(options['users'])
+                track_ids = [track['id'] for track in server.catalog.tracks[:200]]
+
+                self.stdout.write(
+                    f"{options['requests']} requests per run, concurrency {options['concurrency']}, "
+                    f"upstream latency {options['latency'] * 1000:.0f} ms"
+                )
+                for endpoint in endpoints:
+                    for mode in modes:
+                        with override_settings(SPOTIFY_ASYNC_VIEWS=(mode == 'async')):
+                            self._reload_urls()
+                            calls_before = server.request_count
+                            result = asyncio.run(self._drive(
+                                endpoint, cookies, track_ids,
+                                options['requests'], options['concurrency']
+                            ))
+                            upstream = server.request_count - calls_before
+                        self._report(endpoint, mode, result, upstream)
+            self._reload_urls()
+
+    def _create_sessions(self, count):
+        """Creates users with logged-in sessions and stored Spotify tokens; returns their cookies."""
+        return [cookies for _, cookies in create_users(count, prefix='loadtest')]
+
+    def _reload_urls(self):
+        """Rebuilds the Spotify routes so they pick up the current SPOTIFY_ASYNC_VIEWS."""
+        importlib.reload(importlib.import_module('spotifyApp.urls'))
+        clear_url_caches()
+
+    async def _drive(self, endpoint, cookies, track_ids, total, concurrency):
+        """Sends ``total`` requests with at most ``concurrency`` in flight; returns latencies and statuses."""
+        app = get_asgi_application()
+        transport = httpx.ASGITransport(app=app)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        statuses = {}
+
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            async def one(index):
+                cookie = cookies[index % len(cookies)]
+                if endpoint == 'wrapped':
+                    request = client.build_request('GET', '/api/spotify/wrapped/', cookies=cookie)
+                elif endpoint == 'playlists':
+                    request = client.build_request('GET', '/api/spotify/playlists/', cookies=cookie)
+                elif endpoint == 'preview':
+                    track_id = track_ids[index % len(track_ids)]
+                    request = client.build_request('GET', f'/api/spotify/tracks/{track_id}/preview/', cookies=cookie)
+                else:
+                    request = client.build_request('POST', '/api/spotify/callback/', json={'code': f'code-{index}'})
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.send(request)
+                    latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(index) for index in range(total)))
+            elapsed = time.perf_counter() - started
+
+        await get_async_client().aclose()
+        return {'latencies': latencies, 'statuses': statuses, 'elapsed': elapsed}
+
+    def _report(self, endpoint, mode, result, upstream):
+        latencies = sorted(result['latencies'])
+        cuts = statistics.quantiles(latencies, n=100)
+        count = len(latencies)
+        self.stdout.write(
+            f"{endpoint:>9} {mode:>5}: {count / result['elapsed']:>7.1f} req/s  "
+            f"p50/p95/p99 {cuts[49] * 1000:.0f}/{cuts[94] * 1000:.0f}/{cuts[98] * 1000:.0f} ms  "
+            f"upstream calls/req {upstream / count:.1f}  statuses {result['statuses']}"
+        )
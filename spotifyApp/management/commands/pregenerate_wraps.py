@@ -0,0 +1,180 @@
+"""
+Pre-generates wraps for every user with a stored Spotify credential.
+
+Meant to run on a schedule before peak traffic (the Wrapped season), so
+get_wrapped_data can serve the precomputed wrap without calling Spotify.
+
+Users are processed in ID order, in batches. A thread pool fetches each
+batch's top items from Spotify, then the batch's wraps and any refreshed
+tokens are committed in one transaction. A checkpoint file records the last
+committed user and the users whose fetch failed transiently. A run started
+again on the same day retries those users first, then continues after the
+last committed one. Users who already have today's precomputed wrap are
+skipped.
+
+Usage:
+    python manage.py pregenerate_wraps [--workers 8] [--batch-size 50]
+        [--checkpoint PATH] [--restart] [--limit N]
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from spotifyApp import transport
+from spotifyApp.models import SpotifyCredential, SpotifyWrap
+from spotifyApp.tokens import TokenManager, TokenRefreshError
+from spotifyApp.views import SpotifyAPI, WRAPPED_SECTIONS
+
+
+class Command(BaseCommand):
+    help = 'Pre-generates wraps for all users with stored Spotify credentials.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Users fetched from Spotify in parallel.')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Users committed per transaction.')
+        parser.add_argument('--checkpoint', default=str(Path(settings.BASE_DIR) / '.pregenerate_wraps.json'),
+                            help='File recording progress, for resuming an interrupted run.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and start from the first user.')
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Stop after this many users.')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or getattr(settings, 'SPOTIFY_PREGENERATE_WORKERS', 8)
+        batch_size = options['batch_size'] or getattr(settings, 'SPOTIFY_PREGENERATE_BATCH_SIZE', 50)
+        checkpoint = Path(options['checkpoint'])
+        today = timezone.localdate()
+
+        last_user_id, retry = (0, []) if options['restart'] else self._read_checkpoint(checkpoint, today)
+        if last_user_id:
+            self.stdout.write(f'Resuming after user {last_user_id}')
+        if retry:
+            self.stdout.write(f'Retrying {len(retry)} users that failed earlier')
+        failed = []
+
+        spotify = SpotifyAPI()
+        totals = {'generated': 0, 'skipped': 0, 'failed': 0}
+        pool_before = transport.stats()
+        started = time.perf_counter()
+        finished = False
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pregenerate') as executor:
+            while options['limit'] is None or sum(totals.values()) < options['limit']:
+                size = batch_size
+                if options['limit'] is not None:
+                    size = min(size, options['limit'] - sum(totals.values()))
+                credentials = SpotifyCredential.objects.select_related('user').order_by('user_id')
+                if retry:
+                    batch = list(credentials.filter(user_id__in=retry[:size]))
+                    retry = retry[size:]
+                else:
+                    batch = list(credentials.filter(user_id__gt=last_user_id)[:size])
+                    if not batch:
+                        finished = True
+                        break
+                    last_user_id = batch[-1].user_id
+
+                done_today = set(
+                    SpotifyWrap.objects
+                    .filter(user_id__in=[c.user_id for c in batch], precomputed=True,
+                            date_generated__date=today)
+                    .values_list('user_id', flat=True)
+                )
+                todo = [c for c in batch if c.user_id not in done_today]
+                totals['skipped'] += len(batch) - len(todo)
+
+                outcomes = list(executor.map(lambda c: self._fetch(spotify, c), todo))
+                failed += self._commit(outcomes, totals)
+
+                # Failed users are kept in the checkpoint, so the next run retries them
+                self._write_checkpoint(checkpoint, today, last_user_id, retry + failed)
+                self._report(totals, pool_before, started)
+
+        if finished and not failed:
+            checkpoint.unlink(missing_ok=True)
+        self._report(totals, pool_before, started, final=True)
+        if failed:
+            self.stdout.write(f'{len(failed)} users failed; run the command again today to retry them')
+
+    def _fetch(self, spotify, credential):
+        """
+        Fetches one user's wrap sections. Runs on a pool thread.
+
+        Returns:
+            A (credential, token_info, wrap_data, error) tuple, where
+            token_info is set only if the token was refreshed.
+        """
+        try:
+            token_info = TokenManager(spotify).ensure_fresh(credential.token_info)
+            wrap_data = {
+                name: spotify.get_user_top_items(token_info['access_token'], item_type, time_range, 20)
+                for name, (item_type, time_range) in WRAPPED_SECTIONS.items()
+            }
+        except Exception as e:
+            return credential, None, None, e
+        refreshed = token_info if token_info != credential.token_info else None
+        return credential, refreshed, wrap_data, None
+
+    def _commit(self, outcomes, totals):
+        """
+        Saves a batch's wraps and refreshed tokens in one transaction.
+
+        Returns:
+            The IDs of users whose fetch failed and is worth retrying.
+        """
+        title = f"Wrap - {datetime.now().strftime('%Y-%m-%d')}"
+        failed = []
+        with transaction.atomic():
+            for credential, refreshed, wrap_data, error in outcomes:
+                if error is not None:
+                    totals['failed'] += 1
+                    self.stderr.write(f'user {credential.user_id}: {error}')
+                    if isinstance(error, TokenRefreshError):
+                        # The user has to reconnect Spotify; stop retrying them
+                        SpotifyCredential.clear(credential.user_id)
+                    else:
+                        failed.append(credential.user_id)
+                    continue
+                if refreshed is not None:
+                    SpotifyCredential.store(credential.user, refreshed)
+                SpotifyWrap.objects.create_wrap(
+                    user=credential.user, wrap_data=wrap_data, title=title, precomputed=True
+                )
+                totals['generated'] += 1
+        return failed
+
+    def _read_checkpoint(self, path, today):
+        try:
+            state = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return 0, []
+        if state.get('day') != today.isoformat():
+            return 0, []
+        return int(state.get('last_user_id', 0)), [int(user_id) for user_id in state.get('failed', [])]
+
+    def _write_checkpoint(self, path, today, last_user_id, failed):
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'day': today.isoformat(), 'last_user_id': last_user_id, 'failed': failed}))
+        tmp.replace(path)
+
+    def _report(self, totals, pool_before, started, final=False):
+        elapsed = time.perf_counter() - started
+        pool = transport.stats()
+        upstream = (pool['hits'] + pool['misses']) - (pool_before['hits'] + pool_before['misses'])
+        processed = totals['generated'] + totals['failed']
+        line = (
+            f"{totals['generated']} generated, {totals['skipped']} skipped, {totals['failed']} failed "
+            f"in {elapsed:.1f}s: {processed / elapsed if elapsed else 0:.1f} users/s, "
+            f"{upstream / elapsed if elapsed else 0:.1f} upstream calls/s"
+        )
+        self.stdout.write(self.style.SUCCESS(line) if final else line)
@@ -0,0 +1,40 @@
+"""
+Re-encrypts stored Spotify tokens with the newest encryption key.
+
+Run after adding a key to the front of ``SPOTIFY_TOKEN_ENCRYPTION_KEYS``;
+old keys can be removed once it finishes. Also encrypts tokens saved
+before encryption was introduced.
+
+Usage:
+    python manage.py rotate_spotify_credentials [--batch-size 500]
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from spotifyApp.models import SpotifyCredential
+
+
+class Command(BaseCommand):
+    help = 'Re-encrypts stored Spotify tokens with the newest encryption key.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows re-encrypted per transaction.')
+
+    def handle(self, *args, **options):
+        credentials = self._rotate(SpotifyCredential.objects.all(), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Re-encrypted {credentials} credentials"))
+
+    def _rotate(self, queryset, batch_size):
+        """Decrypts and re-saves token_info in ID order; returns the number of rows."""
+        done = 0
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).only('pk', 'token_info').order_by('pk')[:batch_size])
+            if not batch:
+                return done
+            last_id = batch[-1].pk
+            with transaction.atomic():
+                queryset.model.objects.bulk_update(batch, ['token_info'])
+            done += len(batch)
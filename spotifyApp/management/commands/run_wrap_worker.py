@@ -0,0 +1,36 @@
+"""
+Runs a worker for queued wrap generation jobs.
+
+Start as many as needed; they share the queue through the database.
+
+Usage:
+    python manage.py run_wrap_worker [--poll-interval 1.0] [--burst] [--max-jobs N]
+"""
+
+from django.core.management.base import BaseCommand
+
+from spotifyApp.worker import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Processes queued wrap generation jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty.')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='Exit after processing this many jobs.')
+
+    def handle(self, *args, **options):
+        try:
+            processed = run_worker(
+                poll_interval=options['poll_interval'],
+                burst=options['burst'],
+                max_jobs=options['max_jobs'],
+                stdout=self.stdout,
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
@@ -0,0 +1,257 @@
+"""
+In-process request metrics for the SpotifyWrapper project.
+
+RequestMetricsMiddleware (see spotifyApp.middleware) times every request
+and splits the time into three parts:
+
+- upstream: Spotify calls, recorded by SpotifyAPI and AsyncSpotifyAPI
+- DB: queries, recorded by a wrapper on every database connection
+- rendering: JSON encoding, recorded by FastJSONRenderer
+
+The parts are summed per request through a context variable, so calls made
+from fan-out worker threads still count toward the request that made them.
+Concurrent calls are summed, so upstream time can exceed the request's
+wall-clock time.
+
+Metrics are kept per process and exposed in the Prometheus text format by
+the ``metrics/`` endpoint. With several worker processes, each one reports
+its own counts; scrape every worker, or aggregate the series by instance.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+# Latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Response size buckets, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Queries per request
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Path segments followed by a Spotify ID or user name in API URLs
+ID_PARENTS = frozenset(('albums', 'artists', 'episodes', 'playlists', 'shows', 'tracks', 'users'))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count, per label set."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count)
+                      in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = (('le', _number(bound)),)
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {count}'
+
+
+REQUEST_DURATION = Histogram(
+    'spotifywrapper_request_duration_seconds', 'Request latency by endpoint.',
+    ('endpoint', 'method', 'status'),
+)
+REQUEST_UPSTREAM_SECONDS = Histogram(
+    'spotifywrapper_request_upstream_seconds', 'Time spent in Spotify calls per request.', ('endpoint',),
+)
+REQUEST_DB_SECONDS = Histogram(
+    'spotifywrapper_request_db_seconds', 'Time spent in database queries per request.', ('endpoint',),
+)
+REQUEST_DB_QUERIES = Histogram(
+    'spotifywrapper_request_db_queries', 'Database queries per request.', ('endpoint',), QUERY_BUCKETS,
+)
+REQUEST_RENDER_SECONDS = Histogram(
+    'spotifywrapper_request_render_seconds', 'Time spent encoding JSON per request.', ('endpoint',),
+)
+RESPONSE_SIZE = Histogram(
+    'spotifywrapper_response_size_bytes', 'Response body size as sent, after compression.',
+    ('endpoint',), SIZE_BUCKETS,
+)
+UPSTREAM_REQUESTS = Counter(
+    'spotifywrapper_upstream_requests_total', 'Spotify API calls by path and status.',
+    ('method', 'path', 'status'),
+)
+UPSTREAM_DURATION = Histogram(
+    'spotifywrapper_upstream_duration_seconds', 'Spotify API call latency by path.', ('method', 'path'),
+)
+
+METRICS = (
+    REQUEST_DURATION, REQUEST_UPSTREAM_SECONDS, REQUEST_DB_SECONDS, REQUEST_DB_QUERIES,
+    REQUEST_RENDER_SECONDS, RESPONSE_SIZE, UPSTREAM_REQUESTS, UPSTREAM_DURATION,
+)
+
+
+class RequestStats:
+    """Upstream, DB and rendering totals of one request."""
+    __slots__ = ('upstream_calls', 'upstream_seconds', 'db_queries', 'db_seconds', 'render_seconds', '_lock')
+
+    def __init__(self):
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, field, seconds, count_field=None):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + seconds)
+            if count_field:
+                setattr(self, count_field, getattr(self, count_field) + 1)
+
+
+_current = contextvars.ContextVar('spotify_request_stats', default=None)
+
+
+def begin_request():
+    """Starts collecting stats for the current request; returns (stats, token for end_request)."""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def normalize_path(url):
+    """Reduces a Spotify URL to a low-cardinality path label, e.g. '/v1/tracks/{id}'."""
+    segments = urlsplit(url).path.split('/')
+    for index in range(1, len(segments)):
+        if segments[index - 1] in ID_PARENTS and segments[index] and segments[index] not in ID_PARENTS:
+            segments[index] = '{id}'
+    return '/'.join(segments)
+
+
+def record_upstream(method, url, status, seconds):
+    """
+    Records one Spotify call.
+
+    Args:
+        method: The HTTP method.
+        url: The requested URL; IDs are replaced by a placeholder in the label.
+        status: The response status, or 'error' when no response came back.
+        seconds: How long the call took, including retries.
+    """
+    path = normalize_path(url)
+    UPSTREAM_REQUESTS.inc(method, path, str(status))
+    UPSTREAM_DURATION.observe(seconds, method, path)
+    stats = _current.get()
+    if stats is not None:
+        stats.add('upstream_seconds', seconds, 'upstream_calls')
+
+
+def record_render(seconds):
+    """Adds JSON encoding time to the current request."""
+    stats = _current.get()
+    if stats is not None:
+        stats.add('render_seconds', seconds)
+
+
+def _time_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add('db_seconds', time.perf_counter() - started, 'db_queries')
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def instrument_database():
+    """Times the queries of the current thread's connections and of every one opened from now on."""
+    connection_created.connect(_instrument_connection, dispatch_uid='spotifyApp.metrics')
+    for connection in connections.all(initialized_only=True):
+        _instrument_connection(None, connection)
+
+
+def observe_request(endpoint, method, status, seconds, stats, size=None):
+    """Records a finished request and its upstream, DB and rendering split."""
+    REQUEST_DURATION.observe(seconds, endpoint, method, f'{status // 100}xx')
+    REQUEST_UPSTREAM_SECONDS.observe(stats.upstream_seconds, endpoint)
+    REQUEST_DB_SECONDS.observe(stats.db_seconds, endpoint)
+    REQUEST_DB_QUERIES.observe(stats.db_queries, endpoint)
+    REQUEST_RENDER_SECONDS.observe(stats.render_seconds, endpoint)
+    if size is not None:
+        RESPONSE_SIZE.observe(size, endpoint)
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
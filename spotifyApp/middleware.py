@@ -0,0 +1,248 @@
+"""
+Middleware for the spotifyApp views.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+def accepted_encodings(header):
+    """Parses an Accept-Encoding header into a mapping of coding to q-value."""
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[coding.strip().lower()] = q
+    return encodings
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses of at least ``settings.SPOTIFY_COMPRESS_MIN_SIZE``
+    bytes with brotli or gzip, whichever the client prefers.
+
+    Brotli is used only when the ``brotli`` package is installed. Streamed
+    responses are gzipped like GZipMiddleware does, except server-sent event
+    streams, which must reach the client one event at a time. Bodies that are
+    gzip files already, such as gzipped exports, are left alone.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').startswith('application/gzip'):
+            return response
+        if response.streaming:
+            if response.get('Content-Type', '').startswith('text/event-stream'):
+                return response
+            return super().process_response(request, response)
+        if len(response.content) < getattr(settings, 'SPOTIFY_COMPRESS_MIN_SIZE', 1024):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        br = encodings.get('br', 0) if brotli is not None else 0
+        gzip = encodings.get('gzip', 0)
+        if br <= 0 and gzip <= 0:
+            return response
+
+        if br >= gzip:
+            coding = 'br'
+            compressed = brotli.compress(
+                response.content, quality=getattr(settings, 'SPOTIFY_BROTLI_QUALITY', 5)
+            )
+        else:
+            coding = 'gzip'
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # Like GZipMiddleware: a compressed body only keeps a weak ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Records each request's latency, response size, and upstream, DB and
+    rendering time in spotifyApp.metrics, labelled by URL name.
+
+    Place it first in MIDDLEWARE so the latency covers the other middleware
+    and the size is what is sent after compression. For streamed responses
+    the latency runs until the stream starts, and no size is recorded.
+    Disabled by ``settings.SPOTIFY_METRICS_ENABLED = False``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SPOTIFY_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        metrics.instrument_database()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token = metrics.begin_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self._observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.begin_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self._observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def _observe(self, request, response, seconds, stats):
+        match = request.resolver_match
+        endpoint = match.view_name if match is not None else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        metrics.observe_request(endpoint, request.method, response.status_code, seconds, stats, size)
+
+
+class ProfilingMiddleware:
+    """
+    Runs selected requests under cProfile and writes the results to
+    ``settings.SPOTIFY_PROFILE_DIR``.
+
+    A request is profiled when a staff user sends the
+    ``settings.SPOTIFY_PROFILE_HEADER`` header (``X-Profile: 1`` by default),
+    or at random with probability ``settings.SPOTIFY_PROFILE_SAMPLE_RATE``.
+    Each capture writes two files, named after the time, the endpoint, the
+    user and the duration:
+
+    - ``.prof``: pstats data, for snakeviz (icicle chart), flameprof
+      (flamegraph) or ``python -m pstats``
+    - ``.txt``: the top functions by cumulative time, with their callees
+
+    Header-triggered responses name the capture in an ``X-Profile-Id``
+    header. Only the newest ``settings.SPOTIFY_PROFILE_MAX_FILES`` captures
+    are kept.
+
+    Without SPOTIFY_PROFILE_DIR the middleware removes itself from the
+    stack at startup, so it costs nothing. Place it after
+    AuthenticationMiddleware, since the header check needs request.user.
+    Streamed response bodies are produced after the view returns and are not
+    profiled. Async views are passed through unprofiled, since cProfile
+    follows a single thread and not the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.directory = getattr(settings, 'SPOTIFY_PROFILE_DIR', '')
+        if not self.directory:
+            raise MiddlewareNotUsed
+        os.makedirs(self.directory, exist_ok=True)
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.header = getattr(settings, 'SPOTIFY_PROFILE_HEADER', 'X-Profile')
+        self.sample_rate = getattr(settings, 'SPOTIFY_PROFILE_SAMPLE_RATE', 0.0)
+        self.max_files = getattr(settings, 'SPOTIFY_PROFILE_MAX_FILES', 200)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        requested = self._requested(request)
+        if not requested and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        capture = self._write(request, profiler, time.perf_counter() - started)
+        if requested:
+            response['X-Profile-Id'] = capture
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def _requested(self, request):
+        if request.headers.get(self.header) not in ('1', 'true'):
+            return False
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def _write(self, request, profiler, seconds):
+        """Writes the .prof and .txt files of a capture; returns its name."""
+        match = request.resolver_match
+        endpoint = match.view_name if match is not None else 'unmatched'
+        user = getattr(request, 'user', None)
+        user_tag = f'user{user.pk}' if user is not None and user.is_authenticated else 'anonymous'
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+        name = re.sub(r'[^\w.-]+', '_', f'{stamp}-{endpoint}-{user_tag}-{seconds * 1000:.0f}ms')
+        path = os.path.join(self.directory, name)
+
+        profiler.dump_stats(f'{path}.prof')
+        report = io.StringIO()
+        report.write(f'{request.method} {request.get_full_path()}\n')
+        report.write(f'endpoint: {endpoint}\nuser: {user_tag}\nduration: {seconds * 1000:.1f} ms\n\n')
+        stats = pstats.Stats(profiler, stream=report).sort_stats(pstats.SortKey.CUMULATIVE)
+        stats.print_stats(40)
+        stats.print_callees(20)
+        with open(f'{path}.txt', 'w') as file:
+            file.write(report.getvalue())
+        self._prune()
+        return name
+
+    def _prune(self):
+        captures = sorted(
+            entry for entry in os.listdir(self.directory) if entry.endswith('.prof')
+        )
+        for entry in captures[:max(0, len(captures) - self.max_files)]:
+            base = os.path.join(self.directory, entry[:-len('.prof')])
+            for suffix in ('.prof', '.txt'):
+                try:
+                    os.remove(base + suffix)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogArtist',
+            fields=[
+                ('spotify_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogTrack',
+            fields=[
+                ('spotify_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='spotifywrap',
+            name='storage_format',
+            field=models.CharField(choices=[('raw', 'Raw Spotify responses'), ('compact', 'Compact, catalog-backed')], default='raw', max_length=16),
+        ),
+    ]
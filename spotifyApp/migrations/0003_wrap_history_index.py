@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0002_compact_wrap_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='spotifywrap',
+            index=models.Index(fields=['user', '-date_generated', '-id'], name='wrap_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0003_wrap_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spotifywrap',
+            name='base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deltas', to='spotifyApp.spotifywrap'),
+        ),
+        migrations.AddField(
+            model_name='spotifywrap',
+            name='delta_depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='spotifywrap',
+            name='storage_format',
+            field=models.CharField(choices=[('raw', 'Raw Spotify responses'), ('compact', 'Compact, catalog-backed'), ('delta', 'Delta against the previous wrap')], default='raw', max_length=16),
+        ),
+    ]
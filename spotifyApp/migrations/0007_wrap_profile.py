@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0006_precomputed_wraps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spotifywrap',
+            name='profile',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
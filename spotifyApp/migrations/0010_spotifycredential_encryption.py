@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:47
+
+import spotifyApp.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0009_wrap_content_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='spotifycredential',
+            name='token_info',
+            field=spotifyApp.fields.EncryptedJSONField(),
+        ),
+        migrations.AlterField(
+            model_name='wrapjob',
+            name='token_info',
+            field=spotifyApp.fields.EncryptedJSONField(blank=True, null=True),
+        ),
+    ]
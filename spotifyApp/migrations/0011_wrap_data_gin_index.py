@@ -0,0 +1,37 @@
+"""
+Adds a GIN index on SpotifyWrap.wrap_data for JSON containment queries
+(SpotifyWrap.objects.featuring).
+
+Only PostgreSQL can build it; on other databases this migration does
+nothing, so the same migration history applies to every deployment. The
+index is not declared on the model, which keeps the model state the same
+on every database.
+"""
+
+from django.db import migrations
+
+
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = schema_editor.quote_name(apps.get_model('spotifyApp', 'SpotifyWrap')._meta.db_table)
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS "wrap_data_gin_idx" ON {table} USING gin ("wrap_data" jsonb_path_ops)'
+    )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS "wrap_data_gin_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0010_spotifycredential_encryption'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
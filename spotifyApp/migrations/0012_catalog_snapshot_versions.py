@@ -0,0 +1,76 @@
+"""
+Turns the catalog tables into immutable, versioned snapshots.
+
+The catalog used to hold one row per Spotify ID, overwritten whenever
+Spotify's data changed. Each existing row becomes the first snapshot of its
+ID, versioned by a hash of its data (as spotifyApp.compact.catalog_version
+computes it). Wraps saved before versions existed resolve to that oldest
+snapshot.
+"""
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def catalog_version(data):
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def copy_rows(apps, schema_editor):
+    for name in ('Artist', 'Track'):
+        legacy = apps.get_model('spotifyApp', f'LegacyCatalog{name}')
+        model = apps.get_model('spotifyApp', f'Catalog{name}')
+        rows = legacy.objects.order_by('spotify_id').values_list('spotify_id', 'data')
+        model.objects.bulk_create(
+            (
+                model(spotify_id=spotify_id, version=catalog_version(data), data=data)
+                for spotify_id, data in rows.iterator(chunk_size=2000)
+            ),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0011_wrap_data_gin_index'),
+    ]
+
+    operations = [
+        migrations.RenameModel('CatalogArtist', 'LegacyCatalogArtist'),
+        migrations.RenameModel('CatalogTrack', 'LegacyCatalogTrack'),
+        migrations.CreateModel(
+            name='CatalogArtist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(max_length=64)),
+                ('version', models.CharField(max_length=16)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('spotify_id', 'version'), name='catalogartist_version')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CatalogTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(max_length=64)),
+                ('version', models.CharField(max_length=16)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('spotify_id', 'version'), name='catalogtrack_version')],
+            },
+        ),
+        migrations.RunPython(copy_rows, migrations.RunPython.noop),
+        migrations.DeleteModel('LegacyCatalogArtist'),
+        migrations.DeleteModel('LegacyCatalogTrack'),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spotifyApp', '0012_catalog_snapshot_versions'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='wrapjob',
+            name='token_info',
+        ),
+    ]
@@ -1,17 +1,373 @@
+import hashlib
+import json
 
-from django.db import models
+from cryptography.fernet import InvalidToken
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, models, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Cast
 from django.contrib.auth.models import User
 
+from .analytics import ANALYTICS_VERSION, compute_analytics
+from .catalog import catalog_cache
+from .compact import compact_wrap, expand_wrap, section_refs
+from .delta import apply_delta, diff_compact
+from .duo import PROFILE_VERSION, build_profile
+from .fields import EncryptedJSONField, decrypt_json, encrypt_json
+
 # Create your models here.
 
+class CatalogEntry(models.Model):
+    """
+    A snapshot of a Spotify track or artist, shared by every wrap that
+    references it.
+
+    ``data`` holds the projected object (see spotifyApp.compact) and
+    ``version`` a hash of it. Rows are never updated: when Spotify's data
+    changes (popularity, images, preview URL...), the next wrap adds a new
+    version, and older wraps keep expanding to the version they were saved
+    with.
+    """
+    spotify_id = models.CharField(max_length=64)
+    version = models.CharField(max_length=16)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+        constraints = [
+            # Also serves lookups by Spotify ID
+            models.UniqueConstraint(fields=['spotify_id', 'version'], name='%(class)s_version'),
+        ]
+
+    def __str__(self):
+        return self.data.get('name') or self.spotify_id
+
+
+class CatalogArtist(CatalogEntry):
+    """A snapshot of a Spotify artist; see CatalogEntry."""
+    kind = 'artist'
+
+
+class CatalogTrack(CatalogEntry):
+    """A snapshot of a Spotify track; see CatalogEntry."""
+    kind = 'track'
+
+
+CATALOG_MODELS = {model.kind: model for model in (CatalogTrack, CatalogArtist)}
+
+
+def insert_catalog(model, objects, versions):
+    """
+    Saves catalog snapshots from a mapping of Spotify ID to projected data,
+    under the given versions (see spotifyApp.compact.catalog_version).
+    Snapshots that already exist are left as they are. The shared catalog
+    cache gets the snapshots, and its latest copies are updated to the new
+    data.
+    """
+    if not objects:
+        return
+    model.objects.bulk_create(
+        [
+            model(spotify_id=spotify_id, version=versions[spotify_id], data=data)
+            for spotify_id, data in objects.items()
+        ],
+        ignore_conflicts=True,
+    )
+    catalog_cache.store_snapshots(model.kind, objects, versions)
+    catalog_cache.store(model.kind, objects)
+
+
+def _catalog_rows(model, spotify_ids, newest):
+    """Returns the newest or oldest snapshot of each Spotify ID, as a dict of ID to data."""
+    pick = model.objects.filter(spotify_id=OuterRef('spotify_id')).order_by(
+        *(('-created_at', '-id') if newest else ('created_at', 'id'))
+    )
+    return dict(
+        model.objects
+        .filter(spotify_id__in=spotify_ids, id=Subquery(pick.values('id')[:1]))
+        .values_list('spotify_id', 'data')
+    )
+
+
+def resolve_catalog(kind, refs):
+    """
+    Returns the projected tracks or artists a stored wrap references, as
+    they were when it was saved. Pinned snapshots are read from the
+    version-keyed entries of the shared catalog cache, then the catalog
+    tables; the ID-keyed live entries are never consulted.
+
+    Args:
+        kind: 'track' or 'artist'.
+        refs: A mapping of Spotify ID to catalog version (see
+            spotifyApp.compact.section_refs). Wraps saved before versions
+            existed have None; they get each ID's oldest snapshot, which
+            does not change either.
+
+    Returns:
+        A dict mapping Spotify ID to projected object. IDs not found are
+        left out.
+    """
+    model = CATALOG_MODELS[kind]
+    pinned = {spotify_id: version for spotify_id, version in refs.items() if version}
+    found = {}
+    if pinned:
+        found, missing = catalog_cache.lookup_snapshots(kind, pinned)
+        if missing:
+            rows = model.objects.filter(
+                spotify_id__in=missing, version__in={pinned[spotify_id] for spotify_id in missing}
+            ).values_list('spotify_id', 'version', 'data')
+            snapshots = {
+                spotify_id: data for spotify_id, version, data in rows if pinned[spotify_id] == version
+            }
+            catalog_cache.store_snapshots(kind, snapshots, pinned)
+            found.update(snapshots)
+    unpinned = [spotify_id for spotify_id, version in refs.items() if not version]
+    if unpinned:
+        found.update(_catalog_rows(model, unpinned, newest=False))
+    return found
+
+
+def latest_catalog(kind, spotify_ids):
+    """
+    Returns the current projected tracks or artists for Spotify IDs, for
+    views showing live data: from the shared catalog cache, then the newest
+    snapshot in the catalog tables. Rows read from the tables are added to
+    the cache.
+
+    Args:
+        kind: 'track' or 'artist'.
+        spotify_ids: The Spotify IDs to resolve.
+
+    Returns:
+        A dict mapping Spotify ID to projected object. IDs found in neither
+        are left out.
+    """
+    found, missing = catalog_cache.lookup(kind, spotify_ids)
+    if missing:
+        rows = _catalog_rows(CATALOG_MODELS[kind], missing, newest=True)
+        catalog_cache.store(kind, rows)
+        found.update(rows)
+    return found
+
+
+class SpotifyCredential(models.Model):
+    """
+    A user's current Spotify token: the one every Spotify-bound view uses,
+    and the one ``pregenerate_wraps`` uses when the user has no live session.
+
+    Saved when the user connects Spotify and whenever the token is refreshed.
+    The token is encrypted at rest (see spotifyApp.fields). Reads go through
+    a read-through cache that holds the encrypted token, so the hot path of
+    a request does not query this table.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='spotify_credential')
+    token_info = EncryptedJSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Cached for users without a credential, so they don't query on every request
+    MISSING = ''
+
+    def __str__(self):
+        return f"{self.user.username}'s Spotify credential"
+
+    @staticmethod
+    def cache_key(user_id):
+        return f"spotify:credential:{user_id}"
+
+    @staticmethod
+    def _cache_ttl():
+        return getattr(settings, 'SPOTIFY_CREDENTIAL_CACHE_TTL', 60 * 60)
+
+    @classmethod
+    def _from_cache(cls, cached):
+        """Decodes a cache entry; returns (hit, token_info)."""
+        if cached is None:
+            return False, None
+        if cached == cls.MISSING:
+            return True, None
+        try:
+            return True, decrypt_json(cached)
+        except InvalidToken:
+            # Written with a key that has since been removed
+            return False, None
+
+    @classmethod
+    def load(cls, user_id):
+        """
+        Returns the user's token_info, or None if they have not connected
+        Spotify. Served from the cache when possible.
+        """
+        hit, token_info = cls._from_cache(cache.get(cls.cache_key(user_id)))
+        if hit:
+            return token_info
+        token_info = cls.objects.filter(user_id=user_id).values_list('token_info', flat=True).first()
+        cache.set(
+            cls.cache_key(user_id),
+            encrypt_json(token_info) if token_info is not None else cls.MISSING,
+            timeout=cls._cache_ttl()
+        )
+        return token_info
+
+    @classmethod
+    def store(cls, user, token_info):
+        """Saves ``token_info`` as the user's current credential."""
+        cls.objects.update_or_create(user=user, defaults={'token_info': token_info})
+        cache.set(cls.cache_key(user.pk), encrypt_json(token_info), timeout=cls._cache_ttl())
+
+    @classmethod
+    def clear(cls, user_id):
+        """Forgets the user's credential, e.g. after Spotify revoked it."""
+        cls.objects.filter(user_id=user_id).delete()
+        cache.set(cls.cache_key(user_id), cls.MISSING, timeout=cls._cache_ttl())
+
+    @classmethod
+    async def aload(cls, user_id):
+        """Async version of load."""
+        hit, token_info = cls._from_cache(await cache.aget(cls.cache_key(user_id)))
+        if hit:
+            return token_info
+        token_info = await cls.objects.filter(user_id=user_id).values_list('token_info', flat=True).afirst()
+        await cache.aset(
+            cls.cache_key(user_id),
+            encrypt_json(token_info) if token_info is not None else cls.MISSING,
+            timeout=cls._cache_ttl()
+        )
+        return token_info
+
+    @classmethod
+    async def astore(cls, user, token_info):
+        """Async version of store."""
+        await cls.objects.aupdate_or_create(user=user, defaults={'token_info': token_info})
+        await cache.aset(cls.cache_key(user.pk), encrypt_json(token_info), timeout=cls._cache_ttl())
+
+    @classmethod
+    async def aclear(cls, user_id):
+        """Async version of clear."""
+        await cls.objects.filter(user_id=user_id).adelete()
+        await cache.aset(cls.cache_key(user_id), cls.MISSING, timeout=cls._cache_ttl())
+
+
+def hash_wrap_data(wrap_data):
+    """SHA-256 of a wrap's data in canonical JSON form, used as its ETag."""
+    canonical = json.dumps(wrap_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class SpotifyWrapManager(models.Manager):
+    def featuring(self, spotify_id, sections):
+        """
+        Wraps whose given sections list the track or artist ``spotify_id``.
+
+        On PostgreSQL this is a JSON containment (``@>``) query, served by the
+        GIN index on wrap_data (created by migration 0002 on PostgreSQL only). Other databases have no JSON containment, so
+        the stored JSON text is searched for the quoted ID instead, which can
+        also match the ID in another section.
+
+        Delta wraps only store the IDs that are new since their base, so they
+        match in the wrap where the item first appears.
+
+        Args:
+            spotify_id: The track or artist ID.
+            sections: Names of the wrap sections to search, e.g. 'topTracksRecent'.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.annotate(wrap_text=Cast('wrap_data', models.TextField())).filter(
+                wrap_text__contains=json.dumps(spotify_id)
+            )
+        query = models.Q()
+        for section in sections:
+            query |= (
+                models.Q(wrap_data__contains={section: {'items': [{'id': spotify_id}]}})
+                | models.Q(wrap_data__contains={'sections': {section: {'ids': [spotify_id]}}})
+                | models.Q(wrap_data__contains={'sections': {section: {'ops': [spotify_id]}}})
+            )
+        return self.filter(query)
+
+    def with_wrap_json(self):
+        """
+        Loads wraps with ``wrap_json``, the stored wrap_data as JSON text,
+        instead of decoding wrap_data. Views pass the text of raw wraps
+        straight through to the response.
+        """
+        return self.defer('wrap_data').annotate(wrap_json=Cast('wrap_data', models.TextField()))
+
+    def create_wrap(self, user, wrap_data, title, precomputed=False):
+        """
+        Creates a wrap, storing it in the format set by ``settings.SPOTIFY_WRAP_STORAGE``.
+
+        Args:
+            user: The owner of the wrap.
+            wrap_data: The raw wrap data fetched from Spotify.
+            title: The wrap title.
+            precomputed: True for wraps generated ahead of time by ``pregenerate_wraps``.
+
+        Returns:
+            The saved SpotifyWrap.
+        """
+        storage_format = getattr(settings, 'SPOTIFY_WRAP_STORAGE', self.model.COMPACT)
+        with transaction.atomic():
+            wrap = self.model(
+                user=user, title=title, precomputed=precomputed,
+                content_hash=hash_wrap_data(wrap_data),
+                profile=build_profile(wrap_data), analytics=compute_analytics(wrap_data)
+            )
+            if storage_format == self.model.DELTA:
+                wrap.set_wrap_data(wrap_data, self.model.COMPACT)
+                base = (
+                    self.filter(user=user, storage_format__in=self.model.CATALOG_FORMATS)
+                    .order_by('-date_generated', '-id')
+                    .first()
+                )
+                interval = getattr(settings, 'SPOTIFY_WRAP_KEYFRAME_INTERVAL', 8)
+                if base is not None and base.delta_depth + 1 < interval:
+                    wrap.set_delta(base, wrap.wrap_data)
+            else:
+                wrap.set_wrap_data(wrap_data, storage_format)
+            wrap.save()
+        return wrap
+
+
 class SpotifyWrap(models.Model):
+    RAW = 'raw'
+    COMPACT = 'compact'
+    DELTA = 'delta'
+    STORAGE_FORMATS = [
+        (RAW, 'Raw Spotify responses'),
+        (COMPACT, 'Compact, catalog-backed'),
+        (DELTA, 'Delta against the previous wrap'),
+    ]
+    # Formats whose wrap_data references the catalog tables
+    CATALOG_FORMATS = (COMPACT, DELTA)
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date_generated = models.DateTimeField(auto_now_add=True)
     wrap_data = models.JSONField()
     title = models.CharField(max_length=100)  # For identifying different wraps
-    
+    storage_format = models.CharField(max_length=16, choices=STORAGE_FORMATS, default=RAW)
+    # For deltas: the wrap this one is encoded against, and the distance to its keyframe
+    base = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='deltas'
+    )
+    delta_depth = models.PositiveSmallIntegerField(default=0)
+    # SHA-256 of the wrap data when written, served as the ETag of the wrap endpoints
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    # Generated ahead of time, to be served by get_wrapped_data without calling Spotify
+    precomputed = models.BooleanField(default=False)
+    # Artist, track and genre vectors for Duo comparisons (see spotifyApp.duo)
+    profile = models.JSONField(null=True, blank=True)
+    # Aggregates shown on the wrap slides (see spotifyApp.analytics)
+    analytics = models.JSONField(null=True, blank=True)
+
+    objects = SpotifyWrapManager()
+
     class Meta:
         ordering = ['-date_generated']
+        indexes = [
+            # Serves history keyset pagination and latest-wrap lookups
+            models.Index(fields=['user', '-date_generated', '-id'], name='wrap_user_date_idx'),
+        ]
 
     def __str__(self):
         """
@@ -25,3 +381,173 @@ class SpotifyWrap(models.Model):
             str: A string representation of the SpotifyWrap instance.
         """
         return f"{self.user.username}'s Wrap - {self.date_generated.strftime('%Y-%m-%d')}"
+
+    def set_wrap_data(self, wrap_data, storage_format=None):
+        """
+        Stores raw wrap data in the given (or configured) storage format.
+
+        In compact format the projected tracks and artists are saved to the
+        catalog tables right away; the wrap row itself is not saved.
+        """
+        storage_format = storage_format or getattr(settings, 'SPOTIFY_WRAP_STORAGE', self.COMPACT)
+        if storage_format == self.COMPACT:
+            compact, tracks, artists = compact_wrap(wrap_data)
+            insert_catalog(CatalogTrack, tracks, compact['versions']['track'])
+            insert_catalog(CatalogArtist, artists, compact['versions']['artist'])
+            self.wrap_data = compact
+        else:
+            self.wrap_data = wrap_data
+        self.storage_format = storage_format
+
+    def set_delta(self, base, compact):
+        """Stores a compact wrap as a delta against ``base``; the row itself is not saved."""
+        self.wrap_data = diff_compact(base.get_compact_data(), compact)
+        self.storage_format = self.DELTA
+        self.base = base
+        self.delta_depth = base.delta_depth + 1
+
+    def materialize(self):
+        """Rewrites a delta as a standalone compact keyframe and saves it."""
+        if self.storage_format != self.DELTA:
+            return
+        self.wrap_data = self.get_compact_data()
+        self.storage_format = self.COMPACT
+        self.base = None
+        self.delta_depth = 0
+        self.save(update_fields=['wrap_data', 'storage_format', 'base', 'delta_depth'])
+
+    def get_compact_data(self):
+        """
+        Returns the compact form of a compact or delta wrap.
+
+        Deltas are rebuilt by walking back to their keyframe. Reconstructed
+        results are cached, since a saved wrap never changes.
+        """
+        if self.storage_format == self.COMPACT:
+            return self.wrap_data
+
+        cache_key = f"spotify:wrap:compact:{self.pk}"
+        compact = cache.get(cache_key)
+        if compact is None:
+            base = SpotifyWrap.objects.only(
+                'id', 'wrap_data', 'storage_format', 'base_id', 'delta_depth'
+            ).get(pk=self.base_id)
+            compact = apply_delta(base.get_compact_data(), self.wrap_data)
+            cache.set(
+                cache_key, compact,
+                timeout=getattr(settings, 'SPOTIFY_WRAP_RECONSTRUCTED_CACHE_TTL', 24 * 60 * 60)
+            )
+        return compact
+
+    def get_profile(self):
+        """
+        Returns the wrap's Duo comparison profile.
+
+        Wraps saved before profiles existed, or with an older profile
+        version, get theirs built and saved on first use.
+        """
+        if not self.profile or self.profile.get('version') != PROFILE_VERSION:
+            self.profile = build_profile(self.get_wrap_data())
+            SpotifyWrap.objects.filter(pk=self.pk).update(profile=self.profile)
+        return self.profile
+
+    def get_analytics(self, wrap_data=None):
+        """
+        Returns the wrap's analytics.
+
+        Wraps saved before analytics existed (see the
+        ``backfill_wrap_analytics`` command), or with an older analytics
+        version, get theirs computed and saved on first use.
+
+        Args:
+            wrap_data: The wrap's data in response shape, if already loaded.
+        """
+        if not self.analytics or self.analytics.get('version') != ANALYTICS_VERSION:
+            self.analytics = compute_analytics(wrap_data or self.get_wrap_data())
+            SpotifyWrap.objects.filter(pk=self.pk).update(analytics=self.analytics)
+        return self.analytics
+
+    def get_content_hash(self, wrap_data=None):
+        """
+        Returns the wrap's content hash. Wraps saved before hashes existed get
+        theirs computed from their data and saved on first use.
+
+        Args:
+            wrap_data: The wrap's data in response shape, if already loaded.
+        """
+        if not self.content_hash:
+            self.content_hash = hash_wrap_data(wrap_data or self.get_wrap_data())
+            SpotifyWrap.objects.filter(pk=self.pk).update(content_hash=self.content_hash)
+        return self.content_hash
+
+    def get_wrap_data(self):
+        """
+        Returns the wrap in the response shape, whatever its storage format.
+
+        Compact and delta wraps are expanded through resolve_catalog with
+        the catalog versions they were saved with, so the result never
+        changes.
+        """
+        if self.storage_format not in self.CATALOG_FORMATS:
+            return self.wrap_data
+        compact = self.get_compact_data()
+        return expand_wrap(
+            compact,
+            resolve_catalog('track', section_refs(compact, 'track')),
+            resolve_catalog('artist', section_refs(compact, 'artist')),
+        )
+
+
+class WrapJob(models.Model):
+    """
+    A queued wrap generation, run by the ``run_wrap_worker`` command.
+
+    There is at most one job per (user, kind, time range, day). Enqueueing
+    the same wrap again, after a retry or a double click, returns the
+    existing job instead of creating a second wrap.
+    """
+    # Kinds: the four-section wrap from get_wrapped_data, or the single
+    # time-range wrap from create_wrapped_data
+    WRAPPED = 'wrapped'
+    TIME_RANGE = 'time_range'
+    KINDS = [(WRAPPED, 'Wrapped'), (TIME_RANGE, 'Single time range')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    FINISHED = (SUCCEEDED, FAILED)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='wrap_jobs')
+    kind = models.CharField(max_length=16, choices=KINDS)
+    time_range = models.CharField(max_length=16, blank=True)
+    day = models.DateField()
+    status = models.CharField(max_length=16, choices=STATUSES, default=PENDING)
+    wrap = models.ForeignKey(SpotifyWrap, null=True, blank=True, on_delete=models.SET_NULL)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'time_range', 'day'], name='wrap_job_once_per_day'
+            ),
+        ]
+        indexes = [
+            # Serves the worker's "next runnable job" query
+            models.Index(fields=['status', 'run_after'], name='wrap_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}'s {self.kind} job ({self.status}) - {self.day}"
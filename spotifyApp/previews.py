@@ -0,0 +1,123 @@
+"""
+Shared preview-URL cache for the song guessing game.
+
+A track's preview URL is the same for every user, so it is cached once per
+track ID, in a small in-process LRU in front of Django's cache framework
+(see spotifyApp.cache.TwoTierCache).
+Preview URLs change rarely and are kept for
+``settings.SPOTIFY_PREVIEW_CACHE_TTL`` seconds. Tracks Spotify has no
+preview for are cached as well, for the shorter
+``SPOTIFY_PREVIEW_NEGATIVE_TTL``, so a game round does not ask Spotify about
+them again on every request.
+"""
+
+import threading
+
+from django.conf import settings
+
+from .cache import TwoTierCache
+
+
+# Stored for tracks without a preview; None would read as a cache miss
+NO_PREVIEW = ''
+
+
+def known_previews(tracks):
+    """Maps track IDs to the preview URLs present on full track objects."""
+    return {
+        track['id']: track['preview_url']
+        for track in tracks if track.get('id') and track.get('preview_url')
+    }
+
+
+class PreviewCache:
+    """
+    Two-tier cache mapping track IDs to preview URLs.
+
+    Lookups return a (found, missing) pair, where ``found`` maps track IDs to
+    their preview URL, or None for tracks known to have no preview.
+    """
+
+    def __init__(self):
+        self.tiers = TwoTierCache(
+            getattr(settings, 'SPOTIFY_PREVIEW_LOCAL_MAX_ENTRIES', 5000),
+            timeout=self._ttl,
+        )
+        self._stats = {'hits': 0, 'misses': 0, 'negative_hits': 0}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def _ttl(url):
+        """Returns the timeout for a cached preview URL, or NO_PREVIEW."""
+        if url:
+            return getattr(settings, 'SPOTIFY_PREVIEW_CACHE_TTL', 30 * 24 * 60 * 60)
+        return getattr(settings, 'SPOTIFY_PREVIEW_NEGATIVE_TTL', 24 * 60 * 60)
+
+    def make_key(self, track_id):
+        return f'spotify:preview:{track_id}'
+
+    def _split(self, track_ids, values):
+        found = {}
+        for track_id in track_ids:
+            value = values.get(self.make_key(track_id))
+            if value is not None:
+                found[track_id] = value or None
+        missing = [track_id for track_id in track_ids if track_id not in found]
+
+        with self._stats_lock:
+            negative = sum(1 for url in found.values() if url is None)
+            self._stats['hits'] += len(found) - negative
+            self._stats['negative_hits'] += negative
+            self._stats['misses'] += len(missing)
+        return found, missing
+
+    def _entries(self, previews):
+        """Groups entries by timeout, as (timeout, entries) pairs."""
+        groups = {}
+        for track_id, url in previews.items():
+            value = url or NO_PREVIEW
+            groups.setdefault(self._ttl(value), {})[self.make_key(track_id)] = value
+        return groups.items()
+
+    def lookup(self, track_ids):
+        """Looks up preview URLs; returns a (found, missing) pair."""
+        track_ids = list(dict.fromkeys(track_ids))
+        return self._split(track_ids, self.tiers.get_many(map(self.make_key, track_ids)))
+
+    def store(self, previews):
+        """Caches a mapping of track ID to preview URL (None for no preview)."""
+        for timeout, entries in self._entries(previews):
+            self.tiers.set_many(entries, timeout=timeout)
+
+    async def alookup(self, track_ids):
+        """Async version of lookup."""
+        track_ids = list(dict.fromkeys(track_ids))
+        return self._split(track_ids, await self.tiers.aget_many(map(self.make_key, track_ids)))
+
+    async def astore(self, previews):
+        """Async version of store."""
+        for timeout, entries in self._entries(previews):
+            await self.tiers.aset_many(entries, timeout=timeout)
+
+    def remember(self, tracks):
+        """
+        Caches the preview URLs already present on full track objects, such as
+        the items of a top-tracks response. Tracks without one are left alone,
+        since the multi-ID tracks endpoint may still have a preview for them.
+        """
+        self.store(known_previews(tracks))
+
+    async def aremember(self, tracks):
+        """Async version of remember."""
+        await self.astore(known_previews(tracks))
+
+    def stats(self):
+        with self._stats_lock:
+            counts = dict(self._stats)
+        lookups = sum(counts.values())
+        counts['hit_ratio'] = (counts['hits'] + counts['negative_hits']) / lookups if lookups else None
+        counts['local_entries'] = len(self.tiers)
+        return counts
+
+
+preview_cache = PreviewCache()
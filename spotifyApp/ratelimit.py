@@ -0,0 +1,230 @@
+"""
+Client-side rate limiting for calls to the Spotify Web API.
+
+Spotify enforces one rate limit for the whole app, so all workers have to
+cooperate. Three mechanisms work together:
+
+    SharedTokenBucket: A bucket of ``SPOTIFY_RATE_LIMIT_PER_SECOND`` tokens,
+        refilled every second and shared by all processes through the cache
+        backend. It also carries the global "blocked until" time set from a
+        429's Retry-After header, so every worker backs off, not only the
+        one that got throttled.
+    AdaptiveConcurrencyLimiter: Caps in-flight calls per process. The cap
+        grows additively on success and halves on a 429 (AIMD), so
+        concurrency drops automatically under throttling and recovers after.
+    backoff_delay: Full-jitter exponential backoff used when retrying
+        idempotent GETs.
+
+The bucket is only shared if the default cache is (Redis, set through
+``REDIS_URL``). With a per-process cache such as LocMemCache, every worker
+process gets its own budget, so Spotify sees up to N times the limit with N
+processes; ``manage.py check --deploy`` warns about it (see
+spotifyApp.checks).
+"""
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .exceptions import SpotifyAPIError
+
+
+BLOCKED_UNTIL_KEY = 'spotify:rl:blocked_until'
+
+
+def parse_retry_after(response):
+    """Returns the Retry-After header of a response in seconds, or None."""
+    value = response.headers.get('Retry-After')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Returns how long to sleep before retry number ``attempt`` (0-based).
+
+    Uses full jitter over an exponentially growing window, and never less than
+    the server-provided Retry-After.
+    """
+    base = getattr(settings, 'SPOTIFY_RETRY_BACKOFF_BASE', 0.5)
+    cap = getattr(settings, 'SPOTIFY_RETRY_BACKOFF_CAP', 8)
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class SharedTokenBucket:
+    """A per-second request budget shared by all workers through the cache."""
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.waits = 0
+
+    @property
+    def rate(self):
+        return getattr(settings, 'SPOTIFY_RATE_LIMIT_PER_SECOND', 10)
+
+    def block_for(self, seconds):
+        """Blocks all workers from calling Spotify for ``seconds``."""
+        until = time.time() + seconds
+        current = cache.get(BLOCKED_UNTIL_KEY) or 0
+        if until > current:
+            cache.set(BLOCKED_UNTIL_KEY, until, timeout=int(seconds) + 1)
+
+    async def ablock_for(self, seconds):
+        """Async version of block_for."""
+        until = time.time() + seconds
+        current = await cache.aget(BLOCKED_UNTIL_KEY) or 0
+        if until > current:
+            await cache.aset(BLOCKED_UNTIL_KEY, until, timeout=int(seconds) + 1)
+
+    def _check_wait(self, wait_for, deadline):
+        """Raises if waiting ``wait_for`` seconds would pass the deadline."""
+        if time.monotonic() + wait_for > deadline:
+            raise SpotifyAPIError(
+                'Spotify rate limit reached, try again shortly',
+                status_code=429,
+                retry_after=max(1, round(wait_for)),
+            )
+        with self._stats_lock:
+            self.waits += 1
+
+    def acquire(self, timeout=None):
+        """
+        Takes a token, sleeping until one is available.
+
+        Raises:
+            SpotifyAPIError: If no token becomes available within ``timeout``.
+        """
+        if timeout is None:
+            timeout = getattr(settings, 'SPOTIFY_RATE_LIMIT_WAIT', 10)
+        deadline = time.monotonic() + timeout
+
+        while True:
+            now = time.time()
+            blocked_until = cache.get(BLOCKED_UNTIL_KEY) or 0
+            if blocked_until > now:
+                wait_for = blocked_until - now
+            else:
+                window = int(now)
+                key = f'spotify:rl:{window}'
+                cache.add(key, 0, timeout=5)
+                try:
+                    taken = cache.incr(key)
+                except ValueError:
+                    # The window key expired between add() and incr(); try again
+                    continue
+                if taken <= self.rate:
+                    return
+                wait_for = window + 1 - now
+
+            self._check_wait(wait_for, deadline)
+            time.sleep(wait_for)
+
+    async def aacquire(self, timeout=None):
+        """Async version of acquire, for the async client."""
+        if timeout is None:
+            timeout = getattr(settings, 'SPOTIFY_RATE_LIMIT_WAIT', 10)
+        deadline = time.monotonic() + timeout
+
+        while True:
+            now = time.time()
+            blocked_until = await cache.aget(BLOCKED_UNTIL_KEY) or 0
+            if blocked_until > now:
+                wait_for = blocked_until - now
+            else:
+                window = int(now)
+                key = f'spotify:rl:{window}'
+                await cache.aadd(key, 0, timeout=5)
+                try:
+                    taken = await cache.aincr(key)
+                except ValueError:
+                    continue
+                if taken <= self.rate:
+                    return
+                wait_for = window + 1 - now
+
+            self._check_wait(wait_for, deadline)
+            await asyncio.sleep(wait_for)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits in-flight Spotify calls per process with AIMD.
+
+    The limit starts at ``SPOTIFY_CONCURRENCY_MAX``, grows by 1/limit on each
+    success, and halves (at most once per second) when Spotify throttles us.
+    """
+
+    def __init__(self):
+        self.max_limit = getattr(settings, 'SPOTIFY_CONCURRENCY_MAX', 16)
+        self.min_limit = getattr(settings, 'SPOTIFY_CONCURRENCY_MIN', 1)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Holds one concurrency slot for the duration of the block."""
+        if timeout is None:
+            timeout = getattr(settings, 'SPOTIFY_RATE_LIMIT_WAIT', 10)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout=timeout):
+                raise SpotifyAPIError(
+                    'Too many concurrent Spotify calls, try again shortly',
+                    status_code=429,
+                    retry_after=1,
+                )
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            if self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._cond.notify()
+
+    def on_throttled(self):
+        with self._cond:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= 1:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = now
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'throttled': self.throttled,
+            }
+
+
+token_bucket = SharedTokenBucket()
+concurrency_limiter = AdaptiveConcurrencyLimiter()
+
+
+def stats():
+    """Returns a snapshot of the limiter state."""
+    return {
+        'rate_per_second': token_bucket.rate,
+        'bucket_waits': token_bucket.waits,
+        'blocked_until': cache.get(BLOCKED_UNTIL_KEY),
+        'concurrency': concurrency_limiter.stats(),
+    }
@@ -0,0 +1,139 @@
+"""
+Extra DRF renderers for the spotifyApp views.
+
+FastJSONRenderer is a drop-in for DRF's JSONRenderer that encodes with
+orjson when it is installed, and with the standard library otherwise.
+It also passes RawJSON through untouched. Views use RawJSON for
+already-serialized wrap data, so it is not decoded and encoded again.
+"""
+
+import json
+import time
+
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+from . import metrics
+
+
+class RawJSON(bytes):
+    """
+    Bytes that already hold a serialized JSON document.
+
+    Use ``merge`` to add top-level keys to a serialized object without
+    decoding it.
+    """
+
+    def merge(self, extra):
+        """Returns a RawJSON object with the keys of ``extra`` added after the existing ones."""
+        if not extra:
+            return self
+        body = self.rstrip()
+        encoded = dumps(extra)
+        if body[:-1].rstrip().endswith(b'{'):
+            return RawJSON(encoded)
+        return RawJSON(body[:-1] + b',' + encoded[1:])
+
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """
+    Serializes data to compact JSON bytes, with orjson when available.
+
+    Types orjson does not handle natively, and datetimes, go through DRF's
+    JSONEncoder, so the output matches JSONRenderer's.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            data, default=_encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when installed, and passes RawJSON
+    through as is.
+
+    Indented output, as requested by the browsable API, goes through the
+    standard JSONRenderer.
+    """
+    # Lets views hand over RawJSON instead of decoded data
+    accepts_raw_json = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, RawJSON):
+            return bytes(data)
+        started = time.perf_counter()
+        try:
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+
+            ret = dumps(data)
+            # Escape line and paragraph separators like JSONRenderer, keeping
+            # the output a strict JavaScript subset
+            if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+                ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+            return ret
+        finally:
+            metrics.record_render(time.perf_counter() - started)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets the export view stream newline-delimited JSON through DRF content
+    negotiation. Plain Response bodies, such as errors, are rendered as one
+    JSON line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data) + b'\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Lets the export view stream CSV through DRF content negotiation.
+    Plain Response bodies, such as errors, are rendered as JSON.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class PrometheusRenderer(BaseRenderer):
+    """
+    Renders the text exposition format of spotifyApp.metrics.
+
+    Text passes through as is. Other data, such as error bodies, is
+    rendered as JSON.
+    """
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, str):
+            return data.encode()
+        return dumps(data)
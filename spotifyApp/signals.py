@@ -0,0 +1,32 @@
+"""
+Signal handlers for the spotifyApp models.
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import SpotifyCredential, SpotifyWrap
+
+
+@receiver(pre_delete, sender=SpotifyWrap)
+def materialize_dependent_deltas(sender, instance, **kwargs):
+    """
+    Keeps delta chains intact when a wrap is deleted.
+
+    Wraps stored as deltas against the deleted wrap are rewritten as
+    standalone keyframes first, while their base can still be read.
+    """
+    for delta in SpotifyWrap.objects.filter(base=instance):
+        delta.materialize()
+    cache.delete(f"spotify:wrap:compact:{instance.pk}")
+
+
+@receiver(post_save, sender=SpotifyCredential)
+@receiver(post_delete, sender=SpotifyCredential)
+def invalidate_cached_credential(sender, instance, **kwargs):
+    """
+    Drops the cached copy of a credential saved or deleted outside
+    SpotifyCredential.store/clear, such as by ``pregenerate_wraps``.
+    """
+    cache.delete(SpotifyCredential.cache_key(instance.user_id))
@@ -0,0 +1,87 @@
+import random
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from spotifyApp.analytics import ANALYTICS_VERSION, compute_analytics
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.models import SpotifyWrap
+
+
+def artist(artist_id, popularity, *genres):
+    return {'id': artist_id, 'type': 'artist', 'name': artist_id, 'popularity': popularity, 'genres': list(genres)}
+
+
+def track(track_id, popularity, *artist_ids):
+    return {
+        'id': track_id, 'type': 'track', 'name': track_id, 'popularity': popularity,
+        'artists': [{'id': a} for a in artist_ids],
+    }
+
+
+class ComputeAnalyticsTests(SimpleTestCase):
+    def setUp(self):
+        self.wrap = {
+            'topTracksRecent': {'items': [track('t1', 80, 'a1'), track('t2', 60, 'a2')]},
+            'topTracksAllTime': {'items': [track('t3', 40, 'a1', 'a3'), track('t1', 80, 'a1')]},
+            'topArtistsRecent': {'items': [artist('a1', 90, 'pop', 'house'), artist('a2', 70, 'pop')]},
+            'topArtistsAllTime': {'items': [artist('a1', 90, 'pop', 'house')]},
+        }
+
+    def test_genres_popularity_and_diversity(self):
+        analytics = compute_analytics(self.wrap)
+        self.assertEqual(analytics['version'], ANALYTICS_VERSION)
+        self.assertEqual(analytics['genres'], [
+            {'genre': 'pop', 'count': 2, 'share': 0.6667},
+            {'genre': 'house', 'count': 1, 'share': 0.3333},
+        ])
+        # Items in several sections count once
+        self.assertEqual(analytics['popularity'], {'tracks': 60.0, 'artists': 80.0})
+        self.assertEqual(analytics['diversity']['unique_artists'], 3)
+        self.assertEqual(analytics['diversity']['artists_per_track'], 1.0)
+
+    def test_overlap_and_rank_changes(self):
+        analytics = compute_analytics(self.wrap)
+        self.assertEqual(analytics['overlap']['tracks'], {'count': 1, 'ratio': 0.3333})
+        self.assertEqual(
+            [(c['id'], c['all_time_rank'], c['change']) for c in analytics['rank_changes']['tracks']],
+            [('t1', 2, 1), ('t2', None, None)]
+        )
+
+    def test_single_range_wraps_have_no_comparisons(self):
+        analytics = compute_analytics({'topTracks': {'items': []}})
+        self.assertEqual((analytics['overlap'], analytics['rank_changes']), ({}, {}))
+        self.assertIsNone(analytics['diversity']['artists_per_track'])
+
+
+class StoredAnalyticsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('analytics')
+        self.wrap_data = Catalog(seed=7).wrap(random.Random(7))
+
+    def test_new_wraps_store_their_analytics(self):
+        wrap = SpotifyWrap.objects.create_wrap(self.user, self.wrap_data, 'Wrap')
+        stored = SpotifyWrap.objects.values_list('analytics', flat=True).get(pk=wrap.pk)
+        self.assertEqual(stored, compute_analytics(self.wrap_data))
+
+    def test_missing_or_outdated_analytics_are_filled_in_on_read(self):
+        for analytics in (None, {'version': ANALYTICS_VERSION - 1}):
+            with self.subTest(analytics=analytics):
+                wrap = SpotifyWrap.objects.create(
+                    user=self.user, wrap_data=self.wrap_data, title='Old', analytics=analytics
+                )
+                self.assertEqual(wrap.get_analytics(), compute_analytics(self.wrap_data))
+                wrap.refresh_from_db()
+                self.assertEqual(wrap.analytics['version'], ANALYTICS_VERSION)
+
+    def test_backfill_command(self):
+        old = SpotifyWrap.objects.create(user=self.user, wrap_data=self.wrap_data, title='Old')
+        current = SpotifyWrap.objects.create_wrap(self.user, self.wrap_data, 'Current')
+        out = StringIO()
+        call_command('backfill_wrap_analytics', batch_size=1, stdout=out)
+        self.assertIn('Computed analytics for 1 wraps, 1 already up to date', out.getvalue())
+        old.refresh_from_db()
+        self.assertEqual(old.analytics, compute_analytics(self.wrap_data))
+        self.assertEqual(SpotifyWrap.objects.get(pk=current.pk).analytics['version'], ANALYTICS_VERSION)
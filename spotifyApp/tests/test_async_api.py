@@ -0,0 +1,88 @@
+import asyncio
+from unittest import mock
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from spotifyApp.async_api import AsyncSpotifyAPI
+from spotifyApp.circuit import CircuitBreaker
+from spotifyApp.exceptions import SpotifyAPIError
+from spotifyApp.views import SpotifyAPI
+
+
+URL = 'https://api.spotify.com/v1/me/playlists'
+
+
+@override_settings(SPOTIFY_PAGINATE_PREFETCH=2)
+class AsyncPaginateTests(SimpleTestCase):
+    """Prefetched pages nobody will read are cancelled."""
+
+    def setUp(self):
+        self.started = []
+        self.cancelled = []
+        self.failing = None
+
+    async def get_page(self, access_token, url, params=None):
+        offset = params['offset']
+        if offset == 0:
+            return {'items': [0], 'next': 'more', 'total': 10}
+        self.started.append(offset)
+        if offset == self.failing:
+            raise SpotifyAPIError('bad gateway', status_code=502)
+        try:
+            await asyncio.sleep(0 if offset == 1 else 5)
+        except asyncio.CancelledError:
+            self.cancelled.append(offset)
+            raise
+        return {'items': [offset]}
+
+    def run_api(self, consume):
+        async def main():
+            api = AsyncSpotifyAPI(SpotifyAPI())
+            with mock.patch.object(api, '_get_page', self.get_page):
+                items = await api.paginate('token', URL, page_size=1)
+                result = await consume(items)
+                await asyncio.sleep(0)
+                return result
+        return asyncio.run(main())
+
+    def test_stopping_early_cancels_prefetches(self):
+        async def first_two(items):
+            taken = [await anext(items), await anext(items)]
+            await items.aclose()
+            return taken
+
+        self.assertEqual(self.run_api(first_two), [0, 1])
+        self.assertEqual(self.started, [1, 2, 3])
+        self.assertEqual(self.cancelled, [2, 3])
+
+    def test_failed_page_cancels_the_rest(self):
+        async def everything(items):
+            return [item async for item in items]
+
+        self.failing = 2
+        with self.assertRaises(SpotifyAPIError):
+            self.run_api(everything)
+        self.assertEqual(self.started, [1, 2, 3])
+        self.assertEqual(self.cancelled, [3])
+
+
+class AsyncThrottleTests(SimpleTestCase):
+    def test_429_leaves_the_thread_concurrency_limiter_alone(self):
+        responses = [
+            httpx.Response(429, headers={'Retry-After': '1'}, request=httpx.Request('GET', URL)),
+            httpx.Response(200, json={}, request=httpx.Request('GET', URL)),
+        ]
+
+        async def main():
+            api = AsyncSpotifyAPI(SpotifyAPI())
+            with mock.patch.object(api.client, 'request', side_effect=responses):
+                return await api._request('GET', URL)
+
+        with mock.patch('spotifyApp.circuit.breaker_for', return_value=CircuitBreaker('/v1/me/playlists')), \
+                mock.patch('spotifyApp.ratelimit.token_bucket.ablock_for') as block, \
+                mock.patch('spotifyApp.ratelimit.backoff_delay', return_value=0), \
+                mock.patch('spotifyApp.ratelimit.concurrency_limiter') as limiter:
+            self.assertEqual(asyncio.run(main()).status_code, 200)
+        block.assert_called_once_with(1)
+        self.assertEqual(limiter.mock_calls, [])
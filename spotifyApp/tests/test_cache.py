@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from spotifyApp.cache import TwoTierCache, response_cache
+from spotifyApp.exceptions import SpotifyAPIError
+from spotifyApp.views import SpotifyAPI
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.tiers = TwoTierCache(2, timeout=lambda value: 60)
+
+    def test_local_entries_expire_with_their_timeout(self):
+        with mock.patch('spotifyApp.cache.time.time', return_value=1000):
+            self.tiers.set('short', 'a', timeout=10)
+            self.tiers.set('long', 'b', timeout=100)
+        with mock.patch('spotifyApp.cache.time.time', return_value=1050):
+            self.assertIsNone(self.tiers.get_local('short'))
+            self.assertEqual(self.tiers.get_local('long'), 'b')
+        self.assertEqual(len(self.tiers), 1)
+
+    def test_backend_values_fill_the_local_tier(self):
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.tiers.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        cache.clear()
+        self.assertEqual(self.tiers.get_many(['a', 'b']), {'a': 1, 'b': 2})
+        self.assertEqual(self.tiers.get('b'), 2)
+
+    def test_local_tier_is_bounded(self):
+        self.tiers.set_many({'a': 1, 'b': 2, 'c': 3}, timeout=60)
+        cache.clear()
+        self.assertEqual(self.tiers.get_many(['a', 'b', 'c']), {'b': 2, 'c': 3})
+
+
+class ConditionalGetTests(SimpleTestCase):
+    """Stale response cache entries are revalidated with If-None-Match."""
+
+    url = 'https://api.spotify.com/v1/me/playlists'
+
+    def setUp(self):
+        cache.clear()
+        response_cache.tiers.local.clear()
+        self.spotify = SpotifyAPI()
+
+    def get(self, *responses, now=1000):
+        with mock.patch.object(self.spotify, '_request', side_effect=responses) as request, \
+                mock.patch('spotifyApp.cache.time.time', return_value=now):
+            result = self.spotify._cached_get('token', 'playlists', self.url, scope='listener')
+        return result, request
+
+    def revalidations(self):
+        return response_cache.stats()['endpoints']['playlists']['revalidations']
+
+    def response(self, status_code, data=None, etag=None):
+        return mock.Mock(status_code=status_code, headers={'ETag': etag} if etag else {},
+                         json=mock.Mock(return_value=data))
+
+    def test_fresh_entry_is_served_without_a_request(self):
+        self.get(self.response(200, {'items': [1]}, etag='"v1"'))
+        result, request = self.get(now=1010)
+        self.assertEqual(result, (200, {'items': [1]}))
+        request.assert_not_called()
+
+    def test_stale_entry_is_revalidated(self):
+        self.get(self.response(200, {'items': [1]}, etag='"v1"'))
+        revalidations = self.revalidations()
+        result, request = self.get(self.response(304), now=5000)
+        self.assertEqual(result, (200, {'items': [1]}))
+        self.assertEqual(request.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+        # The 304 renewed the entry's freshness
+        _, request = self.get(now=5010)
+        request.assert_not_called()
+        self.assertEqual(self.revalidations(), revalidations + 1)
+
+    def test_changed_entry_is_replaced(self):
+        self.get(self.response(200, {'items': [1]}, etag='"v1"'))
+        result, _ = self.get(self.response(200, {'items': [2]}, etag='"v2"'), now=5000)
+        self.assertEqual(result, (200, {'items': [2]}))
+        _, request = self.get(self.response(304), now=9000)
+        self.assertEqual(request.call_args.kwargs['headers']['If-None-Match'], '"v2"')
+
+    def test_errors_are_not_cached(self):
+        with self.assertRaises(SpotifyAPIError):
+            self.get(self.response(502))
+        _, request = self.get(self.response(200, {'items': []}))
+        self.assertNotIn('If-None-Match', request.call_args.kwargs['headers'])
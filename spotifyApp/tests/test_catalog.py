@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from spotifyApp.catalog import catalog_cache
+from spotifyApp.compact import catalog_version
+from spotifyApp.models import CatalogTrack, insert_catalog, latest_catalog, resolve_catalog
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.tiers.local.clear()
+        self.old = {'name': 'Song', 'popularity': 40}
+        self.new = {'name': 'Song (Remastered)', 'popularity': 70}
+        for data in (self.old, self.new):
+            insert_catalog(CatalogTrack, {'t1': data}, {'t1': catalog_version(data)})
+
+    def forget(self):
+        cache.clear()
+        catalog_cache.tiers.local.clear()
+
+    def test_pinned_snapshot_ignores_newer_data(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_catalog('track', {'t1': catalog_version(self.old)}), {'t1': self.old})
+        self.assertEqual(latest_catalog('track', ['t1']), {'t1': self.new})
+
+    def test_snapshot_is_read_from_the_table_once(self):
+        self.forget()
+        refs = {'t1': catalog_version(self.new)}
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_catalog('track', refs), {'t1': self.new})
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_catalog('track', refs), {'t1': self.new})
+
+    def test_unpinned_refs_get_the_oldest_snapshot(self):
+        self.forget()
+        self.assertEqual(resolve_catalog('track', {'t1': None}), {'t1': self.old})
+
+    def test_unknown_version_is_left_out(self):
+        self.assertEqual(resolve_catalog('track', {'t1': 'feedfacefeedface'}), {})
@@ -0,0 +1,215 @@
+import random
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from spotifyApp.exceptions import SpotifyAPIError
+from spotifyApp.fanout import FanOutResult
+from spotifyApp.models import SpotifyWrap, WrapJob
+from spotifyApp.views import SpotifyAPI
+
+
+@override_settings(
+    SPOTIFY_CIRCUIT_MIN_CALLS=4,
+    SPOTIFY_CIRCUIT_FAILURE_RATE=0.5,
+    SPOTIFY_CIRCUIT_WINDOW=30,
+    SPOTIFY_CIRCUIT_OPEN_SECONDS=10,
+    SPOTIFY_CIRCUIT_PROBES=1,
+)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('spotifyApp.circuit.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('/v1/me/top/tracks')
+
+    def call(self, failed):
+        self.breaker.record(self.breaker.before_call(), failed)
+
+    def trip(self):
+        for _ in range(4):
+            self.call(failed=True)
+
+    def half_open(self):
+        self.trip()
+        self.now += 11
+        return self.breaker.before_call()
+
+    def test_opens_once_enough_calls_fail(self):
+        self.call(failed=False)
+        self.call(failed=True)
+        self.call(failed=True)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.call(failed=True)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_too_few_calls_never_open(self):
+        for _ in range(3):
+            self.call(failed=True)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failures_outside_the_window_are_forgotten(self):
+        for _ in range(3):
+            self.call(failed=True)
+        self.now += 31
+        self.call(failed=True)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_open_circuit_fails_fast(self):
+        self.trip()
+        with self.assertRaises(SpotifyAPIError) as raised:
+            self.breaker.before_call()
+        self.assertTrue(raised.exception.unavailable)
+        self.assertEqual(raised.exception.retry_after, 10)
+        with self.assertRaises(SpotifyAPIError):
+            self.breaker.check()
+
+    def test_half_open_admits_limited_probes(self):
+        self.half_open()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        with self.assertRaises(SpotifyAPIError):
+            self.breaker.before_call()
+
+    def test_probe_success_closes(self):
+        self.breaker.record(self.half_open(), failed=False)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.call(failed=False)
+
+    def test_probe_failure_reopens(self):
+        self.breaker.record(self.half_open(), failed=True)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.times_opened, 2)
+
+    def test_probe_without_outcome_frees_its_slot(self):
+        self.breaker.record(self.half_open(), failed=None)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.record(self.breaker.before_call(), failed=False)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_stale_success_does_not_close_half_open_circuit(self):
+        slow = self.breaker.before_call()
+        probe = self.half_open()
+        self.breaker.record(slow, failed=False)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        with self.assertRaises(SpotifyAPIError):
+            self.breaker.before_call()
+        self.breaker.record(probe, failed=False)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_stale_failure_does_not_reopen(self):
+        slow = self.breaker.before_call()
+        self.breaker.record(self.half_open(), failed=False)
+        self.breaker.record(slow, failed=True)
+        self.assertEqual(self.breaker.stats()['failures'], 0)
+
+
+@override_settings(
+    SPOTIFY_CLIENT_ID='id', SPOTIFY_CLIENT_SECRET='secret', SPOTIFY_REDIRECT_URI='http://testserver/',
+    SPOTIFY_CIRCUIT_OPEN_SECONDS=0, SPOTIFY_CIRCUIT_PROBES=1, SPOTIFY_MAX_RETRIES=0,
+)
+class RequestProbeTests(SimpleTestCase):
+    """A half-open circuit's probe slot is freed however the request ends."""
+
+    def setUp(self):
+        self.spotify = SpotifyAPI()
+        self.breaker = CircuitBreaker('/v1/me')
+        self.breaker._open(0)
+        patcher = mock.patch('spotifyApp.circuit.breaker_for', return_value=self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self):
+        return self.spotify._request('GET', 'https://api.spotify.com/v1/me')
+
+    def test_rate_limiter_timeout_takes_no_probe(self):
+        error = SpotifyAPIError('throttled', status_code=429)
+        with mock.patch('spotifyApp.ratelimit.token_bucket.acquire', side_effect=error):
+            with self.assertRaises(SpotifyAPIError):
+                self.request()
+        self.assertEqual(self.breaker._probes, 0)
+
+    def test_unexpected_error_frees_probe(self):
+        with mock.patch.object(self.spotify.session, 'request', side_effect=ValueError('bad')):
+            with self.assertRaises(ValueError):
+                self.request()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertEqual(self.breaker._probes, 0)
+
+    def test_successful_probe_closes(self):
+        response = mock.Mock(status_code=200)
+        with mock.patch.object(self.spotify.session, 'request', return_value=response):
+            self.assertIs(self.request(), response)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+class OutageFallbackTests(TestCase):
+    """While Spotify is down, get_wrapped_data serves the last wrap, marked stale."""
+
+    url = '/api/spotify/wrapped/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('outage')
+        self.client.force_login(self.user)
+        self.wrap_data = Catalog(seed=4).wrap(random.Random(4))
+        for patcher in (
+            mock.patch('spotifyApp.views.get_session_access_token', return_value='token'),
+            mock.patch('spotifyApp.views.precomputed_wrap_payload', return_value=None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def stored_wrap(self):
+        wrap = SpotifyWrap.objects.create_wrap(self.user, self.wrap_data, 'Yesterday')
+        yesterday = timezone.now() - timedelta(days=1)
+        SpotifyWrap.objects.filter(pk=wrap.pk).update(date_generated=yesterday)
+        return wrap
+
+    def open_circuit(self, retry_after=30):
+        return mock.patch('spotifyApp.views.circuit.retry_after', return_value=retry_after)
+
+    def test_open_circuit_serves_the_stored_wrap_without_calling_spotify(self):
+        wrap = self.stored_wrap()
+        with self.open_circuit(), mock.patch.object(SpotifyAPI, 'fetch_concurrently') as fetch:
+            first = self.client.get(self.url).json()
+            second = self.client.get(self.url).json()
+        fetch.assert_not_called()
+        self.assertEqual((first['id'], first['stale']), (wrap.pk, True))
+        self.assertEqual(first['wrap_data'], wrap.get_wrap_data())
+        # One refresh is queued for when the circuit closes, however many requests come in
+        job = WrapJob.objects.get()
+        self.assertEqual(first['refresh']['job_id'], job.pk)
+        self.assertEqual(second['refresh']['job_id'], job.pk)
+        self.assertGreaterEqual(job.run_after, timezone.now() + timedelta(seconds=25))
+
+    def test_open_circuit_without_a_stored_wrap_is_503(self):
+        with self.open_circuit():
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_time_range_wraps_do_not_stand_in(self):
+        SpotifyWrap.objects.create_wrap(self.user, {**self.wrap_data, 'timeRange': 'short_term'}, 'Short')
+        with self.open_circuit():
+            self.assertEqual(self.client.get(self.url).status_code, 503)
+
+    def test_unavailable_fan_out_falls_back_to_the_stored_wrap(self):
+        wrap = self.stored_wrap()
+        error = SpotifyAPIError('circuit open', status_code=503, retry_after=5, unavailable=True)
+        result = FanOutResult({}, {name: error for name in self.wrap_data}, 0.1)
+        with self.open_circuit(None), mock.patch.object(SpotifyAPI, 'fetch_concurrently', return_value=result):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['id'], response.json()['stale']), (wrap.pk, True))
+
+    def test_permanent_errors_are_not_hidden(self):
+        self.stored_wrap()
+        error = SpotifyAPIError('forbidden', status_code=403)
+        result = FanOutResult({}, {name: error for name in self.wrap_data}, 0.1)
+        with self.open_circuit(None), mock.patch.object(SpotifyAPI, 'fetch_concurrently', return_value=result):
+            self.assertEqual(self.client.get(self.url).status_code, 502)
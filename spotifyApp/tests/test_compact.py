@@ -0,0 +1,77 @@
+import copy
+import random
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.catalog import catalog_cache
+from spotifyApp.compact import COMPACT_FORMAT, compact_wrap, expand_wrap, project_artist, project_track
+from spotifyApp.models import CatalogArtist, CatalogTrack, SpotifyWrap
+
+
+def projected(wrap_data):
+    """The response shape a compact wrap expands to: every item projected."""
+    expected = {}
+    for name, value in wrap_data.items():
+        if isinstance(value, dict) and 'items' in value:
+            project = project_track if name.startswith('topTracks') else project_artist
+            expected[name] = {**value, 'items': [project(item) for item in value['items']]}
+        else:
+            expected[name] = value
+    return expected
+
+
+class CompactWrapTests(SimpleTestCase):
+    def setUp(self):
+        self.wrap = Catalog(seed=3).wrap(random.Random(3))
+
+    def test_round_trip(self):
+        compact, tracks, artists = compact_wrap(self.wrap)
+        self.assertEqual(compact['format'], COMPACT_FORMAT)
+        self.assertEqual(expand_wrap(compact, tracks, artists), projected(self.wrap))
+
+    def test_extra_fields_and_empty_sections_survive(self):
+        wrap = {'topTracks': {'items': [], 'total': 0}, 'timeRange': 'short_term'}
+        compact, tracks, artists = compact_wrap(wrap)
+        self.assertEqual(compact['extra'], {'timeRange': 'short_term'})
+        self.assertEqual(expand_wrap(compact, tracks, artists), wrap)
+
+    def test_each_object_is_stored_once(self):
+        compact, tracks, _ = compact_wrap(self.wrap)
+        referenced = set(compact['sections']['topTracksRecent']['ids'])
+        referenced |= set(compact['sections']['topTracksAllTime']['ids'])
+        self.assertEqual(set(tracks), referenced)
+        self.assertEqual(set(compact['versions']['track']), referenced)
+
+
+@override_settings(SPOTIFY_WRAP_STORAGE='compact')
+class CompactStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.tiers.local.clear()
+        self.user = User.objects.create_user('compact')
+        self.wrap = Catalog(seed=5).wrap(random.Random(5))
+
+    def test_saved_wrap_reads_back(self):
+        wrap = SpotifyWrap.objects.create_wrap(self.user, self.wrap, 'Wrap')
+        self.assertEqual(wrap.storage_format, SpotifyWrap.COMPACT)
+        self.assertGreater(CatalogTrack.objects.count(), 0)
+        self.assertGreater(CatalogArtist.objects.count(), 0)
+        cache.clear()
+        catalog_cache.tiers.local.clear()
+        self.assertEqual(SpotifyWrap.objects.get(pk=wrap.pk).get_wrap_data(), projected(self.wrap))
+
+    def test_later_catalog_changes_do_not_rewrite_old_wraps(self):
+        first = SpotifyWrap.objects.create_wrap(self.user, self.wrap, 'First')
+        renamed = copy.deepcopy(self.wrap)
+        for item in renamed['topTracksRecent']['items']:
+            item['name'] += ' (Live)'
+        SpotifyWrap.objects.create_wrap(self.user, renamed, 'Second')
+        self.assertEqual(SpotifyWrap.objects.get(pk=first.pk).get_wrap_data(), projected(self.wrap))
+
+    @override_settings(SPOTIFY_WRAP_STORAGE='raw')
+    def test_raw_storage_keeps_the_response(self):
+        wrap = SpotifyWrap.objects.create_wrap(self.user, self.wrap, 'Raw')
+        self.assertEqual(SpotifyWrap.objects.get(pk=wrap.pk).get_wrap_data(), self.wrap)
@@ -0,0 +1,64 @@
+import random
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.models import SpotifyWrap
+
+
+class ConditionalWrapTests(TestCase):
+    """Wrap endpoints answer matching conditional GETs with 304."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('conditional')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.catalog = Catalog(seed=9)
+        self.wrap = SpotifyWrap.objects.create_wrap(self.user, self.catalog.wrap(random.Random(1)), 'First')
+
+    def test_detail_is_validated_by_etag_without_loading_the_wrap(self):
+        url = f'/api/spotify/wraps/{self.wrap.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_detail_is_validated_by_last_modified(self):
+        url = f'/api/spotify/wraps/{self.wrap.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_latest_changes_when_a_wrap_is_added(self):
+        url = '/api/spotify/wraps/latest/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        SpotifyWrap.objects.create_wrap(self.user, self.catalog.wrap(random.Random(2)), 'Second')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_history_changes_when_a_wrap_is_deleted(self):
+        url = '/api/spotify/wraps/'
+        second = SpotifyWrap.objects.create_wrap(self.user, self.catalog.wrap(random.Random(2)), 'Second')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Each page has its own ETag
+        self.assertEqual(self.client.get(url, {'limit': 1}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.wrap.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(second.pk, self.client.get(url).data['wraps'][0]['id'])
+
+    def test_missing_wrap_is_not_cached(self):
+        response = self.client.get('/api/spotify/wraps/999999/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
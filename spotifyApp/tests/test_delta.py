@@ -0,0 +1,67 @@
+import copy
+import random
+
+from django.test import SimpleTestCase
+
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.compact import compact_wrap
+from spotifyApp.delta import apply_delta, diff_compact
+
+
+class DeltaTests(SimpleTestCase):
+    def setUp(self):
+        self.catalog = Catalog(seed=1)
+        self.rng = random.Random(1)
+
+    def compact(self, wrap_data=None):
+        return compact_wrap(wrap_data or self.catalog.wrap(self.rng))[0]
+
+    def assertRoundTrips(self, base, compact):
+        self.assertEqual(apply_delta(base, diff_compact(base, compact)), compact)
+
+    def test_round_trip(self):
+        for _ in range(5):
+            self.assertRoundTrips(self.compact(), self.compact())
+
+    def test_unchanged_wrap_stores_no_sections(self):
+        base = self.compact()
+        delta = diff_compact(base, copy.deepcopy(base))
+        self.assertEqual(delta['sections'], {})
+        self.assertEqual(delta['versions'], {'track': {}, 'artist': {}})
+        self.assertRoundTrips(base, copy.deepcopy(base))
+
+    def test_reordered_section_copies_base_positions(self):
+        base = self.compact()
+        compact = copy.deepcopy(base)
+        compact['sections']['topTracksRecent']['ids'].reverse()
+        ops = diff_compact(base, compact)['sections']['topTracksRecent']['ops']
+        self.assertTrue(all(isinstance(op, int) for op in ops))
+        self.assertRoundTrips(base, compact)
+
+    def test_sections_and_extras_missing_from_base(self):
+        wrap_data = self.catalog.wrap(self.rng)
+        time_range = {
+            'topTracks': wrap_data['topTracksRecent'],
+            'topArtists': wrap_data['topArtistsRecent'],
+            'timeRange': 'short_term',
+        }
+        self.assertRoundTrips(self.compact(), self.compact(time_range))
+
+    def test_changed_version_is_kept(self):
+        base = self.compact()
+        compact = copy.deepcopy(base)
+        spotify_id = compact['sections']['topTracksRecent']['ids'][0]
+        compact['versions']['track'][spotify_id] = 'f' * 16
+        delta = diff_compact(base, compact)
+        self.assertEqual(delta['versions']['track'], {spotify_id: 'f' * 16})
+        self.assertRoundTrips(base, compact)
+
+    def test_legacy_wraps_without_versions(self):
+        base = self.compact()
+        compact = self.compact()
+        for legacy in (base, compact):
+            legacy['format'] = 'compact-v1'
+            del legacy['versions']
+        self.assertNotIn('versions', diff_compact(base, compact))
+        self.assertRoundTrips(base, compact)
+        self.assertRoundTrips(base, self.compact())
@@ -0,0 +1,102 @@
+import random
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from spotifyApp import duo
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.catalog import catalog_cache
+from spotifyApp.models import SpotifyWrap
+
+
+def artist(artist_id, *genres):
+    return {'id': artist_id, 'type': 'artist', 'genres': list(genres)}
+
+
+def track(track_id, *artist_ids):
+    return {'id': track_id, 'type': 'track', 'artists': [{'id': a} for a in artist_ids]}
+
+
+class CompareTests(SimpleTestCase):
+    def setUp(self):
+        self.a = duo.build_profile({
+            'topArtists': {'items': [artist('a1', 'pop', 'house'), artist('a2', 'jazz')]},
+            'topTracks': {'items': [track('t1', 'a1'), track('t2', 'a3')]},
+        })
+        self.b = duo.build_profile({
+            'topArtists': {'items': [artist('a1', 'pop'), artist('a4', 'metal')]},
+            'topTracks': {'items': [track('t1', 'a1'), track('t3', 'a4')]},
+        })
+
+    def test_profile_collects_ids_and_a_unit_genre_vector(self):
+        self.assertEqual(self.a['artists'], ['a1', 'a2', 'a3'])
+        self.assertEqual(self.a['tracks'], ['t1', 't2'])
+        self.assertAlmostEqual(sum(w * w for w in self.a['genres'].values()), 1.0, places=5)
+        # The top artist's genres outweigh the second one's
+        self.assertGreater(self.a['genres']['pop'], self.a['genres']['jazz'])
+
+    def test_identical_profiles_score_100(self):
+        self.assertEqual(duo.compare(self.a, self.a)['score'], 100)
+
+    def test_disjoint_profiles_score_0(self):
+        other = duo.build_profile({'topArtists': {'items': [artist('x', 'folk')]}})
+        result = duo.compare(self.a, other)
+        self.assertEqual((result['score'], result['shared_artists'], result['shared_genres']), (0, [], []))
+
+    def test_comparison_is_symmetric(self):
+        forward = duo.compare(self.a, self.b)
+        self.assertEqual(forward, duo.compare(self.b, self.a))
+        self.assertEqual((forward['shared_artists'], forward['shared_tracks']), (['a1'], ['t1']))
+        self.assertEqual(forward['shared_genres'], ['pop'])
+        self.assertTrue(0 < forward['score'] < 100)
+
+
+class DuoViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.tiers.local.clear()
+        catalog = Catalog(seed=11, n_artists=60, n_tracks=200)
+        self.users = {}
+        for name, seed in (('me', 1), ('close', 1), ('far', 2)):
+            user = User.objects.create_user(name)
+            wrap = SpotifyWrap.objects.create_wrap(user, catalog.wrap(random.Random(seed)), name)
+            self.users[name] = (user, wrap)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users['me'][0])
+        patcher = mock.patch('spotifyApp.views.get_session_access_token', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def share(self, name):
+        user, wrap = self.users[name]
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f'/api/spotify/wraps/{wrap.pk}/share/').data['share_token']
+
+    def test_compare_with_a_friend(self):
+        response = self.client.get(f"/api/spotify/duo/{self.share('close')}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['score'], 100)
+        self.assertEqual(response.data['friend']['username'], 'close')
+        self.assertTrue(response.data['shared_artists'])
+
+    def test_unknown_token_and_missing_own_wrap_are_404(self):
+        self.assertEqual(self.client.get('/api/spotify/duo/forged/').status_code, 404)
+        token = self.share('close')
+        self.users['me'][1].delete()
+        self.assertEqual(self.client.get(f'/api/spotify/duo/{token}/').status_code, 404)
+
+    def test_rank_orders_friends_and_reports_bad_tokens(self):
+        tokens = [self.share('far'), self.share('close'), 'forged', self.share('me')]
+        response = self.client.post('/api/spotify/duo/rank/', {'share_tokens': tokens}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['username'] for entry in response.data['friends']], ['close', 'far'])
+        self.assertGreater(response.data['friends'][0]['score'], response.data['friends'][1]['score'])
+        self.assertEqual(response.data['not_found'], ['forged'])
+
+    def test_rank_rejects_a_bad_token_list(self):
+        response = self.client.post('/api/spotify/duo/rank/', {'share_tokens': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from spotifyApp import fanout, transport
+from spotifyApp.async_api import AsyncSpotifyAPI
+from spotifyApp.circuit import CircuitBreaker
+from spotifyApp.fanout import FanOutTimeout, fan_out
+from spotifyApp.views import SpotifyAPI
+
+
+class FanOutTests(SimpleTestCase):
+    def test_partial_results_at_the_deadline(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        result = fan_out({
+            'fast': (lambda: 'done', (), {}),
+            'slow': (release.wait, (5,), {}),
+        }, timeout=0.2)
+        self.assertEqual(result.results, {'fast': 'done'})
+        self.assertIsInstance(result.errors['slow'], FanOutTimeout)
+        self.assertFalse(result.ok)
+        self.assertFalse(result.failed)
+        self.assertLess(result.elapsed, 2)
+
+    def test_failed_call_does_not_fail_the_others(self):
+        def broken():
+            raise ValueError('bad payload')
+
+        result = fan_out({'good': (lambda: 1, (), {}), 'bad': (broken, (), {})}, timeout=2)
+        self.assertEqual(result.results, {'good': 1})
+        self.assertEqual(result.error_messages(), {'bad': 'bad payload'})
+
+    def test_calls_see_the_deadline(self):
+        self.assertIsNone(fanout.remaining())
+        result = fan_out({'left': (fanout.remaining, (), {})}, timeout=2)
+        self.assertTrue(0 < result.results['left'] <= 2)
+
+    def test_nested_fan_out_keeps_the_earlier_deadline(self):
+        def nested():
+            return fan_out({'left': (fanout.remaining, (), {})}, timeout=30).results['left']
+
+        self.assertLessEqual(fan_out({'outer': (nested, (), {})}, timeout=1).results['outer'], 1)
+
+    def test_timeouts_are_capped_to_the_deadline(self):
+        self.assertEqual(transport.get_timeout(0.5), (0.5, 0.5))
+        with self.assertRaises(FanOutTimeout):
+            fanout.call_context(time.monotonic() - 1).run(fanout.time_left)
+
+
+class DeadlineRequestTests(SimpleTestCase):
+    """A call whose deadline passes while it waits for a rate-limit token never goes out."""
+
+    url = 'https://api.spotify.com/v1/me'
+
+    def setUp(self):
+        patcher = mock.patch('spotifyApp.circuit.breaker_for', return_value=CircuitBreaker('/v1/me'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.spotify = SpotifyAPI()
+
+    def test_sync_request(self):
+        context = fanout.call_context(time.monotonic() + 0.05)
+        with mock.patch('spotifyApp.ratelimit.token_bucket.acquire', side_effect=lambda _: time.sleep(0.1)), \
+                mock.patch.object(self.spotify.session, 'request') as request:
+            with self.assertRaises(FanOutTimeout):
+                context.run(self.spotify._request, 'GET', self.url)
+        request.assert_not_called()
+
+    def test_async_request(self):
+        async def slow_acquire(_):
+            await asyncio.sleep(0.1)
+
+        async def call():
+            api = AsyncSpotifyAPI(self.spotify)
+            with mock.patch.object(api.client, 'request') as request:
+                with self.assertRaises(FanOutTimeout):
+                    await api._request('GET', self.url)
+            request.assert_not_called()
+
+        context = fanout.call_context(time.monotonic() + 0.05)
+        with mock.patch('spotifyApp.ratelimit.token_bucket.aacquire', side_effect=slow_acquire):
+            context.run(asyncio.run, call())
@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from spotifyApp.models import SpotifyWrap
+
+
+class WrapHistoryTests(TestCase):
+    url = '/api/spotify/wraps/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('history')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        # Two wraps share a date, so the ID has to break the tie
+        dates = [now - timedelta(days=2), now - timedelta(days=1), now - timedelta(days=1), now]
+        self.wraps = []
+        for index, date in enumerate(dates):
+            wrap = SpotifyWrap.objects.create(user=self.user, wrap_data={}, title=f'Wrap {index}')
+            SpotifyWrap.objects.filter(pk=wrap.pk).update(date_generated=date)
+            self.wraps.append(wrap)
+        SpotifyWrap.objects.create(user=User.objects.create_user('other'), wrap_data={}, title='Other')
+
+    def pages(self, limit):
+        pages, cursor = [], None
+        while True:
+            params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append([wrap['title'] for wrap in response.data['wraps']])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_pages_walk_newest_first_without_gaps_or_repeats(self):
+        self.assertEqual(self.pages(limit=2), [['Wrap 3', 'Wrap 2'], ['Wrap 1', 'Wrap 0']])
+        self.assertEqual(self.pages(limit=3), [['Wrap 3', 'Wrap 2', 'Wrap 1'], ['Wrap 0']])
+
+    def test_cursor_is_stable_when_newer_wraps_are_added(self):
+        first = self.client.get(self.url, {'limit': 2}).data
+        SpotifyWrap.objects.create(user=self.user, wrap_data={}, title='Newer')
+        second = self.client.get(self.url, {'limit': 2, 'cursor': first['next_cursor']}).data
+        self.assertEqual([wrap['title'] for wrap in second['wraps']], ['Wrap 1', 'Wrap 0'])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': 0}, {'limit': 'ten'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
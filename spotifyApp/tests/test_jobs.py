@@ -0,0 +1,160 @@
+import random
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, TestCase, override_settings
+
+from spotifyApp import async_views, jobs
+from spotifyApp.benchmarks.payloads import Catalog
+from spotifyApp.fanout import FanOutResult
+from spotifyApp.models import SpotifyWrap, WrapJob
+from spotifyApp.views import SpotifyAPI
+
+
+class JobClaimTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('listener')
+
+    def test_enqueue_is_idempotent(self):
+        job = jobs.enqueue(self.user, WrapJob.WRAPPED)
+        self.assertEqual(jobs.enqueue(self.user, WrapJob.WRAPPED).pk, job.pk)
+        self.assertEqual(WrapJob.objects.count(), 1)
+
+    def test_job_is_claimed_once(self):
+        job = jobs.enqueue(self.user, WrapJob.WRAPPED)
+        claimed = jobs.claim_next()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (job.pk, WrapJob.RUNNING, 1))
+        self.assertIsNone(jobs.claim_next())
+
+    def test_job_is_not_claimed_before_it_is_due(self):
+        jobs.enqueue(self.user, WrapJob.WRAPPED, run_after=self.user.date_joined + timedelta(hours=1))
+        self.assertIsNone(jobs.claim_next())
+
+    @override_settings(SPOTIFY_JOB_LEASE=60)
+    def test_expired_lease_moves_claim_to_new_worker(self):
+        jobs.enqueue(self.user, WrapJob.WRAPPED)
+        first = jobs.claim_next()
+        WrapJob.objects.filter(pk=first.pk).update(started_at=first.started_at - timedelta(seconds=61))
+        first.refresh_from_db()
+        second = jobs.claim_next()
+        self.assertEqual((second.pk, second.attempts), (first.pk, 2))
+
+        wrap_data = {'topTracks': {'items': []}}
+        self.assertIsNone(jobs.complete(first, wrap_data, 'Wrap'))
+        jobs.fail(first, 'late')
+        self.assertEqual(WrapJob.objects.get().status, WrapJob.RUNNING)
+        self.assertEqual(SpotifyWrap.objects.count(), 0)
+
+        wrap = jobs.complete(second, wrap_data, 'Wrap')
+        self.assertIsNotNone(wrap)
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.wrap_id), (WrapJob.SUCCEEDED, wrap.pk))
+        self.assertIsNone(jobs.complete(second, wrap_data, 'Wrap'))
+        self.assertEqual(SpotifyWrap.objects.count(), 1)
+
+    @override_settings(SPOTIFY_JOB_MAX_ATTEMPTS=2)
+    def test_failed_attempts_retry_until_the_limit(self):
+        jobs.enqueue(self.user, WrapJob.WRAPPED)
+        self.assertTrue(jobs.fail(jobs.claim_next(), 'timeout', retry_in=0))
+        self.assertFalse(jobs.fail(jobs.claim_next(), 'timeout', retry_in=0))
+        self.assertEqual(WrapJob.objects.get().status, WrapJob.FAILED)
+        self.assertIsNone(jobs.claim_next())
+
+
+class InlineWrapTests(TestCase):
+    """Inline generation shares the job queue's one-wrap-a-day key."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('inline')
+        self.client.force_login(self.user)
+        self.wrap = Catalog(seed=7).wrap(random.Random(7))
+        patcher = mock.patch('spotifyApp.views.get_session_access_token', return_value='token')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, results, errors=None):
+        return mock.patch.object(
+            SpotifyAPI, 'fetch_concurrently', return_value=FanOutResult(results, errors or {}, 0.1)
+        )
+
+    def test_repeat_request_reuses_todays_wrap(self):
+        with self.fetch(self.wrap) as fetch:
+            first = self.client.get('/api/spotify/wrapped/', {'refresh': 1})
+            second = self.client.get('/api/spotify/wrapped/', {'refresh': 1})
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(SpotifyWrap.objects.count(), 1)
+        self.assertEqual(WrapJob.objects.get().status, WrapJob.SUCCEEDED)
+
+    def test_wrap_being_generated_elsewhere_is_reported(self):
+        jobs.enqueue(self.user, WrapJob.WRAPPED)
+        jobs.claim_next()
+        with self.fetch(self.wrap) as fetch:
+            response = self.client.get('/api/spotify/wrapped/', {'refresh': 1})
+        fetch.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], WrapJob.RUNNING)
+
+    def test_incomplete_wrap_releases_the_job(self):
+        partial = {name: section for name, section in self.wrap.items() if name != 'topArtistsAllTime'}
+        with self.fetch(partial, {'topArtistsAllTime': ValueError('bad payload')}):
+            response = self.client.get('/api/spotify/wrapped/', {'refresh': 1})
+        self.assertIsNone(response.json()['id'])
+        self.assertEqual(WrapJob.objects.get().status, WrapJob.FAILED)
+
+        with self.fetch(self.wrap):
+            self.assertIsNotNone(self.client.get('/api/spotify/wrapped/', {'refresh': 1}).json()['id'])
+        self.assertEqual(SpotifyWrap.objects.count(), 1)
+
+    def test_time_range_wrap_is_made_once_a_day(self):
+        results = {'topTracks': self.wrap['topTracksRecent'], 'topArtists': self.wrap['topArtistsRecent']}
+        with self.fetch(results) as fetch:
+            for _ in range(2):
+                response = self.client.post('/api/spotify/wrapped/create/', {'time_range': 'short_term'})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['timeRange'], 'short_term')
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(SpotifyWrap.objects.count(), 1)
+
+
+@override_settings(SPOTIFY_JOB_MAX_WAIT=0.2, SPOTIFY_JOB_STATUS_POLL_INTERVAL=0.05)
+class JobStatusTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('poller')
+        self.client.force_login(self.user)
+        self.job = jobs.enqueue(self.user, WrapJob.WRAPPED)
+
+    def test_long_poll_wait_is_capped(self):
+        started = time.monotonic()
+        response = self.client.get(f'/api/spotify/wrapped/jobs/{self.job.pk}/', {'wait': 600})
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(response.json()['status'], WrapJob.PENDING)
+
+    def test_invalid_wait(self):
+        response = self.client.get(f'/api/spotify/wrapped/jobs/{self.job.pk}/', {'wait': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_async_event_stream(self):
+        request = AsyncRequestFactory().get('/', headers={'Accept': 'text/event-stream'})
+
+        async def auser():
+            return self.user
+
+        request.auser = auser
+
+        async def events():
+            response = await async_views.get_wrap_job(request, self.job.pk)
+            received = []
+            async for event in response.streaming_content:
+                received.append(event.decode())
+                if len(received) == 1:
+                    await WrapJob.objects.filter(pk=self.job.pk).aupdate(status=WrapJob.FAILED, error='boom')
+            return received
+
+        received = async_to_sync(events)()
+        self.assertEqual([event.split('\n')[0] for event in received], ['event: status', 'event: status'])
+        self.assertIn('"status": "failed"', received[-1])
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from spotifyApp.exceptions import SpotifyAPIError
+from spotifyApp.views import SpotifyAPI
+
+
+URL = 'https://api.spotify.com/v1/me/playlists'
+
+
+class FakeExecutor:
+    """Runs each page when its result is read, and records the submissions."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, func, *args):
+        future = mock.Mock()
+        future.result.side_effect = lambda: func(*args)
+        self.futures.append(future)
+        return future
+
+
+@override_settings(SPOTIFY_PAGINATE_PREFETCH=2)
+class PaginateTests(SimpleTestCase):
+    def setUp(self):
+        self.spotify = SpotifyAPI()
+        self.executor = FakeExecutor()
+        patcher = mock.patch('spotifyApp.views.get_executor', return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pages(self, total):
+        def get_page(access_token, url, params=None):
+            if url != URL:
+                # A next link, for collections without a total
+                offset = int(url.rsplit('=', 1)[1])
+                more = offset + 1 < 3
+                return {'items': [offset], 'next': f'{URL}?offset={offset + 1}' if more else None}
+            offset = params['offset']
+            return {
+                'items': [offset], 'total': total,
+                'next': f'{URL}?offset={offset + 1}' if offset == 0 else None,
+            }
+        return mock.patch.object(self.spotify, '_get_page', side_effect=get_page)
+
+    def test_pages_are_prefetched_and_yielded_in_order(self):
+        with self.pages(total=6) as get_page:
+            items = self.spotify.paginate('token', URL, page_size=1)
+            self.assertEqual([next(items), next(items)], [0, 1])
+            # The page being read, plus a full prefetch window
+            self.assertEqual(len(self.executor.futures), 3)
+            self.assertEqual(list(items), [2, 3, 4, 5])
+        self.assertEqual([call.args[2]['offset'] for call in get_page.call_args_list], [0, 1, 2, 3, 4, 5])
+
+    def test_next_links_are_followed_without_a_total(self):
+        with self.pages(total=None):
+            self.assertEqual(list(self.spotify.paginate('token', URL, page_size=1)), [0, 1, 2])
+        self.assertEqual(self.executor.futures, [])
+
+    def test_first_page_errors_are_raised_before_iterating(self):
+        error = SpotifyAPIError('expired', status_code=401)
+        with mock.patch.object(self.spotify, '_get_page', side_effect=error):
+            with self.assertRaises(SpotifyAPIError):
+                self.spotify.paginate('token', URL)
+
+    def test_stopping_early_cancels_prefetches(self):
+        with self.pages(total=6):
+            items = self.spotify.paginate('token', URL, page_size=1)
+            next(items), next(items)
+            items.close()
+        self.assertEqual([future.cancel.called for future in self.executor.futures], [False, True, True])
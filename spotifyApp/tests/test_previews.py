@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from spotifyApp.catalog import catalog_cache
+from spotifyApp.exceptions import SpotifyAPIError
+from spotifyApp.previews import preview_cache
+from spotifyApp.views import SpotifyAPI
+
+
+def forget_previews():
+    cache.clear()
+    preview_cache.tiers.local.clear()
+    catalog_cache.tiers.local.clear()
+
+
+def track(track_id, preview_url=None, year='2019'):
+    return {
+        'id': track_id, 'type': 'track', 'name': track_id, 'preview_url': preview_url,
+        'album': {'id': f'album-{track_id}', 'name': 'Album', 'release_date': f'{year}-05-01', 'images': []},
+        'artists': [{'id': 'artist', 'name': 'Artist'}],
+    }
+
+
+@override_settings(SPOTIFY_PREVIEW_CACHE_TTL=1000, SPOTIFY_PREVIEW_NEGATIVE_TTL=10)
+class PreviewCacheTests(SimpleTestCase):
+    def setUp(self):
+        forget_previews()
+
+    def test_tracks_without_a_preview_are_cached(self):
+        preview_cache.store({'a': 'https://p/a', 'b': None})
+        self.assertEqual(preview_cache.lookup(['a', 'b', 'c']), ({'a': 'https://p/a', 'b': None}, ['c']))
+
+    def test_negative_entries_expire_locally_first(self):
+        with mock.patch('spotifyApp.cache.time.time', return_value=1000):
+            preview_cache.store({'a': 'https://p/a', 'b': None})
+        cache.clear()
+        with mock.patch('spotifyApp.cache.time.time', return_value=1100):
+            self.assertEqual(preview_cache.lookup(['a', 'b']), ({'a': 'https://p/a'}, ['b']))
+
+    def test_missing_previews_are_hydrated_once(self):
+        spotify = SpotifyAPI()
+        with mock.patch.object(spotify, 'get_tracks', return_value={'a': track('a', 'https://p/a'), 'b': None}) as get:
+            self.assertEqual(spotify.get_track_previews(['a', 'b'], 'token'), {'a': 'https://p/a', 'b': None})
+            self.assertEqual(spotify.get_track_previews(['a', 'b'], 'token'), {'a': 'https://p/a', 'b': None})
+        get.assert_called_once_with(['a', 'b'], 'token')
+
+    def test_failed_hydration_is_not_cached(self):
+        spotify = SpotifyAPI()
+        with mock.patch.object(spotify, 'get_tracks', side_effect=SpotifyAPIError('down', status_code=502)):
+            self.assertEqual(spotify.get_track_previews(['a'], 'token'), {'a': None})
+        self.assertEqual(preview_cache.lookup(['a']), ({}, ['a']))
+
+
+class GameRoundViewTests(TestCase):
+    def setUp(self):
+        forget_previews()
+        self.client.force_login(User.objects.create_user('player', password='pw'))
+        patcher = mock.patch('spotifyApp.views.get_session_access_token', return_value='token')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_asks_tracks_with_previews_first(self):
+        tracks = [track('a', 'https://p/a', '2001'), track('b', year='2005'), track('c', year='2010')]
+        hydrated = {'b': track('b', 'https://p/b', '2005'), 'c': track('c', year='2010')}
+        with mock.patch.object(SpotifyAPI, 'get_user_top_items', return_value={'items': tracks}), \
+                mock.patch.object(SpotifyAPI, 'get_tracks', return_value=hydrated) as get_tracks:
+            response = self.client.get('/api/spotify/games/round/', {'rounds': 2})
+        self.assertEqual(response.status_code, 200)
+        get_tracks.assert_called_once_with(['b', 'c'], 'token')
+        questions = response.json()['questions']
+        self.assertEqual(
+            sorted(question['track']['preview_url'] for question in questions), ['https://p/a', 'https://p/b']
+        )
+        self.assertEqual(preview_cache.lookup(['c']), ({'c': None}, []))
+
+    def test_throttled_preview_lookup_is_a_503(self):
+        error = SpotifyAPIError('throttled', status_code=429, retry_after=3)
+        with mock.patch.object(SpotifyAPI, 'get_track_preview', side_effect=error):
+            response = self.client.get('/api/spotify/tracks/a/preview/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from spotifyApp import ratelimit
+from spotifyApp.circuit import CircuitBreaker
+from spotifyApp.exceptions import SpotifyAPIError
+from spotifyApp.ratelimit import AdaptiveConcurrencyLimiter, SharedTokenBucket
+from spotifyApp.views import SpotifyAPI
+
+
+@override_settings(SPOTIFY_RATE_LIMIT_PER_SECOND=2)
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.bucket = SharedTokenBucket()
+        patcher = mock.patch('spotifyApp.ratelimit.time.time', return_value=1000.5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_budget_per_second(self):
+        self.bucket.acquire(timeout=0)
+        self.bucket.acquire(timeout=0)
+        with self.assertRaises(SpotifyAPIError) as raised:
+            self.bucket.acquire(timeout=0)
+        self.assertTrue(raised.exception.rate_limited)
+
+    def test_block_applies_to_every_worker(self):
+        self.bucket.block_for(30)
+        with self.assertRaises(SpotifyAPIError) as raised:
+            SharedTokenBucket().acquire(timeout=1)
+        self.assertEqual(raised.exception.retry_after, 30)
+
+    def test_shorter_block_does_not_shorten_a_longer_one(self):
+        self.bucket.block_for(30)
+        self.bucket.block_for(5)
+        self.assertEqual(cache.get(ratelimit.BLOCKED_UNTIL_KEY), 1030.5)
+
+
+@override_settings(SPOTIFY_CONCURRENCY_MAX=8, SPOTIFY_CONCURRENCY_MIN=1)
+class ConcurrencyLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = AdaptiveConcurrencyLimiter()
+
+    def test_limit_halves_once_per_second_and_recovers(self):
+        self.limiter.on_throttled()
+        self.limiter.on_throttled()
+        self.assertEqual(self.limiter.limit, 4)
+        self.limiter.on_success()
+        self.assertEqual(self.limiter.limit, 4.25)
+        self.assertEqual(self.limiter.stats()['throttled'], 2)
+
+    def test_full_limiter_rejects(self):
+        self.limiter.limit = 1
+        with self.limiter.slot():
+            with self.assertRaises(SpotifyAPIError):
+                with self.limiter.slot(timeout=0):
+                    pass
+        with self.limiter.slot(timeout=0):
+            self.assertEqual(self.limiter.in_flight, 1)
+
+
+class ThrottledRequestTests(SimpleTestCase):
+    url = 'https://api.spotify.com/v1/me/top/tracks'
+
+    def setUp(self):
+        self.spotify = SpotifyAPI()
+        for patcher in (
+            mock.patch('spotifyApp.circuit.breaker_for', return_value=CircuitBreaker('/v1/me/top')),
+            mock.patch('spotifyApp.ratelimit.token_bucket'),
+            mock.patch('spotifyApp.ratelimit.concurrency_limiter', AdaptiveConcurrencyLimiter()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('spotifyApp.views.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def response(self, status_code, retry_after=None):
+        return mock.Mock(status_code=status_code, headers={'Retry-After': retry_after} if retry_after else {})
+
+    def test_429_blocks_everyone_and_retries_after_the_wait(self):
+        responses = [self.response(429, '2'), self.response(200)]
+        with mock.patch.object(self.spotify.session, 'request', side_effect=responses):
+            self.assertEqual(self.spotify._request('GET', self.url).status_code, 200)
+        ratelimit.token_bucket.block_for.assert_called_once_with(2.0)
+        self.assertGreaterEqual(self.sleep.call_args.args[0], 2.0)
+        self.assertEqual(ratelimit.concurrency_limiter.throttled, 1)
+
+    def test_writes_are_not_retried(self):
+        with mock.patch.object(self.spotify.session, 'request', return_value=self.response(429)) as request:
+            self.assertEqual(self.spotify._request('POST', self.url).status_code, 429)
+        request.assert_called_once()
+        self.sleep.assert_not_called()
+
+    def test_last_429_is_raised_as_rate_limited(self):
+        with override_settings(SPOTIFY_MAX_RETRIES=1), \
+                mock.patch.object(self.spotify.session, 'request', return_value=self.response(429, '3')):
+            with self.assertRaises(SpotifyAPIError) as raised:
+                self.spotify._get_page('token', self.url)
+        self.assertTrue(raised.exception.rate_limited)
+        self.assertEqual(raised.exception.retry_after, 3)
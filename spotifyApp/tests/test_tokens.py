@@ -0,0 +1,105 @@
+import hashlib
+import time
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from spotifyApp.exceptions import SpotifyAPIError
+from spotifyApp.fields import encrypt_json
+from spotifyApp.tokens import TokenManager, TokenRefreshError
+
+
+class TokenManagerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.spotify = mock.Mock(spec=['refresh_access_token'])
+        self.manager = TokenManager(self.spotify)
+
+    def expired(self, refresh_token='refresh'):
+        return {'access_token': 'old', 'refresh_token': refresh_token, 'expires_at': time.time() - 1}
+
+    def test_fresh_token_is_not_refreshed(self):
+        token = {'access_token': 'current', 'refresh_token': 'refresh', 'expires_at': time.time() + 3600}
+        self.assertEqual(self.manager.ensure_fresh(token), token)
+        self.spotify.refresh_access_token.assert_not_called()
+
+    def test_refresh_keeps_refresh_token_unless_rotated(self):
+        self.spotify.refresh_access_token.return_value = {'access_token': 'new', 'expires_in': 3600}
+        fresh = self.manager.ensure_fresh(self.expired())
+        self.assertEqual((fresh['access_token'], fresh['refresh_token']), ('new', 'refresh'))
+        self.assertGreater(fresh['expires_at'], time.time() + 3000)
+
+        self.spotify.refresh_access_token.return_value = {'access_token': 'newer', 'refresh_token': 'rotated'}
+        self.assertEqual(self.manager.ensure_fresh(self.expired('other'))['refresh_token'], 'rotated')
+
+    def test_published_token_is_reused_and_encrypted(self):
+        self.spotify.refresh_access_token.return_value = {'access_token': 'new', 'refresh_token': 'rotated'}
+        self.manager.ensure_fresh(self.expired())
+        other = TokenManager(mock.Mock(spec=['refresh_access_token']))
+        self.assertEqual(other.ensure_fresh(self.expired())['access_token'], 'new')
+        other.spotify.refresh_access_token.assert_not_called()
+        published = cache.get(f"spotify:token:refreshed:{hashlib.sha256(b'refresh').hexdigest()}")
+        self.assertIsInstance(published, str)
+        self.assertNotIn('rotated', published)
+
+    def test_missing_refresh_token(self):
+        token = self.expired()
+        del token['refresh_token']
+        with self.assertRaises(TokenRefreshError):
+            self.manager.ensure_fresh(token)
+
+    def test_rejected_refresh_token(self):
+        self.spotify.refresh_access_token.side_effect = SpotifyAPIError('invalid_grant', status_code=400)
+        with self.assertRaises(TokenRefreshError):
+            self.manager.ensure_fresh(self.expired())
+
+    def test_transient_failures_keep_the_refresh_token(self):
+        for error in (
+            SpotifyAPIError('bad gateway', status_code=502),
+            SpotifyAPIError('throttled', status_code=429, retry_after=1),
+            requests.ConnectionError('unreachable'),
+            requests.Timeout('timed out'),
+        ):
+            with self.subTest(error=error):
+                self.spotify.refresh_access_token.side_effect = error
+                with self.assertRaises(type(error)):
+                    self.manager.ensure_fresh(self.expired())
+
+    def test_unexpected_error_needs_reauthentication(self):
+        self.spotify.refresh_access_token.side_effect = ValueError('not JSON')
+        with self.assertRaises(TokenRefreshError):
+            self.manager.ensure_fresh(self.expired())
+
+    def test_failed_refresh_releases_the_lock(self):
+        self.spotify.refresh_access_token.side_effect = SpotifyAPIError('bad gateway', status_code=502)
+        with self.assertRaises(SpotifyAPIError):
+            self.manager.ensure_fresh(self.expired())
+        self.spotify.refresh_access_token.side_effect = None
+        self.spotify.refresh_access_token.return_value = {'access_token': 'new'}
+        with mock.patch('spotifyApp.tokens.time.sleep') as sleep:
+            self.assertEqual(self.manager.ensure_fresh(self.expired())['access_token'], 'new')
+        sleep.assert_not_called()
+
+    def test_waits_for_another_process_then_gives_up_without_refreshing(self):
+        key = hashlib.sha256(b'refresh').hexdigest()
+        cache.add(f"spotify:token:lock:{key}", 1, timeout=15)
+        clock = iter(range(0, 100, 2))
+        with mock.patch('spotifyApp.tokens.time.sleep'), \
+                mock.patch('spotifyApp.tokens.time.monotonic', side_effect=lambda: next(clock)):
+            with self.assertRaises(SpotifyAPIError) as raised:
+                self.manager.ensure_fresh(self.expired())
+        self.assertTrue(raised.exception.unavailable)
+        self.spotify.refresh_access_token.assert_not_called()
+
+    def test_waiter_picks_up_the_published_token(self):
+        key = hashlib.sha256(b'refresh').hexdigest()
+        cache.add(f"spotify:token:lock:{key}", 1, timeout=15)
+
+        def publish(_):
+            cache.set(f"spotify:token:refreshed:{key}", encrypt_json({'access_token': 'theirs'}), 60)
+
+        with mock.patch('spotifyApp.tokens.time.sleep', side_effect=publish):
+            self.assertEqual(self.manager.ensure_fresh(self.expired())['access_token'], 'theirs')
+        self.spotify.refresh_access_token.assert_not_called()
@@ -0,0 +1,168 @@
+"""
+Access-token lifecycle management for the SpotifyWrapper project.
+
+Spotify access tokens expire after an hour. The TokenManager stamps every
+token with an absolute ``expires_at`` and refreshes it shortly before it
+runs out, using the stored refresh token.
+
+Refreshes are single-flight: concurrent requests holding the same refresh
+token share one upstream call. Within a process, followers wait on the
+leader's future. Across processes, a short cache lock elects the leader
+and the refreshed token is published in the cache, encrypted like stored
+credentials, for the others to pick up.
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from cryptography.fernet import InvalidToken
+from django.conf import settings
+from django.core.cache import cache
+
+from .exceptions import SpotifyAPIError
+from .fields import decrypt_json, encrypt_json
+
+
+class TokenRefreshError(Exception):
+    """Raised when a token cannot be refreshed and the user must re-authenticate."""
+
+
+def stamp_expiry(token_info):
+    """Returns a copy of a token response with an absolute ``expires_at`` added."""
+    token_info = dict(token_info)
+    if 'expires_at' not in token_info:
+        token_info['expires_at'] = time.time() + int(token_info.get('expires_in', 3600))
+    return token_info
+
+
+class TokenManager:
+    """
+    Keeps Spotify access tokens valid, refreshing them ahead of expiry.
+
+    Args:
+        spotify: The SpotifyAPI instance used to perform refreshes.
+    """
+
+    _inflight = {}
+    _inflight_lock = threading.Lock()
+
+    def __init__(self, spotify):
+        self.spotify = spotify
+        self.margin = getattr(settings, 'SPOTIFY_TOKEN_REFRESH_MARGIN', 300)
+
+    def needs_refresh(self, token_info):
+        """True if the token expires within the refresh margin."""
+        return stamp_expiry(token_info)['expires_at'] - self.margin <= time.time()
+
+    def ensure_fresh(self, token_info):
+        """
+        Returns a token that is valid for at least the refresh margin.
+
+        Args:
+            token_info: The stored token dict, as saved by spotify_callback.
+
+        Returns:
+            The token dict, refreshed if needed. Callers should store it back
+            when it is not the same object they passed in.
+
+        Raises:
+            TokenRefreshError: If the token is expiring and cannot be refreshed.
+            SpotifyAPIError: If Spotify failed transiently (5xx, throttled or
+                circuit open), or another process is still refreshing; the
+                refresh token is still good.
+            requests.RequestException: If Spotify could not be reached.
+        """
+        token_info = stamp_expiry(token_info)
+        if not self.needs_refresh(token_info):
+            return token_info
+        if not token_info.get('refresh_token'):
+            raise TokenRefreshError('Spotify token expired and no refresh token is available')
+        return self._refresh_single_flight(token_info)
+
+    def _refresh_single_flight(self, token_info):
+        key = hashlib.sha256(token_info['refresh_token'].encode()).hexdigest()
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result(timeout=getattr(settings, 'SPOTIFY_HTTP_READ_TIMEOUT', 10) * 2)
+
+        try:
+            future.set_result(self._refresh_shared(key, token_info))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+    def _refresh_shared(self, key, token_info):
+        """Refreshes through the cache so only one process calls Spotify."""
+        result_key = f"spotify:token:refreshed:{key}"
+        lock_key = f"spotify:token:lock:{key}"
+
+        refreshed = self._published(result_key)
+        if refreshed:
+            return refreshed
+
+        locked = cache.add(lock_key, 1, timeout=15)
+        if not locked:
+            # Another process is refreshing; wait briefly for its result
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                refreshed = self._published(result_key)
+                if refreshed:
+                    return refreshed
+            # It is slow or died; only take over once its lock has expired
+            locked = cache.add(lock_key, 1, timeout=15)
+            if not locked:
+                raise SpotifyAPIError(
+                    'Spotify token refresh is still in progress', retry_after=1, unavailable=True,
+                )
+
+        try:
+            response = self.spotify.refresh_access_token(token_info['refresh_token'])
+        except SpotifyAPIError as e:
+            # An outage says nothing about the refresh token; keep it for a retry
+            if e.transient:
+                raise
+            raise TokenRefreshError(str(e)) from e
+        except (requests.ConnectionError, requests.Timeout):
+            raise
+        except Exception as e:
+            raise TokenRefreshError(str(e)) from e
+        finally:
+            # Only the holder releases the lock, never another process's
+            if locked:
+                cache.delete(lock_key)
+
+        refreshed = stamp_expiry({
+            **token_info,
+            **response,
+            # Spotify only sometimes rotates the refresh token
+            'refresh_token': response.get('refresh_token') or token_info['refresh_token'],
+            'expires_at': time.time() + int(response.get('expires_in', 3600)),
+        })
+        cache.set(result_key, encrypt_json(refreshed), timeout=60)
+        return refreshed
+
+    @staticmethod
+    def _published(result_key):
+        """Returns the token another process published under ``result_key``, if any."""
+        cached = cache.get(result_key)
+        if cached is None:
+            return None
+        try:
+            return decrypt_json(cached)
+        except InvalidToken:
+            # Written with a key that has since been removed
+            return None
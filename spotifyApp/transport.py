@@ -0,0 +1,107 @@
+"""
+Pooled HTTP transport for the SpotifyWrapper project.
+
+All SpotifyAPI instances share one ``requests.Session`` per process, so
+upstream calls reuse keep-alive connections to api.spotify.com and
+accounts.spotify.com instead of paying a TCP+TLS handshake each time.
+The connection pools count how often a checkout found a live connection
+(hit) versus having to open a new one (miss), which is what we size
+``SPOTIFY_HTTP_POOL_MAXSIZE`` against.
+"""
+
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+_session = None
+_session_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _record_checkout(conn):
+    """Counts a connection checkout as a hit if it is already connected."""
+    key = 'hits' if getattr(conn, 'sock', None) is not None else 'misses'
+    with _stats_lock:
+        _stats[key] += 1
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool that records pool hits and misses."""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        _record_checkout(conn)
+        return conn
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool that records pool hits and misses."""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        _record_checkout(conn)
+        return conn
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pool manager builds counting connection pools."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+
+def get_session():
+    """
+    Returns the process-wide Spotify session, creating it on first use.
+
+    Pool sizes come from ``settings.SPOTIFY_HTTP_POOL_CONNECTIONS`` (number of
+    hosts kept) and ``settings.SPOTIFY_HTTP_POOL_MAXSIZE`` (connections kept
+    per host).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                adapter = PooledHTTPAdapter(
+                    pool_connections=getattr(settings, 'SPOTIFY_HTTP_POOL_CONNECTIONS', 4),
+                    pool_maxsize=getattr(settings, 'SPOTIFY_HTTP_POOL_MAXSIZE', 16),
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_timeout(remaining=None):
+    """
+    Returns the (connect, read) timeout tuple for upstream calls.
+
+    Args:
+        remaining: Seconds left before the caller's deadline, if it has one
+            (see spotifyApp.fanout.remaining). Both timeouts are capped to it.
+    """
+    connect = getattr(settings, 'SPOTIFY_HTTP_CONNECT_TIMEOUT', 3.05)
+    read = getattr(settings, 'SPOTIFY_HTTP_READ_TIMEOUT', 10)
+    if remaining is not None:
+        connect, read = min(connect, remaining), min(read, remaining)
+    return connect, read
+
+
+def stats():
+    """Returns a snapshot of the connection pool hit/miss counters."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    total = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_ratio'] = snapshot['hits'] / total if total else None
+    return snapshot
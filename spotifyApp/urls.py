@@ -1,17 +1,32 @@
-
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'spotify'
 
+# Views that wait on Spotify; served natively async under ASGI when enabled
+if getattr(settings, 'SPOTIFY_ASYNC_VIEWS', False):
+    from . import async_views as spotify_views
+else:
+    spotify_views = views
+
 urlpatterns = [
-    path('playlists/', views.get_playlists, name='playlists'),
+    path('playlists/', spotify_views.get_playlists, name='playlists'),
     path('auth/', views.spotify_auth, name='spotify_auth'),
-    path('callback/', views.spotify_callback, name='spotify_callback'),
-    path('wrapped/', views.get_wrapped_data, name='wrapped'),
+    path('callback/', spotify_views.spotify_callback, name='spotify_callback'),
+    path('wrapped/', spotify_views.get_wrapped_data, name='wrapped'),
     path('wraps/', views.get_wrap_history, name='wrap-history'),
     path('wraps/<int:wrap_id>/', views.get_wrap_detail, name='wrap-detail'),
     path('wraps/latest/', views.get_latest_wrap, name='latest-wrap'),
+    path('wraps/export/', views.export_wraps, name='wrap-export'),
     path('wraps/<int:wrap_id>/delete/', views.delete_wrap, name='delete-wrap'),
+    path('wraps/<int:wrap_id>/share/', views.get_wrap_share, name='wrap-share'),
     path('wrapped/create/', views.create_wrapped_data, name='create-wrapped'),
+    path('wrapped/jobs/<int:job_id>/', spotify_views.get_wrap_job, name='wrap-job'),
+    path('duo/rank/', views.rank_duo_compatibility, name='duo-rank'),
+    path('duo/<str:share_token>/', views.get_duo_compatibility, name='duo-compatibility'),
+    path('tracks/<str:track_id>/preview/', spotify_views.get_track_preview, name='track-preview'),
+    path('games/round/', spotify_views.get_game_round, name='game-round'),
+    path('stats/', views.get_spotify_stats, name='spotify-stats'),
+    path('metrics/', views.get_metrics, name='metrics'),
 ]
@@ -5,41 +5,255 @@ This module contains API views for interacting with the Spotify API and managing
 SpotifyWrap data, including authentication, fetching playlists, and managing user-generated wraps.
 """
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import BasePermission, IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework import status
 from django.conf import settings
-import requests
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, quote_etag
+from django.utils import timezone
+from functools import wraps
 import base64
+import binascii
+import math
+import hashlib
+import hmac
 import json
+import logging
+import time
+import requests
 from urllib.parse import urlencode
-from datetime import datetime
-from .models import SpotifyWrap
+from datetime import datetime, timedelta
+from . import circuit, duo, export, fanout, games, jobs, metrics, ratelimit, transport
+from .cache import response_cache
+from .catalog import catalog_cache, project_items
+from .exceptions import SpotifyAPIError
+from .fanout import fan_out, get_executor
+from .analytics import ANALYTICS_VERSION
+from .models import SpotifyCredential, SpotifyWrap, WrapJob, latest_catalog
+from .previews import known_previews, preview_cache
+from .renderers import (
+    CSVRenderer, NDJSONRenderer, PrometheusRenderer, RawJSON, dumps
+)
+from .tokens import TokenManager, TokenRefreshError, stamp_expiry
+
+
+logger = logging.getLogger(__name__)
+
+# Sections of a wrap, mapped to the (item_type, time_range) they are built from
+WRAPPED_SECTIONS = {
+    'topTracksRecent': ('tracks', 'short_term'),
+    'topTracksAllTime': ('tracks', 'long_term'),
+    'topArtistsRecent': ('artists', 'short_term'),
+    'topArtistsAllTime': ('artists', 'long_term'),
+}
+
+# Wrap history page sizes
+WRAP_HISTORY_PAGE_SIZE = 50
+WRAP_HISTORY_MAX_PAGE_SIZE = 200
+
+# Most IDs Spotify accepts per multi-ID tracks or artists request
+TRACKS_BATCH_SIZE = 50
 
 
 class SpotifyAPI:
     """
     A helper class for interacting with the Spotify API.
     
+    All instances share a pooled keep-alive session (see spotifyApp.transport).
+    Profile, top-item and playlist lookups go through the response cache
+    (see spotifyApp.cache) and are revalidated with ETags once stale. Track
+    preview URLs go through the shared preview cache (see spotifyApp.previews).
+    Tracks and artists seen in top items or fetched by ID fill the shared
+    catalog cache (see spotifyApp.catalog).
+
     Methods:
         get_auth_url: Generates the Spotify authorization URL.
         get_access_token: Exchanges authorization code for access tokens.
+        refresh_access_token: Exchanges a refresh token for a new access token.
         get_playlists: Fetches the user's playlists.
         get_headers: Generates headers for authenticated Spotify API requests.
         get_user_top_items: Retrieves top tracks or artists for the user.
         get_recently_played: Fetches recently played tracks.
         get_user_profile: Retrieves the user's profile information.
         get_user_playlists: Fetches user's playlists with a limit.
+        get_tracks: Fetches full track objects in batches of 50.
+        get_catalog: Resolves projected tracks or artists through the shared catalog.
+        hydrate_catalog: Fetches projected tracks or artists from Spotify in batches of 50.
+        get_track_previews: Resolves preview URLs through the shared preview cache.
         get_track_preview: Fetches the preview URL for a specific track.
+        fetch_concurrently: Runs several of the above calls in parallel.
+        paginate: Iterates over every item of a paged Spotify collection.
     """
     def __init__(self):
         self.client_id = settings.SPOTIFY_CLIENT_ID
         self.client_secret = settings.SPOTIFY_CLIENT_SECRET
         self.redirect_uri = settings.SPOTIFY_REDIRECT_URI
-        self.base_url = 'https://api.spotify.com/v1'
-        self.auth_url = 'https://accounts.spotify.com/authorize'
-        self.token_url = 'https://accounts.spotify.com/api/token'
+        self.base_url = getattr(settings, 'SPOTIFY_API_BASE_URL', 'https://api.spotify.com/v1')
+        accounts_url = getattr(settings, 'SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com')
+        self.auth_url = f'{accounts_url}/authorize'
+        self.token_url = f'{accounts_url}/api/token'
+        self.session = transport.get_session()
+
+    def _request(self, method, url, **kwargs):
+        """
+        Sends a request over the shared pooled session with connect/read timeouts.
+
+        Every attempt takes a token from the shared rate limiter and a slot from
+        the adaptive concurrency limiter. A 429 blocks all workers for its
+        Retry-After. GETs are idempotent, so they are retried with jittered
+        backoff after a 429, a 5xx or a connection failure. Each attempt also
+        goes through the endpoint's circuit breaker (see spotifyApp.circuit),
+        which fails it at once while Spotify is down. Within a fan-out, the
+        timeouts are capped to its deadline, and a retry that could not
+        finish before it is not attempted. The call, retries included, is
+        recorded in spotifyApp.metrics.
+
+        Returns:
+            The final requests.Response, which may still be an error response.
+
+        Raises:
+            SpotifyAPIError: With ``unavailable`` set, if the circuit is open.
+            FanOutTimeout: If the fan-out deadline passed before the call.
+        """
+        retries = getattr(settings, 'SPOTIFY_MAX_RETRIES', 3) if method == 'GET' else 0
+        breaker = circuit.breaker_for(url)
+        started = time.perf_counter()
+        response = None
+
+        try:
+            for attempt in range(retries + 1):
+                retry_after = None
+                response = None
+                breaker.check()
+                ratelimit.token_bucket.acquire(fanout.time_left())
+                try:
+                    with ratelimit.concurrency_limiter.slot():
+                        # Waiting for a token or a slot may have used up the deadline
+                        timeout = transport.get_timeout(fanout.time_left())
+                        # Admitted last, so only a call that goes out can hold a probe slot
+                        ticket = breaker.before_call()
+                        failed = None
+                        try:
+                            response = self.session.request(method, url, timeout=timeout, **kwargs)
+                            failed = response.status_code >= 500
+                        except (requests.ConnectionError, requests.Timeout):
+                            failed = True
+                            raise
+                        finally:
+                            breaker.record(ticket, failed)
+                except (requests.ConnectionError, requests.Timeout):
+                    delay = ratelimit.backoff_delay(attempt)
+                    if attempt == retries or fanout.out_of_time(delay):
+                        raise
+                else:
+                    if response.status_code == 429:
+                        retry_after = ratelimit.parse_retry_after(response) or 1
+                        ratelimit.token_bucket.block_for(retry_after)
+                        ratelimit.concurrency_limiter.on_throttled()
+                    elif response.status_code < 500:
+                        ratelimit.concurrency_limiter.on_success()
+                        return response
+                    delay = ratelimit.backoff_delay(attempt, retry_after)
+                    if attempt == retries or fanout.out_of_time(delay):
+                        return response
+                time.sleep(delay)
+        finally:
+            metrics.record_upstream(
+                method, url, response.status_code if response is not None else 'error',
+                time.perf_counter() - started
+            )
+
+    def _raise_for_status(self, response, label='Spotify Error'):
+        """Raises SpotifyAPIError for an unsuccessful response."""
+        if response.status_code == 429:
+            raise SpotifyAPIError(
+                'Spotify rate limit reached, try again shortly',
+                status_code=429,
+                retry_after=ratelimit.parse_retry_after(response),
+            )
+        raise SpotifyAPIError(f"{label}: {response.text}", status_code=response.status_code)
+
+    def _cache_scope(self, access_token):
+        """
+        Resolves the Spotify user ID that cache entries for a token are keyed by.
+
+        The token-to-user mapping is cached itself; on a miss the profile is
+        fetched once and stored as a cache entry, so the lookup doubles as a
+        profile prefetch. Falls back to a per-token scope if /me fails.
+        """
+        token_key = hashlib.sha256(access_token.encode()).hexdigest()
+        user_id = response_cache.get_identity(token_key)
+        if user_id:
+            return user_id
+
+        url = f'{self.base_url}/me'
+        response = self._request('GET', url, headers=self.get_headers(access_token))
+        if response.status_code != 200:
+            return f'token:{token_key}'
+
+        profile = response.json()
+        user_id = profile['id']
+        response_cache.set_identity(token_key, user_id)
+        response_cache.set(
+            'profile', response_cache.make_key(user_id, 'profile', url),
+            profile, etag=response.headers.get('ETag')
+        )
+        return user_id
+
+    def _cached_get(self, access_token, endpoint, url, params=None, scope=None):
+        """
+        Performs a GET through the response cache.
+
+        Fresh entries are returned without contacting Spotify. Stale entries
+        with an ETag are revalidated with If-None-Match. Only 200 responses
+        are cached.
+
+        Args:
+            access_token: The user's Spotify access token.
+            endpoint: Cache endpoint name, used for the TTL and statistics.
+            url: The full request URL.
+            params: Optional query parameters.
+            scope: Cache scope; defaults to the token's Spotify user.
+
+        Returns:
+            A (status_code, data) tuple, where data is the decoded JSON body.
+
+        Raises:
+            SpotifyAPIError: If Spotify answers with an unsuccessful status.
+        """
+        if scope is None:
+            scope = self._cache_scope(access_token)
+        key = response_cache.make_key(scope, endpoint, url, params)
+        entry = response_cache.get(key)
+        if entry is not None and response_cache.is_fresh(entry):
+            response_cache.record(endpoint, 'hits')
+            return 200, entry['data']
+
+        headers = self.get_headers(access_token)
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        response = self._request('GET', url, headers=headers, params=params)
+
+        if response.status_code == 304 and entry is not None:
+            response_cache.record(endpoint, 'revalidations')
+            response_cache.set(endpoint, key, entry['data'], etag=entry['etag'])
+            return 200, entry['data']
+
+        if response.status_code == 200:
+            response_cache.record(endpoint, 'refetches' if entry is not None else 'misses')
+            data = response.json()
+            response_cache.set(endpoint, key, data, etag=response.headers.get('ETag'))
+            return 200, data
+
+        self._raise_for_status(response)
 
     def get_auth_url(self):
         """Generates the Spotify authorization URL."""
@@ -61,35 +275,54 @@ class SpotifyAPI:
         }
         return f"{self.auth_url}?{urlencode(params)}"
 
-    def get_access_token(self, code):
-        """Exchanges the authorization code for an access token."""
+    def _basic_auth_headers(self):
+        """Generates the client-credential headers for the accounts token endpoint."""
         auth_header = base64.b64encode(
             f"{self.client_id}:{self.client_secret}".encode()
         ).decode()
 
-        headers = {
+        return {
             'Authorization': f'Basic {auth_header}',
             'Content-Type': 'application/x-www-form-urlencoded'
         }
 
+    def get_access_token(self, code):
+        """
+        Exchanges the authorization code for an access token.
+
+        The returned token dict is stamped with an absolute ``expires_at`` so
+        the TokenManager can refresh it ahead of expiry.
+        """
         data = {
             'grant_type': 'authorization_code',
             'code': code,
             'redirect_uri': self.redirect_uri
         }
 
-        response = requests.post(self.token_url, headers=headers, data=data)
+        response = self._request('POST', self.token_url, headers=self._basic_auth_headers(), data=data)
+        if response.status_code == 200:
+            return stamp_expiry(response.json())
+        self._raise_for_status(response, 'Token Error')
+
+    def refresh_access_token(self, refresh_token):
+        """Exchanges a refresh token for a new access token."""
+        data = {
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token,
+        }
+
+        response = self._request('POST', self.token_url, headers=self._basic_auth_headers(), data=data)
         if response.status_code == 200:
             return response.json()
-        raise Exception(f"Token Error: {response.text}")
+        self._raise_for_status(response, 'Token Refresh Error')
 
     def get_playlists(self, access_token):
         """Fetches the user's playlists."""
         headers = self.get_headers(access_token)
-        response = requests.get(f"{self.base_url}/me/playlists", headers=headers)
+        response = self._request('GET', f"{self.base_url}/me/playlists", headers=headers)
         if response.status_code == 200:
             return response.json()
-        raise Exception(f"Playlist Error: {response.text}")
+        self._raise_for_status(response, 'Playlist Error')
 
     def get_headers(self, access_token):
         """Generates headers for authenticated Spotify API requests."""
@@ -101,55 +334,850 @@ class SpotifyAPI:
     def get_user_top_items(self, access_token, item_type, time_range='medium_term', limit=20):
         """
         Retrieves the user's top tracks or artists.
+
+        The items are added to the shared catalog cache.
         
         Args:
             item_type: 'tracks' or 'artists'.
             time_range: 'short_term', 'medium_term', or 'long_term'.
             limit: Maximum number of items to fetch.
         """
-        headers = self.get_headers(access_token)
-        response = requests.get(
+        _, data = self._cached_get(
+            access_token, 'top_items',
             f'{self.base_url}/me/top/{item_type}',
-            headers=headers,
             params={'time_range': time_range, 'limit': limit}
         )
-        return response.json()
+        catalog_cache.remember(data.get('items', []))
+        return data
 
     def get_recently_played(self, access_token, limit=50):
         """Fetches recently played tracks."""
         headers = self.get_headers(access_token)
-        response = requests.get(
+        response = self._request(
+            'GET',
             f'{self.base_url}/me/player/recently-played',
             headers=headers,
             params={'limit': limit}
         )
-        return response.json()
+        if response.status_code == 200:
+            return response.json()
+        self._raise_for_status(response)
 
     def get_user_profile(self, access_token):
         """Retrieves the user's profile information."""
-        headers = self.get_headers(access_token)
-        response = requests.get(f'{self.base_url}/me', headers=headers)
-        return response.json()
+        _, data = self._cached_get(access_token, 'profile', f'{self.base_url}/me')
+        return data
 
     def get_user_playlists(self, access_token, limit=50):
         """Fetches the user's playlists with a specified limit."""
-        headers = self.get_headers(access_token)
-        response = requests.get(
+        _, data = self._cached_get(
+            access_token, 'playlists',
             f'{self.base_url}/me/playlists',
-            headers=headers,
             params={'limit': limit}
         )
-        return response.json()
+        return data
+
+    def _get_batch(self, access_token, kind, spotify_ids):
+        """Fetches up to TRACKS_BATCH_SIZE tracks or artists with one multi-ID request."""
+        response = self._request(
+            'GET', f'{self.base_url}/{kind}s',
+            headers=self.get_headers(access_token),
+            params={'ids': ','.join(spotify_ids)}
+        )
+        if response.status_code == 200:
+            # Spotify answers in request order, with null for unknown IDs
+            return dict(zip(spotify_ids, response.json().get(f'{kind}s', [])))
+        self._raise_for_status(response)
+
+    def _get_many(self, access_token, kind, spotify_ids):
+        """
+        Fetches full track or artist objects in concurrent batches, and adds
+        them to the shared catalog cache. See get_tracks.
+        """
+        spotify_ids = list(dict.fromkeys(spotify_ids))
+        if not spotify_ids:
+            return {}
+        result = self.fetch_concurrently({
+            index: ('_get_batch', access_token, kind, spotify_ids[index:index + TRACKS_BATCH_SIZE])
+            for index in range(0, len(spotify_ids), TRACKS_BATCH_SIZE)
+        })
+        if result.failed:
+            raise next(iter(result.errors.values()))
+        objects = {spotify_id: obj for batch in result.results.values() for spotify_id, obj in batch.items()}
+        catalog_cache.remember(obj for obj in objects.values() if obj)
+        return objects
+
+    def get_tracks(self, track_ids, access_token):
+        """
+        Fetches full track objects in batches over the multi-ID tracks endpoint.
+
+        Batches run concurrently on the shared worker pool. A failed batch
+        only leaves its tracks out of the result.
+
+        Args:
+            track_ids: Spotify track IDs; duplicates are fetched once.
+            access_token: The user's Spotify access token.
+
+        Returns:
+            A dict mapping track ID to track object, or to None for IDs Spotify
+            does not know. IDs of failed batches are left out.
+
+        Raises:
+            SpotifyAPIError: If every batch failed.
+        """
+        return self._get_many(access_token, 'track', track_ids)
+
+    def hydrate_catalog(self, kind, spotify_ids, access_token):
+        """
+        Fetches tracks or artists from Spotify's multi-ID endpoints, in
+        batches of 50, for IDs the shared catalog does not know.
+
+        Args:
+            kind: 'track' or 'artist'.
+            spotify_ids: The Spotify IDs to fetch.
+            access_token: The user's Spotify access token.
+
+        Returns:
+            A dict mapping Spotify ID to projected object. Unknown IDs, and
+            those of failed batches, are left out.
+        """
+        try:
+            objects = self._get_many(access_token, kind, spotify_ids)
+        except SpotifyAPIError:
+            return {}
+        return project_items(obj for obj in objects.values() if obj)[kind]
+
+    def get_catalog(self, kind, spotify_ids, access_token):
+        """
+        Resolves current projected tracks or artists by Spotify ID: from the
+        shared catalog cache and tables (see latest_catalog), then from
+        Spotify for the rest.
+
+        Returns:
+            A dict mapping Spotify ID to projected object; IDs that could
+            not be resolved are left out.
+        """
+        found = latest_catalog(kind, spotify_ids)
+        missing = [spotify_id for spotify_id in dict.fromkeys(spotify_ids) if spotify_id not in found]
+        if missing:
+            found.update(self.hydrate_catalog(kind, missing, access_token))
+        return found
+
+    def get_track_previews(self, track_ids, access_token):
+        """
+        Resolves preview URLs through the shared preview cache (see
+        spotifyApp.previews), then the preview URLs of tracks in the shared
+        catalog cache, hydrating the rest with get_tracks.
+
+        Returns:
+            A dict mapping each track ID to its preview URL, or None when
+            Spotify has none or could not be reached.
+        """
+        found, missing = preview_cache.lookup(track_ids)
+        if missing:
+            known = known_previews(catalog_cache.lookup('track', missing)[0].values())
+            if known:
+                preview_cache.store(known)
+                found.update(known)
+                missing = [track_id for track_id in missing if track_id not in known]
+        if missing:
+            try:
+                tracks = self.get_tracks(missing, access_token)
+            except SpotifyAPIError:
+                tracks = None
+            if tracks is not None:
+                # Tracks of failed batches stay uncached, to be retried next time
+                hydrated = {
+                    track_id: (track or {}).get('preview_url') for track_id, track in tracks.items()
+                }
+                preview_cache.store(hydrated)
+                found.update(hydrated)
+        return {track_id: found.get(track_id) for track_id in track_ids}
 
     def get_track_preview(self, track_id, access_token):
         """Fetches the preview URL for a specific track."""
-        headers = self.get_headers(access_token)
-        response = requests.get(f'{self.base_url}/tracks/{track_id}', headers=headers)
+        return self.get_track_previews([track_id], access_token)[track_id]
+
+    def fetch_concurrently(self, calls, timeout=None):
+        """
+        Runs several SpotifyAPI calls in parallel on the shared worker pool.
+
+        Args:
+            calls: Mapping of result name to a tuple of the method name followed
+                by its positional arguments, e.g.
+                ``{'recent': ('get_user_top_items', token, 'tracks', 'short_term')}``.
+            timeout: Overall deadline in seconds; defaults to
+                ``settings.SPOTIFY_FANOUT_TIMEOUT``.
+
+        Returns:
+            A FanOutResult holding per-name results and errors.
+        """
+        return fan_out(
+            {
+                name: (getattr(self, method), args, {})
+                for name, (method, *args) in calls.items()
+            },
+            timeout=timeout,
+        )
+
+    def _get_page(self, access_token, url, params=None):
+        """Fetches one page of a paged collection."""
+        response = self._request('GET', url, headers=self.get_headers(access_token), params=params)
         if response.status_code == 200:
-            track_data = response.json()
-            return track_data.get('preview_url')
+            return response.json()
+        self._raise_for_status(response)
+
+    def paginate(self, access_token, url, params=None, page_size=50):
+        """
+        Iterates over every item of a paged Spotify collection.
+
+        The first page is fetched eagerly so errors such as an expired token
+        surface before iteration starts. When the first page reports ``total``,
+        later pages are fetched by offset in parallel, at most
+        ``settings.SPOTIFY_PAGINATE_PREFETCH`` ahead, and still yielded in
+        order. Otherwise the ``next`` links are followed one by one.
+
+        Must not be called from a fan-out worker, since it waits on the same pool.
+
+        Args:
+            access_token: The user's Spotify access token.
+            url: The collection URL, e.g. ``f'{self.base_url}/me/playlists'``.
+            params: Extra query parameters for every page.
+            page_size: Items per page (Spotify allows up to 50).
+
+        Returns:
+            A generator of collection items.
+        """
+        params = {**(params or {}), 'limit': page_size}
+        first = self._get_page(access_token, url, {**params, 'offset': 0})
+        return self._iter_pages(access_token, url, params, first)
+
+    def _iter_pages(self, access_token, url, params, first):
+        yield from first.get('items', [])
+        if not first.get('next'):
+            return
+
+        total = first.get('total')
+        if total is None:
+            page = first
+            while page.get('next'):
+                page = self._get_page(access_token, page['next'])
+                yield from page.get('items', [])
+            return
+
+        executor = get_executor()
+        window = getattr(settings, 'SPOTIFY_PAGINATE_PREFETCH', 4)
+        offsets = list(range(params['limit'], total, params['limit']))
+        pending = []
+        try:
+            for offset in offsets:
+                pending.append(executor.submit(
+                    self._get_page, access_token, url, {**params, 'offset': offset}
+                ))
+                if len(pending) > window:
+                    yield from pending.pop(0).result().get('items', [])
+            while pending:
+                yield from pending.pop(0).result().get('items', [])
+        finally:
+            # A page failed or the caller stopped early; drop prefetches not yet started
+            for future in pending:
+                future.cancel()
+
+
+def latest_wraps(user_ids):
+    """
+    Returns each user's latest wrap, in one query, loading only the
+    columns needed for Duo comparisons.
+
+    Returns:
+        A mapping of user ID to SpotifyWrap.
+    """
+    latest = (
+        SpotifyWrap.objects.filter(user=OuterRef('user'))
+        .order_by('-date_generated', '-id')
+        .values('id')[:1]
+    )
+    wraps = (
+        SpotifyWrap.objects
+        .filter(user_id__in=user_ids, id=Subquery(latest))
+        .select_related('user')
+        .only('id', 'user_id', 'profile', 'user__username')
+    )
+    return {wrap.user_id: wrap for wrap in wraps}
+
+
+DUO_SHARE_SALT = 'spotifyApp.duo.share'
+
+
+def share_token(wrap):
+    """
+    Returns the token that lets other users compare against ``wrap``'s owner.
+
+    It is the wrap ID signed with SECRET_KEY, so it cannot be guessed from
+    a wrap ID. Deleting the wrap revokes it.
+    """
+    return signing.dumps(wrap.pk, salt=DUO_SHARE_SALT)
+
+
+def shared_wrap_owners(tokens):
+    """
+    Resolves share tokens to the users who shared them.
+
+    Returns:
+        A mapping of token to user ID, for the valid tokens whose wrap
+        still exists.
+    """
+    wrap_ids = {}
+    for token in tokens:
+        try:
+            wrap_ids[token] = signing.loads(token, salt=DUO_SHARE_SALT)
+        except signing.BadSignature:
+            continue
+    owners = dict(
+        SpotifyWrap.objects.filter(id__in=wrap_ids.values()).values_list('id', 'user_id')
+    )
+    return {token: owners[wrap_id] for token, wrap_id in wrap_ids.items() if wrap_id in owners}
+
+
+def compare_wraps(wrap, others):
+    """
+    Compares one wrap against several others, with results cached per pair.
+
+    Saved wraps never change, so a pair's result is cached for
+    ``settings.SPOTIFY_DUO_CACHE_TTL`` seconds, under a key that does not
+    depend on which side asked.
+
+    Returns:
+        A mapping of other wrap ID to the duo.compare result.
+    """
+    keys = {
+        other.pk: 'spotify:duo:{}:{}'.format(*sorted((wrap.pk, other.pk)))
+        for other in others
+    }
+    cached = cache.get_many(list(keys.values()))
+    results = {}
+    missing = {}
+    for other in others:
+        result = cached.get(keys[other.pk])
+        if result is None:
+            result = duo.compare(wrap.get_profile(), other.get_profile())
+            missing[keys[other.pk]] = result
+        results[other.pk] = result
+    if missing:
+        cache.set_many(missing, timeout=getattr(settings, 'SPOTIFY_DUO_CACHE_TTL', 7 * 24 * 60 * 60))
+    return results
+
+
+def resolve_catalog_for(request, wanted):
+    """
+    Resolves the current tracks and artists a view needs through the shared
+    catalog (see latest_catalog). IDs it does not know are fetched from
+    Spotify, if the user has a usable token.
+
+    Args:
+        request: The HTTP request, for the user's Spotify token.
+        wanted: A mapping of kind ('track' or 'artist') to Spotify IDs.
+
+    Returns:
+        A mapping of kind to a dict of Spotify ID to projected object.
+    """
+    catalog = {kind: latest_catalog(kind, spotify_ids) for kind, spotify_ids in wanted.items()}
+    missing = {
+        kind: [spotify_id for spotify_id in spotify_ids if spotify_id not in catalog[kind]]
+        for kind, spotify_ids in wanted.items()
+    }
+    if any(missing.values()):
+        spotify = SpotifyAPI()
+        try:
+            access_token = get_session_access_token(request, spotify)
+        except (SpotifyAPIError, requests.RequestException):
+            access_token = None
+        if access_token:
+            for kind, spotify_ids in missing.items():
+                if spotify_ids:
+                    catalog[kind].update(spotify.hydrate_catalog(kind, spotify_ids, access_token))
+    return catalog
+
+
+def catalog_summaries(objects, spotify_ids):
+    """Returns ``{'id', 'name', 'image'}`` for each ID, from resolved catalog objects."""
+    summaries = []
+    for spotify_id in spotify_ids:
+        data = objects.get(spotify_id, {})
+        images = data.get('images') or (data.get('album') or {}).get('images') or []
+        summaries.append({
+            'id': spotify_id,
+            'name': data.get('name'),
+            'image': images[0]['url'] if images else None,
+        })
+    return summaries
+
+
+def conditional(get_validators):
+    """
+    Answers conditional GETs before the view runs, like Django's
+    ``condition`` decorator, with both validators from one lookup.
+
+    ``get_validators(request, *args, **kwargs)`` returns an (etag,
+    last_modified) pair; either may be None. Matching If-None-Match or
+    If-Modified-Since requests get a 304 without calling the view.
+    Successful responses get the ETag and Last-Modified headers. Both kinds
+    are marked ``private, no-cache``, so browsers keep the body but always
+    revalidate it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = get_validators(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+            last_modified = int(last_modified.timestamp()) if last_modified else None
+            response = None
+            if etag or last_modified:
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if not 200 <= response.status_code < 300:
+                    return response
+            if etag:
+                response.headers.setdefault('ETag', etag)
+            if last_modified:
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return inner
+    return decorator
+
+
+def wrap_etag(content_hash):
+    """ETag of a wrap response: its content hash plus the analytics version it carries."""
+    return f'{content_hash}.{ANALYTICS_VERSION}' if content_hash else None
+
+
+def wrap_validators(request, wrap_id):
+    """Validators of wraps/<id>/, looked up without loading wrap_data."""
+    row = (
+        SpotifyWrap.objects.filter(id=wrap_id, user=request.user)
+        .values('content_hash', 'date_generated').first()
+    )
+    if row is None:
+        return None, None
+    return wrap_etag(row['content_hash']), row['date_generated']
+
+
+def latest_wrap_validators(request):
+    """Validators of wraps/latest/, looked up on the (user, date) index."""
+    row = (
+        SpotifyWrap.objects.filter(user=request.user)
+        .order_by('-date_generated', '-id')
+        .values('content_hash', 'date_generated').first()
+    )
+    if row is None:
+        return None, None
+    return wrap_etag(row['content_hash']), row['date_generated']
+
+
+def wrap_history_validators(request):
+    """
+    Collection ETag of wraps/: changes whenever a wrap is added or deleted.
+
+    Wraps are never edited, so the count and newest ID of the user's wraps,
+    with the page parameters, identify the page. No Last-Modified is sent,
+    since a deletion does not move the newest date.
+    """
+    state = SpotifyWrap.objects.filter(user=request.user).aggregate(count=Count('id'), newest=Max('id'))
+    key = json.dumps([
+        state['count'], state['newest'],
+        request.query_params.get('cursor'), request.query_params.get('limit'),
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()[:32], None
+
+
+def serialized_wrap(wrap):
+    """
+    Returns a wrap's data in the response shape as serialized JSON.
+
+    Raw wraps loaded with ``SpotifyWrap.objects.with_wrap_json()`` pass
+    their stored JSON text through without decoding it. Compact and delta
+    wraps are expanded and serialized once, then served from the cache,
+    since a saved wrap never changes.
+
+    Returns:
+        The serialized wrap data as RawJSON.
+    """
+    wrap_json = getattr(wrap, 'wrap_json', None)
+    if wrap.storage_format == SpotifyWrap.RAW and wrap_json is not None:
+        return RawJSON(wrap_json.encode())
+
+    cache_key = f"spotify:wrap:json:{wrap.pk}"
+    data = cache.get(cache_key)
+    if data is None:
+        if wrap_json is not None and 'wrap_data' in wrap.get_deferred_fields():
+            wrap.wrap_data = json.loads(wrap_json)
+        data = dumps(wrap.get_wrap_data())
+        cache.set(
+            cache_key, data,
+            timeout=getattr(settings, 'SPOTIFY_WRAP_RECONSTRUCTED_CACHE_TTL', 24 * 60 * 60)
+        )
+    return RawJSON(data)
+
+
+def wrap_response(request, wrap):
+    """
+    Builds the wrap detail response: the wrap's sections plus its analytics.
+
+    With a renderer that accepts RawJSON (see spotifyApp.renderers), the
+    serialized wrap is sent as is; otherwise it is decoded and rendered as
+    usual.
+    """
+    body = serialized_wrap(wrap)
+    if not wrap.content_hash:
+        wrap.get_content_hash(json.loads(body))
+    if getattr(request.accepted_renderer, 'accepts_raw_json', False):
+        return Response(body.merge({'analytics': wrap.get_analytics()}))
+    wrap_data = json.loads(body)
+    return Response({**wrap_data, 'analytics': wrap.get_analytics(wrap_data)})
+
+
+def spotify_error_response(error, extra=None):
+    """
+    Builds the response for a failed Spotify call.
+
+    Rate limiting and open circuits are reported as 503 with a Retry-After
+    header so clients back off; any other upstream failure is a 502.
+
+    Args:
+        error: The SpotifyAPIError (or other exception) raised by the call.
+        extra: Optional additional fields for the JSON body.
+    """
+    body = {'error': str(error), **(extra or {})}
+    if isinstance(error, SpotifyAPIError) and (error.rate_limited or error.unavailable):
+        response = Response(body, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if error.retry_after:
+            response['Retry-After'] = str(math.ceil(error.retry_after))
+        return response
+    return Response(body, status=status.HTTP_502_BAD_GATEWAY)
+
+
+def fanout_error(result):
+    """
+    Summarizes the failures of a fan-out as one SpotifyAPIError.
+
+    Throttled and open-circuit failures win, with the longest Retry-After,
+    so the client backs off for as long as any of the calls needs.
+    """
+    errors = list(result.errors.values())
+    throttled = [
+        e for e in errors if isinstance(e, SpotifyAPIError) and (e.rate_limited or e.unavailable)
+    ]
+    error = max(throttled, key=lambda e: e.retry_after or 0) if throttled else errors[0]
+    return SpotifyAPIError(
+        'Failed to fetch data from Spotify',
+        status_code=getattr(error, 'status_code', None),
+        retry_after=getattr(error, 'retry_after', None),
+        unavailable=getattr(error, 'unavailable', False),
+    )
+
+
+def fanout_error_response(result):
+    """Builds the response for a fan-out in which Spotify calls failed."""
+    return spotify_error_response(fanout_error(result), extra={'errors': result.error_messages()})
+
+
+def stale_or_error_response(user, error, messages=None):
+    """
+    Serves the user's last wrap, marked stale, when a wrap could not be
+    fetched from Spotify; see stale_wrap_payload. Falls back to the error
+    response if there is no stored wrap.
+
+    Args:
+        user: The user the wrap is for.
+        error: The SpotifyAPIError the fetch failed with.
+        messages: Optional per-call error messages, for the error response.
+    """
+    if error.transient:
+        payload = stale_wrap_payload(user, error.retry_after)
+        if payload is not None:
+            return Response(payload)
+    return spotify_error_response(error, extra={'errors': messages} if messages else None)
+
+
+def stream_error_element(error):
+    """
+    Returns the last element of a streamed JSON array whose items stopped
+    coming: ``{"error": <message>, "incomplete": true}``.
+
+    The status line is sent before the first item, so a failure after it
+    cannot change the status. Ending the array with this element keeps the
+    body valid JSON and lets the client tell a truncated list from a
+    complete one.
+    """
+    logger.warning('Streamed response ended early: %s', error)
+    return {'error': str(error) or error.__class__.__name__, 'incomplete': True}
+
+
+def stream_json_array(items):
+    """
+    Encodes an iterable as a JSON array, one element per chunk.
+
+    If the iterable fails, the array ends with a stream_error_element.
+    """
+    yield '['
+    index = 0
+    try:
+        for item in items:
+            yield (',' if index else '') + json.dumps(item)
+            index += 1
+    except Exception as e:
+        yield (',' if index else '') + json.dumps(stream_error_element(e))
+    yield ']'
+
+
+def encode_history_cursor(date_generated, wrap_id):
+    """Encodes a wrap's (date_generated, id) position as an opaque cursor."""
+    raw = f"{date_generated.isoformat()}|{wrap_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_history_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_history_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_part, id_part = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (UnicodeError, binascii.Error) as e:
+        raise ValueError('Malformed cursor') from e
+
+
+def get_session_access_token(request, spotify):
+    """
+    Returns a valid Spotify access token for the request's user.
+
+    Logged-in users' tokens live in their SpotifyCredential, read through its
+    cache, so this does no session or credential table I/O on the hot path.
+    A token left in the session (connected before logging in, or saved by an
+    earlier version) is moved to the credential on first use. Anonymous
+    users keep theirs in the session.
+
+    The token is refreshed ahead of expiry and written back. A token that
+    can no longer be refreshed is dropped.
+
+    Args:
+        request: The HTTP request containing the user's session.
+        spotify: The SpotifyAPI instance used for refreshes.
+
+    Returns:
+        The access token string, or None if the user must (re)connect Spotify.
+    """
+    user = request.user
+    if user.is_authenticated:
+        token_info = SpotifyCredential.load(user.pk)
+        if token_info is None and 'spotify_token' in request.session:
+            token_info = request.session.pop('spotify_token')
+            SpotifyCredential.store(user, token_info)
+    else:
+        token_info = request.session.get('spotify_token')
+    if not token_info:
         return None
 
+    try:
+        fresh = TokenManager(spotify).ensure_fresh(token_info)
+    except TokenRefreshError:
+        if user.is_authenticated:
+            SpotifyCredential.clear(user.pk)
+        else:
+            del request.session['spotify_token']
+        return None
+
+    if fresh != token_info:
+        if user.is_authenticated:
+            SpotifyCredential.store(user, fresh)
+        else:
+            request.session['spotify_token'] = fresh
+    return fresh['access_token']
+
+
+def precomputed_wrap_payload(user):
+    """
+    Returns the response body for the user's latest precomputed wrap, if one
+    was generated within ``settings.SPOTIFY_PRECOMPUTED_WRAP_MAX_AGE``.
+
+    Returns:
+        A dict shaped like the get_wrapped_data response, or None.
+    """
+    max_age = getattr(settings, 'SPOTIFY_PRECOMPUTED_WRAP_MAX_AGE', 24 * 60 * 60)
+    wrap = (
+        SpotifyWrap.objects
+        .filter(user=user, precomputed=True,
+                date_generated__gte=timezone.now() - timedelta(seconds=max_age))
+        .order_by('-date_generated', '-id')
+        .first()
+    )
+    if wrap is None:
+        return None
+    wrap_data = wrap.get_wrap_data()
+    return {'id': wrap.id, 'wrap_data': wrap_data, 'analytics': wrap.get_analytics(wrap_data)}
+
+
+def stale_wrap_payload(user, retry_after=None):
+    """
+    Returns the user's latest full wrap for serving while Spotify is down.
+
+    The body is shaped like the get_wrapped_data response, with
+    ``stale: true``, when the wrap was generated, and a refresh job queued
+    to run once Spotify is back (``retry_after`` seconds from now). If a
+    wrap job already ran today, that job is reported instead.
+
+    Returns:
+        The response body, or None if the user has no stored wrap.
+    """
+    # Time-range wraps hold a single range; only a full wrap can stand in.
+    # They are marked by timeRange, kept under 'extra' in compact and delta wraps.
+    wrap = (
+        SpotifyWrap.objects.filter(user=user)
+        .exclude(wrap_data__has_key='timeRange')
+        .exclude(wrap_data__extra__has_key='timeRange')
+        .order_by('-date_generated', '-id')
+        .first()
+    )
+    if wrap is None:
+        return None
+    wrap_data = wrap.get_wrap_data()
+    if not all(name in wrap_data for name in WRAPPED_SECTIONS):
+        return None
+
+    # Every request during an outage lands here; reuse the refresh already queued
+    job = (
+        WrapJob.objects
+        .filter(user=user, kind=WrapJob.WRAPPED, time_range='', day=timezone.localdate(),
+                status__in=(WrapJob.PENDING, WrapJob.RUNNING))
+        .first()
+    )
+    if job is None:
+        job = jobs.enqueue(
+            user, WrapJob.WRAPPED,
+            run_after=timezone.now() + timedelta(seconds=math.ceil(retry_after or 0)),
+        )
+    return {
+        'id': wrap.id,
+        'wrap_data': wrap_data,
+        'analytics': wrap.get_analytics(wrap_data),
+        'stale': True,
+        'generated_at': wrap.date_generated.isoformat(),
+        'refresh': {
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': reverse('spotify:wrap-job', args=[job.id]),
+        },
+    }
+
+
+def wants_async(request):
+    """True if the client asked for a queued job instead of an inline result."""
+    return (
+        'respond-async' in request.headers.get('Prefer', '')
+        or request.query_params.get('async') in ('1', 'true')
+    )
+
+
+def job_payload(job):
+    """
+    Serializes a WrapJob for the job endpoints.
+
+    A succeeded job includes ``result``, shaped like the response of the
+    synchronous endpoint that queued it.
+    """
+    body = {
+        'job_id': job.id,
+        'status': job.status,
+        'kind': job.kind,
+        'time_range': job.time_range or None,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat(),
+    }
+    if job.error:
+        body['error'] = job.error
+    if job.status == WrapJob.SUCCEEDED and job.wrap is not None:
+        wrap_data = job.wrap.get_wrap_data()
+        analytics = job.wrap.get_analytics(wrap_data)
+        body['result'] = (
+            {'id': job.wrap.id, 'wrap_data': wrap_data, 'analytics': analytics}
+            if job.kind == WrapJob.WRAPPED else {**wrap_data, 'analytics': analytics}
+        )
+    return body
+
+
+def enqueue_job(user, kind, time_range=''):
+    """
+    Queues a wrap job and builds the response body.
+
+    Returns:
+        A (body, status_code, status_url) tuple: 202 with the job and its
+        status URL, or 200 if today's job for the same wrap already finished.
+    """
+    job = jobs.enqueue(user, kind, time_range)
+    status_url = reverse('spotify:wrap-job', args=[job.id])
+    finished = job.status in WrapJob.FINISHED
+    return (
+        {**job_payload(job), 'status_url': status_url},
+        status.HTTP_200_OK if finished else status.HTTP_202_ACCEPTED,
+        status_url,
+    )
+
+
+def job_response(body, status_code, status_url):
+    """Builds the response for a (body, status_code, status_url) job tuple."""
+    response = Response(body, status=status_code)
+    response['Location'] = status_url
+    return response
+
+
+def enqueue_response(request, kind, time_range=''):
+    """Queues a wrap job for the request's user; see enqueue_job."""
+    return job_response(*enqueue_job(request.user, kind, time_range))
+
+
+def claim_inline_job(user, kind, time_range=''):
+    """
+    Takes today's job for a wrap that a view is about to generate inline.
+
+    Inline and queued generation share the job's idempotency key, so a
+    user gets at most one wrap per kind, time range and day however it is
+    requested. The view saves the wrap with jobs.complete, or releases the
+    job with jobs.fail if it saves nothing.
+
+    Returns:
+        A (job, existing) pair. ``job`` is the claimed job, or None when
+        the wrap is not to be generated; ``existing`` is then a
+        (body, status_code, status_url) tuple: 200 with today's wrap,
+        shaped like the inline response, or 202 with the job generating it.
+    """
+    job = jobs.enqueue(user, kind, time_range)
+    claimed = jobs.claim(job)
+    if claimed is not None:
+        return claimed, None
+    return None, job_status(job)
+
+
+def job_status(job):
+    """
+    Reports a job another worker or request holds or has finished, as a
+    (body, status_code, status_url) tuple; see claim_inline_job.
+    """
+    job = WrapJob.objects.select_related('wrap').get(pk=job.pk)
+    status_url = reverse('spotify:wrap-job', args=[job.id])
+    body = job_payload(job)
+    if 'result' in body:
+        return body['result'], status.HTTP_200_OK, status_url
+    return {**body, 'status_url': status_url}, status.HTTP_202_ACCEPTED, status_url
+
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -190,8 +1218,13 @@ def spotify_callback(request):
 
         spotify = SpotifyAPI()
         token_info = spotify.get_access_token(code)
-        request.session['spotify_token'] = token_info
+        if request.user.is_authenticated:
+            SpotifyCredential.store(request.user, token_info)
+        else:
+            request.session['spotify_token'] = token_info
         return Response({'message': 'Successfully authenticated with Spotify'})
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -200,25 +1233,37 @@ def spotify_callback(request):
 @permission_classes([IsAuthenticated])
 def get_playlists(request):
     """
-    Retrieves the user's playlists from Spotify.
+    Retrieves all of the user's playlists from Spotify.
+
+    Every page is fetched, and the playlists are streamed to the client as a
+    JSON array while later pages are still loading. Errors fetching the first
+    page are answered with an error status as usual. If a later page fails,
+    the status has already been sent, so the array ends with
+    ``{"error": <message>, "incomplete": true}`` instead (see
+    stream_error_element).
 
     Args:
         request: The HTTP request containing the user's session.
 
     Returns:
-        A JSON response with the list of playlists or an error message.
+        A streamed JSON array of playlists, or an error message.
     """
     try:
-        token_info = request.session.get('spotify_token')
-        if not token_info:
+        spotify = SpotifyAPI()
+        access_token = get_session_access_token(request, spotify)
+        if not access_token:
             return Response(
                 {'error': 'Not authenticated with Spotify'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        spotify = SpotifyAPI()
-        playlists = spotify.get_playlists(token_info['access_token'])
-        return Response(playlists['items'])
+        playlists = spotify.paginate(access_token, f'{spotify.base_url}/me/playlists')
+        return StreamingHttpResponse(
+            stream_json_array(playlists),
+            content_type='application/json'
+        )
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -229,55 +1274,96 @@ def get_wrapped_data(request):
     """
     Fetches Spotify Wrapped data, including top tracks and artists for the user.
 
+    A wrap precomputed by ``pregenerate_wraps`` is served as is when it is
+    recent enough; ``?refresh=1`` skips it. With a ``Prefer: respond-async``
+    header (or ``?async=1``) the wrap is queued for the worker instead, and
+    the response is the job to poll. Either way the wrap is saved under
+    today's job (see claim_inline_job): a repeat request the same day gets
+    the saved wrap, or the job while it is still being generated.
+
     Args:
         request: The HTTP request containing the user's session.
 
     Returns:
-        A JSON response with the wrapped data or an error message.
+        A JSON response with the wrapped data or an error message, or a 202
+        response describing the queued or running job.
     """
     try:
         spotify = SpotifyAPI()
-        token_info = request.session.get('spotify_token')
-        
-        if not token_info:
+        access_token = get_session_access_token(request, spotify)
+
+        if not access_token:
             return Response(
                 {'error': 'No Spotify token found. Please reconnect your account.'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        access_token = token_info['access_token']
+        # Serve a wrap generated ahead of time by pregenerate_wraps, unless ?refresh=1
+        if request.query_params.get('refresh') not in ('1', 'true'):
+            precomputed = precomputed_wrap_payload(request.user)
+            if precomputed is not None:
+                return Response(precomputed)
 
-        # Fetch data with error handling
-        wrapped_data = {
-            'topTracksRecent': spotify.get_user_top_items(
-                access_token, 'tracks', 'short_term', 20
-            ),
-            'topTracksAllTime': spotify.get_user_top_items(
-                access_token, 'tracks', 'long_term', 20
-            ),
-            'topArtistsRecent': spotify.get_user_top_items(
-                access_token, 'artists', 'short_term', 20
-            ),
-            'topArtistsAllTime': spotify.get_user_top_items(
-                access_token, 'artists', 'long_term', 20
-            )
-        }
+        if wants_async(request):
+            return enqueue_response(request, WrapJob.WRAPPED)
 
-        # Save to database
-        wrap = SpotifyWrap.objects.create(
-            user=request.user,
-            wrap_data=wrapped_data,
-            title=f"Wrap - {datetime.now().strftime('%Y-%m-%d')}"
+        # While Spotify's top-items circuit is open, serve the last wrap instead of waiting on it
+        retry_after = circuit.retry_after(
+            f'{spotify.base_url}/me/top/{item_type}' for item_type in ('tracks', 'artists')
         )
+        if retry_after is not None:
+            return stale_or_error_response(request.user, SpotifyAPIError(
+                'Spotify is unavailable, try again shortly',
+                status_code=503, retry_after=retry_after, unavailable=True,
+            ))
+
+        # Today's wrap is generated once, inline or by a worker
+        job, existing = claim_inline_job(request.user, WrapJob.WRAPPED)
+        if job is None:
+            return job_response(*existing)
+
+        # Fetch all sections in parallel against a single deadline
+        result = spotify.fetch_concurrently({
+            name: ('get_user_top_items', access_token, item_type, time_range, 20)
+            for name, (item_type, time_range) in WRAPPED_SECTIONS.items()
+        })
+
+        if not result.ok:
+            # Nothing is saved; hand the job back so it can be generated again
+            jobs.fail(job, str(fanout_error(result)))
+
+        if result.failed:
+            return stale_or_error_response(request.user, fanout_error(result), result.error_messages())
+
+        wrapped_data = {name: result.results.get(name) for name in WRAPPED_SECTIONS}
+
+        if not result.ok:
+            # Serve what we have, but don't persist an incomplete wrap
+            return Response({
+                'id': None,
+                'wrap_data': wrapped_data,
+                'errors': result.error_messages()
+            })
+
+        # Save to database
+        wrap = jobs.complete(job, wrapped_data, title=f"Wrap - {datetime.now().strftime('%Y-%m-%d')}")
+        if wrap is None:
+            # The claim's lease ran out and a worker took the job over
+            return job_response(*job_status(job))
 
         # Return both the data and the wrap ID
         return Response({
             'id': wrap.id,  # Include the database ID
-            'wrap_data': wrapped_data
+            'wrap_data': wrapped_data,
+            'analytics': wrap.analytics
         })
 
+    except SpotifyAPIError as e:
+        if e.transient:
+            return stale_or_error_response(request.user, e)
+        return spotify_error_response(e)
     except Exception as e:
-        print(f"Error in get_wrapped_data: {str(e)}")
+        logger.exception("Error in get_wrapped_data")
         return Response(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -286,49 +1372,88 @@ def get_wrapped_data(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional(wrap_history_validators)
 def get_wrap_history(request):
     """
-    Retrieves the user's SpotifyWrap history.
+    Retrieves one page of the user's SpotifyWrap history, newest first.
+
+    Uses keyset pagination on (date_generated, id), served by the
+    (user, -date_generated, -id) index, and loads only the listed columns.
+    Pages carry a collection ETag, and unchanged pages are answered with 304.
 
     Args:
         request: The HTTP request with the authenticated user's details.
+            Accepts optional ``cursor`` (from a previous page's
+            ``next_cursor``) and ``limit`` query parameters.
 
     Returns:
-        A JSON response containing the history of wraps or an error message.
+        A JSON response containing the page of wraps and the cursor for the
+        next page (null on the last page), or an error message.
     """
     try:
-        wraps = SpotifyWrap.objects.filter(user=request.user).order_by('-date_generated')
+        limit = min(int(request.query_params.get('limit', WRAP_HISTORY_PAGE_SIZE)), WRAP_HISTORY_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        cursor = request.query_params.get('cursor')
+        position = decode_history_cursor(cursor) if cursor else None
+    except ValueError:
+        return Response({'error': 'Invalid cursor or limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        wraps = SpotifyWrap.objects.filter(user=request.user)
+        if position:
+            date_generated, wrap_id = position
+            wraps = wraps.filter(
+                Q(date_generated__lt=date_generated) |
+                Q(date_generated=date_generated, id__lt=wrap_id)
+            )
+        rows = list(
+            wraps.order_by('-date_generated', '-id')
+            .values('id', 'date_generated', 'title')[:limit + 1]
+        )
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_history_cursor(rows[-1]['date_generated'], rows[-1]['id'])
+
         data = [{
-            'id': wrap.id,
-            'date_generated': wrap.date_generated.isoformat(),
-            'title': wrap.title
-        } for wrap in wraps]
-        return Response({'wraps': data})
+            'id': row['id'],
+            'date_generated': row['date_generated'].isoformat(),
+            'title': row['title']
+        } for row in rows]
+        return Response({'wraps': data, 'next_cursor': next_cursor})
     except Exception as e:
         return Response({'error': 'Failed to fetch wrap history'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 @api_view(['GET', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@conditional(wrap_validators)
 def get_wrap_detail(request, wrap_id):
     """
     Retrieves or deletes a specific SpotifyWrap.
 
+    GETs carry the wrap's content hash as a strong ETag and its generation
+    date as Last-Modified; matching conditional GETs get a 304 without
+    wrap_data being loaded.
+
     Args:
         request: The HTTP request with the authenticated user's details.
         wrap_id: The ID of the SpotifyWrap.
 
     Returns:
-        A JSON response containing the wrap details, or a success message for deletion.
+        A JSON response containing the wrap details with their precomputed
+        ``analytics``, or a success message for deletion.
     """
     try:
-        wrap = SpotifyWrap.objects.get(id=wrap_id, user=request.user)
+        wrap = SpotifyWrap.objects.with_wrap_json().get(id=wrap_id, user=request.user)
 
         if request.method == 'DELETE':
             wrap.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        return Response(wrap.wrap_data)
+        return wrap_response(request, wrap)
     except SpotifyWrap.DoesNotExist:
         return Response(
             {'error': 'Wrap not found or you don\'t have permission to access it'},
@@ -338,10 +1463,13 @@ def get_wrap_detail(request, wrap_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional(latest_wrap_validators)
 def get_latest_wrap(request):
     """
     Retrieves the latest SpotifyWrap for the authenticated user.
 
+    Conditional GETs are answered like get_wrap_detail's.
+
     Args:
         request: The HTTP request with the authenticated user's details.
 
@@ -349,8 +1477,14 @@ def get_latest_wrap(request):
         A JSON response containing the latest wrap or an error message.
     """
     try:
-        latest_wrap = SpotifyWrap.objects.filter(user=request.user).latest('date_generated')
-        return Response(latest_wrap.wrap_data)
+        latest_wrap = (
+            SpotifyWrap.objects.with_wrap_json().filter(user=request.user)
+            .order_by('-date_generated', '-id')
+            .first()
+        )
+        if latest_wrap is None:
+            raise SpotifyWrap.DoesNotExist
+        return wrap_response(request, latest_wrap)
     except SpotifyWrap.DoesNotExist:
         return Response({'error': 'No wrap found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -381,17 +1515,152 @@ def delete_wrap(request, wrap_id):
         return Response({'error': 'Failed to delete wrap'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_wrap_share(request, wrap_id):
+    """
+    Returns the Duo Wrapped share token for one of the user's wraps.
+
+    Args:
+        request: The HTTP request with the authenticated user's details.
+        wrap_id: The ID of the SpotifyWrap to share.
+
+    Returns:
+        A JSON response with the share token and the Duo URL a friend
+        opens with it, or an error message.
+    """
+    try:
+        wrap = SpotifyWrap.objects.only('id').get(id=wrap_id, user=request.user)
+    except SpotifyWrap.DoesNotExist:
+        return Response(
+            {'error': 'Wrap not found or you don\'t have permission to share it'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    token = share_token(wrap)
+    return Response({
+        'share_token': token,
+        'duo_url': reverse('spotify:duo-compatibility', args=[token]),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_duo_compatibility(request, share_token):
+    """
+    Compares the user's latest wrap with the latest wrap of a friend.
+
+    The friend is identified by the share token of a wrap they shared (the
+    Duo Wrapped link, see get_wrap_share), so the comparison always
+    reflects both users' current taste.
+
+    Args:
+        request: The HTTP request with the authenticated user's details.
+        share_token: The share token of a wrap shared by the friend.
+
+    Returns:
+        A JSON response with the compatibility score, the shared artists,
+        tracks and genres, or an error message.
+    """
+    friend_id = shared_wrap_owners([share_token]).get(share_token)
+    if friend_id is None:
+        return Response({'error': 'Shared wrap not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    wraps = latest_wraps([request.user.id, friend_id])
+    if request.user.id not in wraps:
+        return Response(
+            {'error': 'Generate your own wrap before comparing'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if friend_id not in wraps:
+        # The friend deleted their wraps since the lookup above
+        return Response({'error': 'Shared wrap not found'}, status=status.HTTP_404_NOT_FOUND)
+    mine = wraps[request.user.id]
+    theirs = wraps[friend_id]
+
+    result = compare_wraps(mine, [theirs])[theirs.pk]
+    catalog = resolve_catalog_for(
+        request, {'artist': result['shared_artists'], 'track': result['shared_tracks']}
+    )
+    return Response({
+        'score': result['score'],
+        'similarity': result['similarity'],
+        'you': {'username': request.user.username, 'wrap_id': mine.pk},
+        'friend': {'username': theirs.user.username, 'wrap_id': theirs.pk},
+        'shared_artists': catalog_summaries(catalog['artist'], result['shared_artists']),
+        'shared_tracks': catalog_summaries(catalog['track'], result['shared_tracks']),
+        'shared_genres': result['shared_genres'],
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def rank_duo_compatibility(request):
+    """
+    Ranks the user's compatibility with several friends in one call.
+
+    Args:
+        request: The HTTP request with ``share_tokens``, the share tokens of
+            wraps shared by friends (at most ``settings.SPOTIFY_DUO_MAX_FRIENDS``).
+
+    Returns:
+        A JSON response listing one entry per friend, best match first, and
+        the share tokens that were not valid or whose wrap was deleted.
+    """
+    tokens = request.data.get('share_tokens')
+    max_friends = getattr(settings, 'SPOTIFY_DUO_MAX_FRIENDS', 100)
+    if (not isinstance(tokens, list) or len(tokens) > max_friends
+            or not all(isinstance(token, str) for token in tokens)):
+        return Response(
+            {'error': f'share_tokens must be a list of at most {max_friends} share tokens'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    friends = shared_wrap_owners(tokens)
+    friend_ids = set(friends.values()) - {request.user.id}
+    wraps = latest_wraps([request.user.id, *friend_ids])
+    if request.user.id not in wraps:
+        return Response(
+            {'error': 'Generate your own wrap before comparing'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    mine = wraps.pop(request.user.id)
+
+    results = compare_wraps(mine, list(wraps.values()))
+    ranking = sorted((
+        {
+            'username': wrap.user.username,
+            'wrap_id': wrap.pk,
+            'score': results[wrap.pk]['score'],
+            'similarity': results[wrap.pk]['similarity'],
+            'shared_artist_count': len(results[wrap.pk]['shared_artists']),
+            'shared_track_count': len(results[wrap.pk]['shared_tracks']),
+            'shared_genres': results[wrap.pk]['shared_genres'],
+        }
+        for wrap in wraps.values()
+    ), key=lambda entry: entry['score'], reverse=True)
+
+    return Response({
+        'wrap_id': mine.pk,
+        'friends': ranking,
+        'not_found': [token for token in tokens if token not in friends],
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_wrapped_data(request):
     """
     Creates a new SpotifyWrap for the authenticated user.
 
+    Accepts ``Prefer: respond-async`` (or ``?async=1``) to queue the wrap,
+    and makes at most one wrap per time range a day, like get_wrapped_data.
+
     Args:
         request: The HTTP request containing the time range for the wrap.
 
     Returns:
-        A JSON response with the created wrap data or an error message.
+        A JSON response with the created wrap data or an error message, or a
+        202 response describing the queued or running job.
     """
     try:
         time_range = request.data.get('time_range', 'medium_term')
@@ -399,27 +1668,314 @@ def create_wrapped_data(request):
             return Response({'error': 'Invalid time range'}, status=status.HTTP_400_BAD_REQUEST)
 
         spotify = SpotifyAPI()
-        token_info = request.session.get('spotify_token')
+        access_token = get_session_access_token(request, spotify)
 
-        if not token_info:
+        if not access_token:
             return Response({'error': 'No Spotify token found'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        access_token = token_info['access_token']
-        top_tracks = spotify.get_user_top_items(access_token, 'tracks', time_range, 20)
-        top_artists = spotify.get_user_top_items(access_token, 'artists', time_range, 20)
+        if wants_async(request):
+            return enqueue_response(request, WrapJob.TIME_RANGE, time_range)
+
+        job, existing = claim_inline_job(request.user, WrapJob.TIME_RANGE, time_range)
+        if job is None:
+            return job_response(*existing)
+
+        result = spotify.fetch_concurrently({
+            'topTracks': ('get_user_top_items', access_token, 'tracks', time_range, 20),
+            'topArtists': ('get_user_top_items', access_token, 'artists', time_range, 20),
+        })
+
+        if not result.ok:
+            jobs.fail(job, str(fanout_error(result)))
+            return fanout_error_response(result)
 
         wrapped_data = {
-            'topTracks': top_tracks,
-            'topArtists': top_artists,
+            'topTracks': result.results['topTracks'],
+            'topArtists': result.results['topArtists'],
             'timeRange': time_range
         }
 
-        wrap = SpotifyWrap.objects.create(
-            user=request.user,
-            wrap_data=wrapped_data,
-            title=f"Wrap - {time_range} - {datetime.now().strftime('%Y-%m-%d')}"
+        wrap = jobs.complete(
+            job, wrapped_data, title=f"Wrap - {time_range} - {datetime.now().strftime('%Y-%m-%d')}"
         )
+        if wrap is None:
+            return job_response(*job_status(job))
 
-        return Response(wrapped_data)
+        return Response({**wrapped_data, 'analytics': wrap.analytics})
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_wrap_job(request, job_id):
+    """
+    Reports the status of a queued wrap job, with its result once it succeeds.
+
+    Supports long polling with ``?wait=<seconds>``: the response is held
+    until the job finishes or the wait runs out. Each held request ties up
+    a worker thread, so waits are capped at ``settings.SPOTIFY_JOB_MAX_WAIT``
+    and clients poll again. Server-sent events are only served by the async
+    view (see async_views.get_wrap_job), which holds no thread while waiting.
+
+    Args:
+        request: The HTTP request with the authenticated user's details.
+        job_id: The ID of the WrapJob.
+
+    Returns:
+        A JSON response with the job, or an error message.
+    """
+    try:
+        job = WrapJob.objects.select_related('wrap').get(id=job_id, user=request.user)
+    except WrapJob.DoesNotExist:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    wait, error = parse_job_wait(request.query_params)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    deadline = time.monotonic() + wait
+    interval = getattr(settings, 'SPOTIFY_JOB_STATUS_POLL_INTERVAL', 0.5)
+    while job.status not in WrapJob.FINISHED and time.monotonic() < deadline:
+        time.sleep(min(interval, max(0, deadline - time.monotonic())))
+        if WrapJob.objects.filter(pk=job.pk).values_list('status', flat=True).first() != job.status:
+            job.refresh_from_db()
+    return Response(job_payload(job))
+
+
+def parse_job_wait(params):
+    """
+    Validates the ``wait`` query parameter of the job status endpoints.
+
+    Returns:
+        A (wait, error) tuple: the seconds to hold the response, capped at
+        ``settings.SPOTIFY_JOB_MAX_WAIT``, and a message for a 400 response
+        or None.
+    """
+    try:
+        wait = float(params.get('wait', 0))
+    except ValueError:
+        return 0, 'Invalid wait'
+    return max(0, min(wait, getattr(settings, 'SPOTIFY_JOB_MAX_WAIT', 5))), None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_track_preview(request, track_id):
+    """
+    Retrieves the preview URL for a track, for the guessing game.
+
+    Args:
+        request: The HTTP request containing the user's session.
+        track_id: The Spotify ID of the track.
+
+    Returns:
+        A JSON response with the track ID and its preview URL (null when
+        Spotify has none), or an error message.
+    """
+    try:
+        spotify = SpotifyAPI()
+        access_token = get_session_access_token(request, spotify)
+        if not access_token:
+            return Response(
+                {'error': 'Not authenticated with Spotify'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        preview_url = spotify.get_track_preview(track_id, access_token)
+        return Response({'id': track_id, 'preview_url': preview_url})
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def parse_game_round_params(params):
+    """
+    Validates the query parameters of the game round endpoints.
+
+    Returns:
+        A (time_range, rounds, error) tuple, where error is a message for a
+        400 response or None.
+    """
+    time_range = params.get('time_range', 'medium_term')
+    if time_range not in ['short_term', 'medium_term', 'long_term']:
+        return None, None, 'Invalid time range'
+    max_rounds = getattr(settings, 'SPOTIFY_GAME_MAX_ROUNDS', 10)
+    try:
+        rounds = int(params.get('rounds', 3))
+    except ValueError:
+        return None, None, 'Invalid rounds'
+    if not 1 <= rounds <= max_rounds:
+        return None, None, f'rounds must be between 1 and {max_rounds}'
+    return time_range, rounds, None
+
+
+def parse_export_params(params):
+    """
+    Validates the ``since`` and ``until`` query parameters of the export endpoint.
+
+    Each is an ISO 8601 date or datetime; a date-only ``until`` includes
+    that whole day.
+
+    Returns:
+        A (since, until, error) tuple of aware datetimes or None, where error
+        is a message for a 400 response or None.
+    """
+    bounds = []
+    for name in ('since', 'until'):
+        value = params.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            moment = parse_datetime(value)
+            if moment is None:
+                day = parse_date(value)
+                if day is None:
+                    raise ValueError
+                moment = datetime.combine(day + timedelta(days=1) if name == 'until' else day, datetime.min.time())
+        except ValueError:
+            return None, None, f'Invalid {name}; expected an ISO 8601 date or datetime'
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        bounds.append(moment)
+    since, until = bounds
+    if since and until and since >= until:
+        return None, None, 'since must be before until'
+    return since, until, None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([NDJSONRenderer, CSVRenderer])
+def export_wraps(request):
+    """
+    Streams the user's whole wrap history as NDJSON or CSV.
+
+    Wraps are read and encoded a chunk at a time (see spotifyApp.export), so
+    memory use does not grow with the number of wraps. The format follows
+    the Accept header or ``?format=ndjson|csv``, NDJSON by default.
+
+    Args:
+        request: The HTTP request with the authenticated user's details.
+            Accepts optional ``since`` and ``until`` (ISO 8601 dates or
+            datetimes) to limit the export by generation date, and
+            ``gzip=1`` to have the file gzipped as it streams.
+
+    Returns:
+        A streamed file download, or an error message.
+    """
+    since, until, error = parse_export_params(request.query_params)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    renderer = request.accepted_renderer
+    chunks = export.ENCODERS[renderer.format](export.iter_wraps(request.user, since, until))
+    content_type = renderer.media_type + (f'; charset={renderer.charset}' if renderer.charset else '')
+    filename = f"wraps-{timezone.localdate().isoformat()}.{renderer.format}"
+    if request.query_params.get('gzip') in ('1', 'true'):
+        chunks = export.gzip_stream(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_game_round(request):
+    """
+    Assembles a song guessing game round from the user's top tracks.
+
+    Preview URLs come from the shared preview cache; tracks it does not
+    know are hydrated with batched multi-ID requests.
+
+    Args:
+        request: The HTTP request, with optional ``time_range`` and
+            ``rounds`` query parameters.
+
+    Returns:
+        A JSON response with the round's questions (see spotifyApp.games),
+        or an error message.
+    """
+    time_range, rounds, error = parse_game_round_params(request.query_params)
+    if error:
+        return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        spotify = SpotifyAPI()
+        access_token = get_session_access_token(request, spotify)
+        if not access_token:
+            return Response(
+                {'error': 'Not authenticated with Spotify'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        tracks = spotify.get_user_top_items(access_token, 'tracks', time_range, 50).get('items', [])
+        preview_cache.remember(tracks)
+        previews = spotify.get_track_previews([track['id'] for track in tracks], access_token)
+        return Response({
+            'time_range': time_range,
+            'questions': games.build_round(tracks, previews, rounds),
+        })
+    except SpotifyAPIError as e:
+        return spotify_error_response(e)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_spotify_stats(request):
+    """
+    Reports counters for the Spotify client internals, for capacity tuning.
+
+    Args:
+        request: The HTTP request from an admin user.
+
+    Returns:
+        A JSON response with the HTTP pool, response cache, preview cache,
+        catalog cache, rate limiter and circuit breaker statistics.
+    """
+    return Response({
+        'http_pool': transport.stats(),
+        'response_cache': response_cache.stats(),
+        'preview_cache': preview_cache.stats(),
+        'catalog_cache': catalog_cache.stats(),
+        'rate_limit': ratelimit.stats(),
+        'circuits': circuit.stats(),
+    })
+
+
+class CanReadMetrics(BasePermission):
+    """Admins, or scrapers sending ``Authorization: Bearer <settings.SPOTIFY_METRICS_TOKEN>``."""
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = getattr(settings, 'SPOTIFY_METRICS_TOKEN', '')
+        header = request.headers.get('Authorization', '')
+        return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+@api_view(['GET'])
+@permission_classes([CanReadMetrics])
+@renderer_classes([PrometheusRenderer])
+def get_metrics(request):
+    """
+    Exposes the request and Spotify call metrics in the Prometheus text format.
+
+    Covers this process only (see spotifyApp.metrics).
+
+    Args:
+        request: The HTTP request from an admin user or a metrics scraper.
+
+    Returns:
+        The metrics as text/plain.
+    """
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,140 @@
+"""
+Wrap generation worker, run by the ``run_wrap_worker`` management command.
+
+Claims queued WrapJobs (see spotifyApp.jobs) and does what the synchronous
+views do inline: refresh the user's stored token if needed (saving the
+rotated one back to their SpotifyCredential), fetch the top-item sections
+concurrently and save the wrap. An incomplete wrap is never saved.
+Rate limits, timeouts, 5xx responses and open circuits are retried with
+backoff; other failures fail the job.
+"""
+
+import logging
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import jobs, ratelimit
+from .exceptions import SpotifyAPIError
+from .models import SpotifyCredential, WrapJob
+from .tokens import TokenManager, TokenRefreshError
+from .views import SpotifyAPI, WRAPPED_SECTIONS
+
+
+logger = logging.getLogger(__name__)
+
+
+def _is_transient(error):
+    """True for failures worth retrying: throttling, timeouts and upstream 5xx."""
+    if isinstance(error, SpotifyAPIError):
+        return error.transient
+    return True
+
+
+def _fail(job, errors, message):
+    """Fails a job, queuing it again with backoff if every error was transient."""
+    if all(_is_transient(error) for error in errors):
+        retry_after = max((getattr(error, 'retry_after', None) or 0 for error in errors), default=0)
+        retry_in = ratelimit.backoff_delay(job.attempts, retry_after or None)
+        if jobs.fail(job, message, retry_in=retry_in):
+            return WrapJob.PENDING
+    else:
+        jobs.fail(job, message)
+    return WrapJob.FAILED
+
+
+def process_job(job, spotify=None):
+    """
+    Runs one claimed job to completion or failure.
+
+    Returns:
+        The job's final status as seen by this worker.
+    """
+    spotify = spotify or SpotifyAPI()
+    stored = SpotifyCredential.load(job.user_id)
+    if not stored:
+        jobs.fail(job, 'Spotify account not connected.')
+        return WrapJob.FAILED
+    try:
+        token_info = TokenManager(spotify).ensure_fresh(stored)
+    except (TokenRefreshError, KeyError):
+        SpotifyCredential.clear(job.user_id)
+        jobs.fail(job, 'Spotify token expired. Please reconnect your account.')
+        return WrapJob.FAILED
+    except Exception as e:
+        # Spotify failed transiently while refreshing; the token is still good
+        return _fail(job, [e], f'Token refresh: {e}')
+    if token_info != stored:
+        # Spotify may have rotated the refresh token, so the old one is spent
+        SpotifyCredential.store(job.user, token_info)
+    access_token = token_info['access_token']
+
+    if job.kind == WrapJob.WRAPPED:
+        calls = {
+            name: ('get_user_top_items', access_token, item_type, time_range, 20)
+            for name, (item_type, time_range) in WRAPPED_SECTIONS.items()
+        }
+        title = f"Wrap - {datetime.now().strftime('%Y-%m-%d')}"
+    else:
+        calls = {
+            'topTracks': ('get_user_top_items', access_token, 'tracks', job.time_range, 20),
+            'topArtists': ('get_user_top_items', access_token, 'artists', job.time_range, 20),
+        }
+        title = f"Wrap - {job.time_range} - {datetime.now().strftime('%Y-%m-%d')}"
+
+    result = spotify.fetch_concurrently(calls)
+    if not result.ok:
+        errors = list(result.errors.values())
+        message = '; '.join(f'{name}: {text}' for name, text in result.error_messages().items())
+        return _fail(job, errors, message)
+
+    wrap_data = {name: result.results[name] for name in calls}
+    if job.kind == WrapJob.TIME_RANGE:
+        wrap_data['timeRange'] = job.time_range
+
+    if jobs.complete(job, wrap_data, title) is None:
+        logger.warning('Lost the claim on wrap job %s before it finished', job.pk)
+        return WrapJob.RUNNING
+    return WrapJob.SUCCEEDED
+
+
+def run_worker(poll_interval=None, burst=False, max_jobs=None, stdout=None):
+    """
+    Processes jobs until stopped.
+
+    Args:
+        poll_interval: Seconds to sleep when the queue is empty. Defaults to
+            ``settings.SPOTIFY_JOB_POLL_INTERVAL``.
+        burst: Exit as soon as the queue is empty.
+        max_jobs: Exit after this many jobs.
+        stdout: Optional stream for one line per finished job.
+
+    Returns:
+        The number of jobs processed.
+    """
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'SPOTIFY_JOB_POLL_INTERVAL', 1.0)
+    spotify = SpotifyAPI()
+    processed = 0
+
+    while max_jobs is None or processed < max_jobs:
+        close_old_connections()
+        job = jobs.claim_next()
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            outcome = process_job(job, spotify)
+        except Exception as e:
+            logger.exception('Wrap job %s crashed', job.pk)
+            jobs.fail(job, str(e))
+            outcome = WrapJob.FAILED
+        processed += 1
+        if stdout is not None:
+            stdout.write(f'job {job.pk} ({job.kind}, user {job.user_id}): {outcome}')
+    return processed
@@ -0,0 +1,90 @@
+"""
+Database profiles for the SpotifyWrapper project.
+
+``DATABASE_PROFILE`` selects one of:
+
+- ``sqlite`` (default): a local SQLite file, tuned for concurrent writes.
+  WAL lets readers run alongside the single writer. ``synchronous=NORMAL``
+  makes commits cheaper and is still safe in WAL mode. Write transactions
+  start with ``BEGIN IMMEDIATE``, so two writers wait for each other within
+  the busy timeout instead of failing with "database is locked" when one
+  upgrades a read lock.
+- ``postgresql``: a PostgreSQL server configured through ``POSTGRES_*``
+  environment variables. On this profile migration
+  ``spotifyApp.0002_wrap_data_gin_index`` also gives ``SpotifyWrap.wrap_data``
+  a GIN index for JSON containment queries.
+
+Both profiles keep connections open for ``DATABASE_CONN_MAX_AGE`` seconds
+and check them before reuse.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Pragmas run on every new SQLite connection
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def sqlite_database(name, conn_max_age=60, busy_timeout=20, tuned=True):
+    """
+    Returns a DATABASES entry for a SQLite file.
+
+    Args:
+        name: Path of the database file.
+        conn_max_age: Seconds to keep connections open; 0 closes them after each request.
+        busy_timeout: Seconds a connection waits for a lock before failing.
+        tuned: False gives SQLite's default pragmas and deferred transactions,
+            as Django uses out of the box.
+    """
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': conn_max_age > 0,
+        'OPTIONS': {'timeout': busy_timeout},
+    }
+    if tuned:
+        database['OPTIONS'].update({
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+        })
+    return database
+
+
+def postgresql_database(conn_max_age=60):
+    """Returns a DATABASES entry for PostgreSQL, read from the POSTGRES_* environment variables."""
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'spotifywrapper'),
+        'USER': os.getenv('POSTGRES_USER', 'spotifywrapper'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': conn_max_age > 0,
+    }
+
+
+def database_from_env(base_dir):
+    """
+    Returns the default DATABASES entry for the ``DATABASE_PROFILE`` environment variable.
+
+    Raises:
+        ImproperlyConfigured: If the profile is not 'sqlite' or 'postgresql'.
+    """
+    profile = os.getenv('DATABASE_PROFILE', 'sqlite')
+    conn_max_age = int(os.getenv('DATABASE_CONN_MAX_AGE', '60'))
+    if profile == 'sqlite':
+        return sqlite_database(
+            os.getenv('SQLITE_PATH', str(base_dir / 'db.sqlite3')),
+            conn_max_age=conn_max_age,
+            busy_timeout=float(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+        )
+    if profile == 'postgresql':
+        return postgresql_database(conn_max_age=conn_max_age)
+    raise ImproperlyConfigured(f"DATABASE_PROFILE must be 'sqlite' or 'postgresql', not {profile!r}")
@@ -20,6 +20,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 from django.core.exceptions import ImproperlyConfigured
 
+from .databases import database_from_env
+
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,12 +55,15 @@ INSTALLED_APPS = [
 
 # Middleware configuration
 MIDDLEWARE = [
+    'spotifyApp.middleware.RequestMetricsMiddleware',  # first, so it times the whole stack
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'spotifyApp.middleware.CompressionMiddleware',  # brotli/gzip for large responses
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'spotifyApp.middleware.ProfilingMiddleware',  # unused unless SPOTIFY_PROFILE_DIR is set
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,11 +96,10 @@ TEMPLATES = [
 WSGI_APPLICATION = 'spotifyWrapper.wsgi.application'
 
 # Database configuration
+# Database: DATABASE_PROFILE is 'sqlite' (WAL-tuned local file) or 'postgresql'
+# (see spotifyWrapper/databases.py for the POSTGRES_* and SQLITE_* variables)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
 }
 
 # Password validation
@@ -130,6 +134,128 @@ SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
 SPOTIFY_REDIRECT_URI = os.getenv('SPOTIFY_REDIRECT_URI')
 
+# Spotify endpoints (overridable to point at a local stand-in server for load tests)
+SPOTIFY_API_BASE_URL = os.getenv('SPOTIFY_API_BASE_URL', 'https://api.spotify.com/v1')
+SPOTIFY_ACCOUNTS_URL = os.getenv('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com')
+
+# How new wraps are stored: 'compact' (projected fields, shared track/artist catalog),
+# 'delta' (compact keyframes plus deltas against the previous wrap) or 'raw' (full Spotify responses)
+SPOTIFY_WRAP_STORAGE = os.getenv('SPOTIFY_WRAP_STORAGE', 'compact')
+# Delta mode: wraps per chain before a new keyframe, and cache TTL for reconstructed wraps (seconds)
+SPOTIFY_WRAP_KEYFRAME_INTERVAL = 8
+SPOTIFY_WRAP_RECONSTRUCTED_CACHE_TTL = 24 * 60 * 60
+
+# Refresh Spotify access tokens this many seconds before they expire
+SPOTIFY_TOKEN_REFRESH_MARGIN = 300
+
+# Concurrent Spotify calls: worker pool size per process and overall deadline (seconds);
+# calls cap their timeouts to the deadline and stop retrying once it has passed
+SPOTIFY_FANOUT_WORKERS = int(os.getenv('SPOTIFY_FANOUT_WORKERS', '8'))
+SPOTIFY_FANOUT_TIMEOUT = float(os.getenv('SPOTIFY_FANOUT_TIMEOUT', '10'))
+
+# Pages fetched ahead in parallel when iterating a paged Spotify collection
+SPOTIFY_PAGINATE_PREFETCH = 4
+
+# Shared Spotify HTTP transport: hosts kept, keep-alive connections per host, timeouts (seconds)
+SPOTIFY_HTTP_POOL_CONNECTIONS = int(os.getenv('SPOTIFY_HTTP_POOL_CONNECTIONS', '4'))
+SPOTIFY_HTTP_POOL_MAXSIZE = int(os.getenv('SPOTIFY_HTTP_POOL_MAXSIZE', '16'))
+SPOTIFY_HTTP_CONNECT_TIMEOUT = float(os.getenv('SPOTIFY_HTTP_CONNECT_TIMEOUT', '3.05'))
+SPOTIFY_HTTP_READ_TIMEOUT = float(os.getenv('SPOTIFY_HTTP_READ_TIMEOUT', '10'))
+
+# Serve the Spotify-bound endpoints with native async views (run under ASGI, e.g. uvicorn),
+# and the connection limit of the shared async HTTP client per event loop
+SPOTIFY_ASYNC_VIEWS = os.getenv('SPOTIFY_ASYNC_VIEWS', 'false').lower() == 'true'
+SPOTIFY_ASYNC_MAX_CONNECTIONS = int(os.getenv('SPOTIFY_ASYNC_MAX_CONNECTIONS', '200'))
+
+# Wrap generation queue: worker poll interval, lease after which a running job is reclaimed,
+# attempts per job, status long-poll/SSE check interval, longest long-poll wait (kept short,
+# since a sync long poll holds a worker thread) and longest SSE stream (async views only),
+# in seconds
+SPOTIFY_JOB_POLL_INTERVAL = 1.0
+SPOTIFY_JOB_LEASE = 120
+SPOTIFY_JOB_MAX_ATTEMPTS = 3
+SPOTIFY_JOB_STATUS_POLL_INTERVAL = 0.5
+SPOTIFY_JOB_MAX_WAIT = 5
+SPOTIFY_JOB_STREAM_MAX_WAIT = 60
+
+# Precomputed wraps (pregenerate_wraps): how long get_wrapped_data serves one (seconds),
+# and the command's default worker threads and users committed per batch
+SPOTIFY_PRECOMPUTED_WRAP_MAX_AGE = 24 * 60 * 60
+SPOTIFY_PREGENERATE_WORKERS = int(os.getenv('SPOTIFY_PREGENERATE_WORKERS', '8'))
+SPOTIFY_PREGENERATE_BATCH_SIZE = 50
+
+# Duo Wrapped: cache TTL for a compared wrap pair (seconds) and friends ranked per request
+SPOTIFY_DUO_CACHE_TTL = 7 * 24 * 60 * 60
+SPOTIFY_DUO_MAX_FRIENDS = 100
+
+# Shared track and artist metadata (see spotifyApp/catalog.py): cache TTL (seconds) and
+# in-process LRU size
+SPOTIFY_CATALOG_CACHE_TTL = 30 * 24 * 60 * 60
+SPOTIFY_CATALOG_LOCAL_MAX_ENTRIES = int(os.getenv('SPOTIFY_CATALOG_LOCAL_MAX_ENTRIES', '10000'))
+
+# Wrap history export: wraps loaded per query while streaming
+SPOTIFY_EXPORT_CHUNK_SIZE = 25
+
+# Song guessing game: preview URL cache TTL, shorter TTL for tracks without a preview
+# (seconds), in-process LRU size, and the most questions per round
+SPOTIFY_PREVIEW_CACHE_TTL = 30 * 24 * 60 * 60
+SPOTIFY_PREVIEW_NEGATIVE_TTL = 24 * 60 * 60
+SPOTIFY_PREVIEW_LOCAL_MAX_ENTRIES = int(os.getenv('SPOTIFY_PREVIEW_LOCAL_MAX_ENTRIES', '5000'))
+SPOTIFY_GAME_MAX_ROUNDS = 10
+
+# Response compression: smallest body compressed (bytes) and brotli quality (0-11)
+SPOTIFY_COMPRESS_MIN_SIZE = 1024
+SPOTIFY_BROTLI_QUALITY = 5
+
+# Stored Spotify tokens: Fernet keys, newest first (comma-separated, from
+# Fernet.generate_key(); derived from SECRET_KEY when unset), and cache TTL (seconds)
+SPOTIFY_TOKEN_ENCRYPTION_KEYS = [key for key in os.getenv('SPOTIFY_TOKEN_ENCRYPTION_KEYS', '').split(',') if key]
+SPOTIFY_CREDENTIAL_CACHE_TTL = 60 * 60
+
+# Request metrics (see spotifyApp/metrics.py): on/off, and the bearer token that
+# lets a Prometheus scraper read metrics/ (admins can always read it)
+SPOTIFY_METRICS_ENABLED = os.getenv('SPOTIFY_METRICS_ENABLED', 'true').lower() == 'true'
+SPOTIFY_METRICS_TOKEN = os.getenv('SPOTIFY_METRICS_TOKEN', '')
+
+# Per-request profiling (see spotifyApp.middleware.ProfilingMiddleware): output
+# directory (unset disables it), the header staff users send to profile a
+# request, the share of all requests profiled at random, and captures kept
+SPOTIFY_PROFILE_DIR = os.getenv('SPOTIFY_PROFILE_DIR', '')
+SPOTIFY_PROFILE_HEADER = 'X-Profile'
+SPOTIFY_PROFILE_SAMPLE_RATE = float(os.getenv('SPOTIFY_PROFILE_SAMPLE_RATE', '0'))
+SPOTIFY_PROFILE_MAX_FILES = 200
+
+# Spotify circuit breakers (see spotifyApp/circuit.py): an endpoint's circuit opens once
+# at least MIN_CALLS calls in the last WINDOW seconds failed at FAILURE_RATE or more,
+# and stays open for OPEN_SECONDS before up to PROBES calls at once are let through to test it
+SPOTIFY_CIRCUIT_WINDOW = 30
+SPOTIFY_CIRCUIT_MIN_CALLS = 10
+SPOTIFY_CIRCUIT_FAILURE_RATE = 0.5
+SPOTIFY_CIRCUIT_OPEN_SECONDS = 30
+SPOTIFY_CIRCUIT_PROBES = 2
+
+# Spotify rate limiting: app-wide request budget, GET retries with jittered backoff (seconds),
+# per-process adaptive concurrency bounds and how long a call may wait for capacity
+SPOTIFY_RATE_LIMIT_PER_SECOND = int(os.getenv('SPOTIFY_RATE_LIMIT_PER_SECOND', '10'))
+SPOTIFY_MAX_RETRIES = 3
+SPOTIFY_RETRY_BACKOFF_BASE = 0.5
+SPOTIFY_RETRY_BACKOFF_CAP = 8
+SPOTIFY_CONCURRENCY_MIN = 1
+SPOTIFY_CONCURRENCY_MAX = int(os.getenv('SPOTIFY_CONCURRENCY_MAX', '16'))
+SPOTIFY_RATE_LIMIT_WAIT = 10
+
+# Spotify response cache: cache alias, in-process LRU size, per-endpoint freshness TTLs
+# and how long stale entries are kept for ETag revalidation (seconds)
+SPOTIFY_CACHE_ALIAS = 'default'
+SPOTIFY_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv('SPOTIFY_CACHE_LOCAL_MAX_ENTRIES', '1024'))
+SPOTIFY_CACHE_TTLS = {
+    'profile': 60 * 60,
+    'top_items': 6 * 60 * 60,
+    'playlists': 5 * 60,
+    'tracks': 24 * 60 * 60,
+}
+SPOTIFY_CACHE_STALE_TTL = 7 * 24 * 60 * 60
+
 # CORS settings
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = ["http://localhost:3000"]
@@ -142,6 +268,7 @@ CORS_ALLOW_HEADERS = [
     'origin',
     'user-agent',
     'x-csrftoken',
+    'x-profile',
     'x-requested-with',
 ]
 
@@ -154,6 +281,27 @@ SESSION_COOKIE_HTTPONLY = True
 CSRF_COOKIE_SECURE = False
 SESSION_COOKIE_SECURE = False
 
+# Cache: shared by every worker process through Redis when REDIS_URL is set (needs the
+# redis package). Otherwise each process has its own in-memory cache, and the Spotify
+# rate limit, Retry-After blocks and token refresh locks only hold within one process
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
 # Django REST framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -162,4 +310,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # orjson-backed JSON when installed (standard library otherwise); also lets
+    # wrap views send stored wrap JSON without decoding it
+    'DEFAULT_RENDERER_CLASSES': [
+        'spotifyApp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'spotifyApp.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }